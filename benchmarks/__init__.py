@@ -0,0 +1,4 @@
+"""refgenieserver performance benchmarks
+
+Run from the repository root, e.g. 'python -m benchmarks.server -h'.
+"""
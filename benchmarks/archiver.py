@@ -0,0 +1,293 @@
+"""Archiver benchmark: build stage throughput by codec and thread count
+
+A synthetic genome tree (see benchmarks.synthetic) is generated, unless an
+existing genome config is given, and archived once for every combination of
+the codecs, gzip compression levels and compression thread counts, with the
+archives rebuilt every time. The stage timings come from the archiver's own
+timing report; for every combination the results list the run wall time, the
+wall time and throughput of every stage summed over the tags, and the total
+archive size.
+
+The first run is a warm-up: it fills the page cache and the file store, which
+later runs place the asset files from.
+
+Usage: python -m benchmarks.archiver [options] [--output FILE] [--baseline FILE]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any
+
+from benchmarks.compare import compare, report
+from benchmarks.synthetic import make_genome_tree
+from refgenieserver.const import ARCHIVE_COMPRESSION_LEVEL, PKG_NAME
+
+# codec name: whether zstd archives are built along with the gzip ones
+CODECS: dict[str, bool] = {"gzip": False, "gzip+zstd": True}
+MIB: int = 1024 * 1024
+
+
+def _list(cast: type) -> Any:
+    return lambda value: [cast(v) for v in value.split(",")]
+
+
+def archive_once(
+    config_path: str,
+    zstd: bool,
+    level: int,
+    threads: int,
+    jobs: int,
+    report_path: str,
+) -> dict[str, Any]:
+    """Archive all assets of a genome config, forcing the rebuild.
+
+    Args:
+        config_path: Genome config path.
+        zstd: Whether to build zstd archives along with the gzip ones.
+        level: Gzip compression level.
+        threads: Compression threads per archive; 0 to share the CPUs among
+            the concurrent tags and the archive formats.
+        jobs: Tags built concurrently.
+        report_path: Path to write the archiver timing report to.
+
+    Returns:
+        The archiver timing report.
+    """
+    from refgenconf import RefGenConf
+
+    from refgenieserver.server_builder import archive
+
+    rgc = RefGenConf.from_yaml_file(config_path)
+    archive(
+        rgc,
+        None,
+        force=True,
+        remove=False,
+        cfg_path=config_path,
+        genomes_desc=None,
+        jobs=jobs,
+        compression_level=level,
+        compression_threads=threads,
+        zstd=zstd,
+        report_path=report_path,
+    )
+    with open(report_path) as f:
+        return json.load(f)
+
+
+def summarize(build_report: dict[str, Any]) -> dict[str, float]:
+    """Extract the benchmark metrics from an archiver timing report.
+
+    Args:
+        build_report: Archiver timing report.
+
+    Returns:
+        Run wall time, wall time and throughput of every stage summed over the
+        tags and the run, and the archive sizes; the archive stage writes the
+        gzip and, if built, the zstd archives.
+    """
+    metrics = {"wall_s": build_report["wall_seconds"]}
+    for stages in (build_report["tag_stage_totals"], build_report["run_stages"]):
+        for name, stage in stages.items():
+            metrics[f"{name}_s"] = stage["seconds"]
+            if "mb_per_s" in stage:
+                metrics[f"{name}_mb_s"] = stage["mb_per_s"]
+    for name in ("archive", "legacy_archive"):
+        stage = build_report["tag_stage_totals"].get(name, {})
+        if "output_bytes" in stage:
+            metrics[f"{name}_output_bytes"] = stage["output_bytes"]
+    return metrics
+
+
+def run(args: argparse.Namespace, config_path: str, workdir: str) -> dict[str, Any]:
+    """Run the benchmarks against a genome config.
+
+    Args:
+        args: Parsed command line arguments.
+        config_path: Genome config to archive.
+        workdir: Directory to write the timing reports to.
+
+    Returns:
+        The results.
+    """
+    from refgenieserver._version import __version__
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "server_version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "tree": (
+                {"config": config_path}
+                if args.config
+                else {
+                    "genomes": args.genomes,
+                    "assets": args.assets,
+                    "tags": args.tags,
+                    "files": args.files,
+                    "file_size": args.file_size,
+                    "content": args.content,
+                }
+            ),
+            "jobs": args.jobs,
+            "runs": args.runs,
+        },
+        "archiver": {},
+    }
+    report_path = os.path.join(workdir, "archive_report.json")
+    print("warm-up run", file=sys.stderr)
+    archive_once(config_path, False, 1, 0, args.jobs, report_path)
+    for codec in args.codecs:
+        for level in args.levels:
+            for threads in args.threads:
+                samples = [
+                    summarize(
+                        archive_once(
+                            config_path,
+                            CODECS[codec],
+                            level,
+                            threads,
+                            args.jobs,
+                            report_path,
+                        )
+                    )
+                    for _ in range(args.runs)
+                ]
+                # median of every metric over the runs
+                metrics = {
+                    key: statistics.median(s[key] for s in samples if key in s)
+                    for key in samples[0]
+                }
+                name = f"{codec}-level{level}-threads{threads}"
+                results["archiver"][name] = metrics
+                print(
+                    f"{name}: {metrics['wall_s']:.2f} s, archive "
+                    f"{metrics.get('archive_mb_s', 0):.1f} MiB/s, legacy archive "
+                    f"{metrics.get('legacy_archive_mb_s', 0):.1f} MiB/s, archives "
+                    f"{metrics.get('archive_output_bytes', 0) / MIB:.1f} MiB",
+                    file=sys.stderr,
+                )
+    return results
+
+
+def build_argparser() -> argparse.ArgumentParser:
+    """Build the argument parser of the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the archiver")
+    tree = parser.add_argument_group("synthetic genome tree")
+    tree.add_argument(
+        "--config",
+        help="Existing genome config to archive instead of a synthetic tree; "
+        "its archive directory is overwritten",
+    )
+    tree.add_argument("--genomes", type=int, default=1, help="Default: 1")
+    tree.add_argument("--assets", type=int, default=4, help="Default: 4")
+    tree.add_argument("--tags", type=int, default=1, help="Default: 1")
+    tree.add_argument(
+        "--files", type=int, default=8, help="Files per asset. Default: 8"
+    )
+    tree.add_argument(
+        "--file-size",
+        type=int,
+        default=8 * MIB,
+        help="Size of each file in bytes. Default: 8 MiB",
+    )
+    tree.add_argument(
+        "--content",
+        choices=("sequence", "random"),
+        default="sequence",
+        help="File contents: nucleotides or incompressible bytes. Default: sequence",
+    )
+    tree.add_argument(
+        "--workdir",
+        help="Directory to generate the tree in; a temporary one by default",
+    )
+    bench = parser.add_argument_group("benchmark")
+    bench.add_argument(
+        "--codecs",
+        type=_list(str),
+        default=list(CODECS),
+        help=f"Comma-separated codecs. Default: {','.join(CODECS)}",
+    )
+    bench.add_argument(
+        "--levels",
+        type=_list(int),
+        default=[ARCHIVE_COMPRESSION_LEVEL],
+        help="Comma-separated gzip compression levels. "
+        f"Default: {ARCHIVE_COMPRESSION_LEVEL}",
+    )
+    bench.add_argument(
+        "--threads",
+        type=_list(int),
+        default=[1, 2, 4, 0],
+        help="Comma-separated compression thread counts per archive; 0 shares "
+        "the CPUs among the concurrent tags and the archive formats. "
+        "Default: 1,2,4,0",
+    )
+    bench.add_argument(
+        "--jobs", type=int, default=1, help="Tags built concurrently. Default: 1"
+    )
+    bench.add_argument(
+        "--runs",
+        type=int,
+        default=1,
+        help="Runs per combination; the medians are reported. Default: 1",
+    )
+    output = parser.add_argument_group("output")
+    output.add_argument("-o", "--output", help="Results JSON file")
+    output.add_argument(
+        "--baseline",
+        help="Results JSON file to compare with; exits with status 1 if any "
+        "metric regressed by more than the tolerance",
+    )
+    output.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Relative change tolerated as noise. Default: 0.1",
+    )
+    return parser
+
+
+def main() -> None:
+    args = build_argparser().parse_args()
+    unknown = set(args.codecs) - set(CODECS)
+    if unknown:
+        sys.exit(f"Unknown codecs: {', '.join(sorted(unknown))}")
+    logging.getLogger(PKG_NAME).setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="refgenieserver-bench-") as tmp:
+        config_path = args.config or make_genome_tree(
+            args.workdir or tmp,
+            genomes=args.genomes,
+            assets=args.assets,
+            tags=args.tags,
+            files=args.files,
+            file_size=args.file_size,
+            content=args.content,
+        )
+        results = run(args, config_path, tmp)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if report(compare(baseline, results), args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
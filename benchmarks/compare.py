@@ -0,0 +1,134 @@
+"""Comparison of benchmark results against a baseline
+
+Results are nested JSON objects; every numeric leaf is a metric, identified by
+its dotted path. Whether a higher value is better or worse is derived from the
+metric name: throughputs ('rps', '*_mb_s') are better higher, latencies and
+durations ('*_ms', '*_s') and sizes ('*_bytes') are better lower. Other
+metrics, e.g. error and request counts, are not compared.
+
+Usage: python -m benchmarks.compare BASELINE CURRENT [--tolerance 0.1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from typing import Any
+
+HIGHER_IS_BETTER: tuple[str, ...] = ("rps", "_mb_s")
+LOWER_IS_BETTER: tuple[str, ...] = ("_ms", "_s", "_bytes")
+
+
+@dataclass
+class Change:
+    """Change of a metric between the baseline and the current results."""
+
+    metric: str
+    baseline: float
+    current: float
+    # relative change in the 'worse' direction; positive is a regression
+    worse_by: float
+
+
+def flatten(results: Any, prefix: str = "") -> dict[str, float]:
+    """Flatten nested results into numeric metrics keyed by dotted paths.
+
+    Args:
+        results: Nested dictionaries of results.
+        prefix: Path of the results object.
+
+    Returns:
+        The numeric leaves, keyed by their paths.
+    """
+    metrics = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            metrics.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        metrics[prefix] = float(results)
+    return metrics
+
+
+def _direction(metric: str) -> int:
+    name = metric.rsplit(".", 1)[-1]
+    if name.endswith(HIGHER_IS_BETTER):
+        return -1
+    if name.endswith(LOWER_IS_BETTER):
+        return 1
+    return 0
+
+
+def compare(baseline: dict, current: dict) -> list[Change]:
+    """Compare the metrics present in both results.
+
+    Args:
+        baseline: Baseline results.
+        current: Current results.
+
+    Returns:
+        The changes of the comparable metrics, worst first.
+    """
+    base, cur = flatten(baseline), flatten(current)
+    changes = []
+    for metric in sorted(base.keys() & cur.keys()):
+        direction = _direction(metric)
+        if direction == 0 or metric.startswith("meta."):
+            continue
+        if base[metric] == 0:
+            continue
+        worse_by = direction * (cur[metric] - base[metric]) / base[metric]
+        changes.append(Change(metric, base[metric], cur[metric], worse_by))
+    return sorted(changes, key=lambda c: c.worse_by, reverse=True)
+
+
+def report(changes: list[Change], tolerance: float) -> list[Change]:
+    """Print the changes and return the regressions.
+
+    Args:
+        changes: Metric changes, see compare.
+        tolerance: Relative change in the 'worse' direction tolerated as noise.
+
+    Returns:
+        The changes worse than the tolerance.
+    """
+    regressions = [c for c in changes if c.worse_by > tolerance]
+    width = max((len(c.metric) for c in changes), default=6)
+    print(f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  better by")
+    for c in changes:
+        flag = "  REGRESSION" if c in regressions else ""
+        print(
+            f"{c.metric:<{width}}  {c.baseline:>12.4g}  {c.current:>12.4g}  "
+            f"{-c.worse_by:+.1%}{flag}"
+        )
+    print(
+        f"{len(regressions)} of {len(changes)} metrics regressed by more than "
+        f"{tolerance:.0%}"
+    )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare benchmark results against a baseline"
+    )
+    parser.add_argument("baseline", help="Baseline results JSON file")
+    parser.add_argument("current", help="Current results JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Relative change tolerated as noise. Default: 0.1",
+    )
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = report(compare(baseline, current), args.tolerance)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
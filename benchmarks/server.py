@@ -0,0 +1,507 @@
+"""Server benchmark: endpoint latency and throughput, streaming, startup, memory
+
+A synthetic catalog is generated (see benchmarks.synthetic), unless an existing
+server config is given, and served by an app built with
+refgenieserver.app_factory.create_app in a separate process. The load is
+generated with an asynchronous HTTP client in this process, so on machines
+with few cores the client competes with the server for the CPU; compare
+results from the same machine only.
+
+Measured:
+- per endpoint and concurrency level: latency percentiles and throughput
+- streaming throughput of a large archive, single and parallel downloads
+- startup time (imports, app and catalog build, OpenAPI schema build and
+  load) and its resident memory, and the import time of the archiver
+- resident and proportional set size of the server processes after the load
+
+Usage: python -m benchmarks.server [options] [--output FILE] [--baseline FILE]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from benchmarks.synthetic import SyntheticCatalog
+
+REPO_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# endpoint name: URL template, filled with a random genome/asset:tag per request
+ENDPOINTS: dict[str, str] = {
+    "index": "/",
+    "genomes_list": "/v3/genomes/list",
+    "assets_list": "/v3/assets/list",
+    "alias_dict": "/v3/genomes/alias_dict",
+    "genome_digest": "/v3/genomes/genome_digest/{alias}",
+    "genome_attrs": "/v3/genomes/attrs/{genome}",
+    "asset_attrs": "/v3/assets/attrs/{genome}/{asset}?tag={tag}",
+    "archive_digest": "/v3/assets/archive_digest/{genome}/{asset}?tag={tag}",
+    "archive": "/v3/assets/archive/{genome}/{asset}?tag={tag}",
+    "dir_contents": "/v3/assets/dir_contents/{genome}/{asset}?tag={tag}",
+    "recipe": "/v3/assets/recipe/{genome}/{asset}?tag={tag}",
+    "log": "/v3/assets/log/{genome}/{asset}?tag={tag}",
+    "genome_splash": "/v3/genomes/splash/{genome}",
+    "asset_splash": "/v3/assets/splash/{genome}/{asset}?tag={tag}",
+}
+MIB: int = 1024 * 1024
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    # nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _read_status_kib(path: str, key: str) -> int | None:
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def process_memory(pid: int) -> dict[str, int]:
+    """Get the memory use of a process and its child processes (Linux only).
+
+    Args:
+        pid: Process ID.
+
+    Returns:
+        Summed resident set size and, if available, proportional set size,
+        which counts the pages shared by the processes once, in bytes, and the
+        number of processes.
+    """
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    rss = pss = 0
+    for p in pids:
+        rss += (_read_status_kib(f"/proc/{p}/status", "VmRSS") or 0) * 1024
+        pss += (_read_status_kib(f"/proc/{p}/smaps_rollup", "Pss") or 0) * 1024
+    memory = {"rss_bytes": rss, "processes": len(pids)}
+    if pss:
+        memory["pss_bytes"] = pss
+    return memory
+
+
+def _startup_child(config_path: str, archive_dir: str, openapi_cache: str) -> None:
+    start = time.perf_counter()
+    from refgenieserver.app_factory import create_app
+
+    imported = time.perf_counter()
+    app = create_app(
+        config_path, archive_base_dir=archive_dir, openapi_cache_dir=openapi_cache
+    )
+
+    async def _start() -> None:
+        async with app.router.lifespan_context(app):
+            pass
+
+    asyncio.run(_start())
+    built = time.perf_counter()
+    app.openapi()
+    print(
+        json.dumps(
+            {
+                "import_s": imported - start,
+                "create_app_s": built - imported,
+                "openapi_s": time.perf_counter() - built,
+                "rss_bytes": process_memory(os.getpid())["rss_bytes"],
+            }
+        ),
+        flush=True,
+    )
+
+
+def _archive_import_child() -> None:
+    start = time.perf_counter()
+    import refgenieserver.cli  # noqa: F401
+    import refgenieserver.server_builder  # noqa: F401
+
+    print(json.dumps({"archive_import_s": time.perf_counter() - start}), flush=True)
+
+
+def _serve_child(
+    config_path: str, archive_dir: str, openapi_cache: str, port: int, workers: int
+) -> None:
+    from refgenieserver.app_factory import create_app
+    from refgenieserver.prefork import serve
+
+    app = create_app(
+        config_path, archive_base_dir=archive_dir, openapi_cache_dir=openapi_cache
+    )
+    serve(app, workers=workers, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _child_command(*args: Any) -> list[str]:
+    return [sys.executable, "-m", "benchmarks.server", "--child", *map(str, args)]
+
+
+def _run_child(*args: Any) -> dict[str, float]:
+    start = time.perf_counter()
+    output = subprocess.run(
+        _child_command(*args),
+        cwd=REPO_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    sample = json.loads(output.strip().splitlines()[-1])
+    sample["total_s"] = time.perf_counter() - start
+    return sample
+
+
+def measure_startup(
+    config_path: str, archive_dir: str, openapi_cache: str, runs: int
+) -> dict[str, float]:
+    """Measure the startup time and memory of fresh processes.
+
+    The first process builds the OpenAPI schema and stores it in the cache;
+    the later ones load it, like restarted servers.
+
+    Args:
+        config_path: Server config path.
+        archive_dir: Archive directory.
+        openapi_cache: OpenAPI schema cache directory.
+        runs: Number of processes to start; the medians are reported.
+
+    Returns:
+        Median total time including the interpreter startup, import time,
+        app and catalog build time, OpenAPI schema build or load time, and
+        resident memory after the startup, the OpenAPI schema build time of
+        the first process, and the import time of the archiver.
+    """
+    samples = [
+        _run_child("startup", config_path, archive_dir, openapi_cache)
+        for _ in range(runs)
+    ]
+    startup = {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+    startup["openapi_build_s"] = samples[0]["openapi_s"]
+    startup["archive_import_s"] = _run_child("archive-import")["archive_import_s"]
+    return startup
+
+
+def _targets(catalog: SyntheticCatalog, template: str, count: int) -> list[str]:
+    rng = random.Random(0)
+    urls = []
+    for _ in range(count):
+        genome, alias = rng.choice(catalog.genomes)
+        urls.append(
+            template.format(
+                genome=genome,
+                alias=alias,
+                asset=rng.choice(catalog.assets),
+                tag=rng.choice(catalog.tags),
+            )
+        )
+    return urls
+
+
+async def _load(base_url: str, urls: list[str], concurrency: int) -> dict[str, float]:
+    import httpx
+
+    latencies, errors = [], 0
+    queue = iter(urls)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async def _worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        for url in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                await response.aread()
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(_worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p90_ms": _percentile(latencies, 0.90) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+async def _download(base_url: str, url: str, streams: int) -> float:
+    import httpx
+
+    async def _one(client: httpx.AsyncClient) -> int:
+        size = 0
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+        return size
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        start = time.perf_counter()
+        sizes = await asyncio.gather(*(_one(client) for _ in range(streams)))
+        elapsed = time.perf_counter() - start
+    return sum(sizes) / elapsed / MIB
+
+
+def _wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(base_url + "/v3/genomes/list").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Server not ready after {timeout} seconds")
+
+
+def run(
+    args: argparse.Namespace, catalog: SyntheticCatalog, workdir: str
+) -> dict[str, Any]:
+    """Run the benchmarks against a generated catalog.
+
+    Args:
+        args: Parsed command line arguments.
+        catalog: The catalog to serve.
+        workdir: Temporary directory to cache the OpenAPI schemas in.
+
+    Returns:
+        The results.
+    """
+    from refgenieserver._version import __version__
+
+    openapi_cache = os.path.join(workdir, "openapi")
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "server_version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "catalog": {
+                "genomes": len(catalog.genomes),
+                "assets": len(catalog.assets),
+                "tags": len(catalog.tags),
+                "remote": catalog.remote,
+            },
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "startup": measure_startup(
+            catalog.config_path, catalog.archive_dir, openapi_cache, args.startup_runs
+        ),
+    }
+    print(f"startup: {results['startup']}", file=sys.stderr)
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        _child_command(
+            "serve",
+            catalog.config_path,
+            catalog.archive_dir,
+            openapi_cache,
+            port,
+            args.workers,
+        ),
+        cwd=REPO_DIR,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_ready(base_url, process, timeout=60)
+        results["endpoints"] = {}
+        for name in args.endpoints:
+            results["endpoints"][name] = {}
+            urls = _targets(catalog, ENDPOINTS[name], args.requests)
+            for concurrency in args.concurrency:
+                stats = asyncio.run(_load(base_url, urls, concurrency))
+                results["endpoints"][name][f"c{concurrency}"] = stats
+                print(
+                    f"{name} c{concurrency}: {stats['rps']:.0f} req/s, "
+                    f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, "
+                    f"{stats['errors']} errors",
+                    file=sys.stderr,
+                )
+        if catalog.large_archive is not None and not catalog.remote:
+            genome, asset, tag = catalog.large_archive
+            url = ENDPOINTS["archive"].format(genome=genome, asset=asset, tag=tag)
+            single = [
+                asyncio.run(_download(base_url, url, 1))
+                for _ in range(args.stream_runs)
+            ]
+            parallel = asyncio.run(_download(base_url, url, args.stream_parallel))
+            results["streaming"] = {
+                "single_mb_s": statistics.median(single),
+                "parallel_mb_s": parallel,
+                "parallel_streams": args.stream_parallel,
+            }
+            print(f"streaming: {results['streaming']}", file=sys.stderr)
+        results["memory"] = process_memory(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return results
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def build_argparser() -> argparse.ArgumentParser:
+    """Build the argument parser of the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the server")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    catalog = parser.add_argument_group("synthetic catalog")
+    catalog.add_argument("--genomes", type=int, default=10, help="Default: 10")
+    catalog.add_argument("--assets", type=int, default=5, help="Default: 5")
+    catalog.add_argument("--tags", type=int, default=2, help="Default: 2")
+    catalog.add_argument(
+        "--archive-size",
+        type=int,
+        default=64 * 1024,
+        help="Size of each archive in bytes. Default: 65536",
+    )
+    catalog.add_argument(
+        "--large-archive-size",
+        type=int,
+        default=256 * MIB,
+        help="Size of the archive the streaming throughput is measured with, in "
+        "bytes; 0 to skip the streaming benchmark. Default: 256 MiB",
+    )
+    catalog.add_argument(
+        "--remotes",
+        action="store_true",
+        help="Define remote data providers; the files are redirected to",
+    )
+    catalog.add_argument(
+        "--workdir",
+        help="Directory to generate the catalog in; a temporary one by default",
+    )
+    bench = parser.add_argument_group("benchmark")
+    bench.add_argument("--workers", type=int, default=1, help="Default: 1")
+    bench.add_argument(
+        "--concurrency",
+        type=_int_list,
+        default=[1, 8, 32],
+        help="Comma-separated concurrency levels. Default: 1,8,32",
+    )
+    bench.add_argument(
+        "--requests",
+        type=int,
+        default=300,
+        help="Requests per endpoint and concurrency level. Default: 300",
+    )
+    bench.add_argument(
+        "--endpoints",
+        type=lambda v: v.split(","),
+        default=list(ENDPOINTS),
+        help=f"Comma-separated endpoints. Default: {','.join(ENDPOINTS)}",
+    )
+    bench.add_argument("--stream-runs", type=int, default=3, help="Default: 3")
+    bench.add_argument(
+        "--stream-parallel",
+        type=int,
+        default=4,
+        help="Number of parallel downloads. Default: 4",
+    )
+    bench.add_argument("--startup-runs", type=int, default=3, help="Default: 3")
+    output = parser.add_argument_group("output")
+    output.add_argument("-o", "--output", help="Results JSON file")
+    output.add_argument(
+        "--baseline",
+        help="Results JSON file to compare with; exits with status 1 if any "
+        "metric regressed by more than the tolerance",
+    )
+    output.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Relative change tolerated as noise. Default: 0.1",
+    )
+    return parser
+
+
+def main() -> None:
+    args = build_argparser().parse_args()
+    if args.child:
+        kind, *child_args = args.child
+        if kind == "startup":
+            _startup_child(*child_args)
+        elif kind == "archive-import":
+            _archive_import_child()
+        else:
+            config_path, archive_dir, openapi_cache, port, workers = child_args
+            _serve_child(
+                config_path, archive_dir, openapi_cache, int(port), int(workers)
+            )
+        return
+    # imported here: the child processes time the imports of the server
+    from benchmarks.compare import compare, report
+    from benchmarks.synthetic import make_server_tree
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        sys.exit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    with tempfile.TemporaryDirectory(prefix="refgenieserver-bench-") as tmp:
+        catalog = make_server_tree(
+            args.workdir or tmp,
+            genomes=args.genomes,
+            assets=args.assets,
+            tags=args.tags,
+            archive_size=args.archive_size,
+            large_archive_size=args.large_archive_size,
+            remotes=args.remotes,
+        )
+        results = run(args, catalog, tmp)
+    results["meta"]["catalog"]["archive_size"] = args.archive_size
+    results["meta"]["catalog"]["large_archive_size"] = args.large_archive_size
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if report(compare(baseline, results), args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""Synthetic configs, archive trees and asset trees for the benchmarks
+
+The server trees look like the output of 'refgenieserver archive': a server
+config listing N genomes x M assets x K tags, each genome with an alias, each
+asset but the first a child of the preceding one, and next to it the archive
+directory with the archives, build recipes, build logs and asset directory
+contents files. The archives are filled with pseudo-random bytes; they are
+served, not unpacked.
+
+The genome trees are the input of 'refgenieserver archive': a genome config
+and the asset directories it lists, with build recipes and logs, filled with
+files of a given size and number. The file contents are either pseudo-random
+nucleotide sequences, which compress about as well as real sequence assets,
+or pseudo-random bytes, which do not compress.
+
+Usage: python -m benchmarks.synthetic OUTPUT_DIR [--genome-tree] [options]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass, field
+
+import yaml
+from refgenconf.const import *
+from ubiquerg import filesize_to_str
+
+from refgenieserver.const import CFG_LEGACY_ARCHIVE_CHECKSUM_KEY
+
+# remote data providers added with remotes=True; the prefixes are not served
+REMOTES: dict[str, dict[str, str]] = {
+    "http": {"prefix": "http://synthetic.invalid/archive"},
+    "s3": {"prefix": "s3://synthetic-bucket/archive"},
+}
+WRITE_CHUNK_SIZE: int = 1024 * 1024
+# maps every byte to a nucleotide
+NUCLEOTIDES: bytes = b"ACGT" * 64
+
+
+@dataclass
+class SyntheticCatalog:
+    """A generated server config and archive directory."""
+
+    config_path: str
+    archive_dir: str
+    # (genome digest, alias) pairs
+    genomes: list[tuple[str, str]] = field(default_factory=list)
+    assets: list[str] = field(default_factory=list)
+    tags: list[str] = field(default_factory=list)
+    # genome digest, asset name and tag of the large archive, if any
+    large_archive: tuple[str, str, str] | None = None
+    remote: bool = False
+
+
+def _genome_digest(i: int) -> str:
+    return hashlib.sha256(f"synthetic genome {i}".encode()).hexdigest()[:48]
+
+
+def _write_random_file(path: str, size: int, rng: random.Random) -> str:
+    """Write a file of pseudo-random bytes and return its MD5 digest."""
+    digest = hashlib.md5()
+    block = rng.randbytes(min(size, WRITE_CHUNK_SIZE))
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = block[:remaining]
+            f.write(chunk)
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def _write_sequence_file(path: str, size: int, rng: random.Random) -> None:
+    """Write a file of pseudo-random nucleotides, without repeated blocks."""
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            n = min(remaining, WRITE_CHUNK_SIZE)
+            f.write(rng.randbytes(n).translate(NUCLEOTIDES))
+            remaining -= n
+
+
+def _write_json(path: str, obj: object) -> None:
+    with open(path, "w") as f:
+        json.dump(obj, f)
+
+
+def make_server_tree(
+    output_dir: str,
+    genomes: int = 10,
+    assets: int = 5,
+    tags: int = 2,
+    files: int = 10,
+    archive_size: int = 64 * 1024,
+    large_archive_size: int = 0,
+    remotes: bool = False,
+    seed: int = 0,
+) -> SyntheticCatalog:
+    """Generate a server config and the archive directory it describes.
+
+    Args:
+        output_dir: Directory to generate the config ('server.yaml') and the
+            archive directory ('archive') in.
+        genomes: Number of genomes.
+        assets: Number of assets per genome.
+        tags: Number of tags per asset.
+        files: Number of files listed in each asset directory contents file.
+        archive_size: Size of each archive in bytes.
+        large_archive_size: Size of an additional archive to measure the
+            streaming throughput with, in bytes; 0 not to generate it.
+        remotes: Whether to define remote data providers, so the archives
+            and sidecar files are redirected to instead of served.
+        seed: Seed of the pseudo-random archive contents.
+
+    Returns:
+        Description of the generated catalog.
+    """
+    rng = random.Random(seed)
+    archive_dir = os.path.join(output_dir, "archive")
+    config_path = os.path.join(output_dir, "server.yaml")
+    catalog = SyntheticCatalog(
+        config_path=config_path,
+        archive_dir=archive_dir,
+        assets=[f"asset{a}" for a in range(assets)],
+        tags=[f"tag{t}" for t in range(tags)],
+        remote=remotes,
+    )
+    genomes_section = {}
+    for g in range(genomes):
+        digest, alias = _genome_digest(g), f"genome{g}"
+        catalog.genomes.append((digest, alias))
+        genome_dir = os.path.join(archive_dir, digest)
+        os.makedirs(genome_dir, exist_ok=True)
+        assets_section = {}
+        asset_names = list(catalog.assets)
+        if large_archive_size and g == 0:
+            asset_names.append("large")
+        for a, asset in enumerate(asset_names):
+            tags_section = {}
+            for tag in catalog.tags:
+                size = large_archive_size if asset == "large" else archive_size
+                archive_digest = _write_random_file(
+                    os.path.join(genome_dir, f"{asset}__{tag}.tgz"), size, rng
+                )
+                contents = [f"{asset}_file{i}.dat" for i in range(files)]
+                _write_json(
+                    os.path.join(
+                        genome_dir, TEMPLATE_ASSET_DIR_CONTENTS.format(asset, tag)
+                    ),
+                    contents,
+                )
+                _write_json(
+                    os.path.join(genome_dir, TEMPLATE_RECIPE_JSON.format(asset, tag)),
+                    {"name": asset, "command_templates": ["touch {asset_outfolder}"]},
+                )
+                with open(
+                    os.path.join(genome_dir, TEMPLATE_LOG.format(asset, tag)), "w"
+                ) as f:
+                    f.write(f"# Build log of {asset}:{tag}\n")
+                # the assets of each tag form a chain of parents and children
+                parent = asset_names[a - 1] if 0 < a < len(catalog.assets) else None
+                child = asset_names[a + 1] if a + 1 < len(catalog.assets) else None
+                parents = [f"{digest}/{parent}:{tag}"] if parent else []
+                children = [f"{digest}/{child}:{tag}"] if child else []
+                tags_section[tag] = {
+                    CFG_ASSET_PATH_KEY: asset,
+                    CFG_SEEK_KEYS_KEY: {asset: contents[0], "dir": "."},
+                    CFG_ARCHIVE_CHECKSUM_KEY: archive_digest,
+                    CFG_LEGACY_ARCHIVE_CHECKSUM_KEY: archive_digest,
+                    CFG_ARCHIVE_SIZE_KEY: filesize_to_str(size),
+                    CFG_ASSET_SIZE_KEY: filesize_to_str(size),
+                    CFG_ASSET_CHECKSUM_KEY: hashlib.md5(
+                        f"{digest}/{asset}:{tag}".encode()
+                    ).hexdigest(),
+                    CFG_ASSET_PARENTS_KEY: parents,
+                    CFG_ASSET_CHILDREN_KEY: children,
+                }
+            if asset == "large":
+                catalog.large_archive = (digest, asset, catalog.tags[0])
+            assets_section[asset] = {
+                CFG_ASSET_DESC_KEY: f"synthetic asset {asset}",
+                CFG_ASSET_DEFAULT_TAG_KEY: catalog.tags[0],
+                CFG_ASSET_TAGS_KEY: tags_section,
+            }
+        genomes_section[digest] = {
+            CFG_ALIASES_KEY: [alias],
+            CFG_GENOME_DESC_KEY: f"synthetic genome {g}",
+            CFG_ASSETS_KEY: assets_section,
+        }
+    cfg = {
+        CFG_VERSION_KEY: REQ_CFG_VERSION,
+        CFG_FOLDER_KEY: output_dir,
+        CFG_ARCHIVE_KEY: archive_dir,
+        CFG_ARCHIVE_CONFIG_KEY: config_path,
+        CFG_SERVERS_KEY: [],
+        CFG_GENOMES_KEY: genomes_section,
+    }
+    if remotes:
+        cfg["remotes"] = REMOTES
+    with open(config_path, "w") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False)
+    return catalog
+
+
+def make_genome_tree(
+    output_dir: str,
+    genomes: int = 1,
+    assets: int = 4,
+    tags: int = 1,
+    files: int = 10,
+    file_size: int = 1024 * 1024,
+    content: str = "sequence",
+    seed: int = 0,
+) -> str:
+    """Generate a genome config and the asset directories it describes.
+
+    Args:
+        output_dir: Directory to generate the config ('genomes.yaml'), the
+            genome folder ('genomes') and the archive directory ('archive',
+            left empty) in.
+        genomes: Number of genomes.
+        assets: Number of assets per genome.
+        tags: Number of tags per asset.
+        files: Number of files per asset directory.
+        file_size: Size of each file in bytes.
+        content: File contents: 'sequence' for nucleotides or 'random' for
+            pseudo-random bytes.
+        seed: Seed of the pseudo-random file contents.
+
+    Returns:
+        Path to the genome config.
+
+    Raises:
+        ValueError: If the content kind is not known.
+    """
+    if content not in ("sequence", "random"):
+        raise ValueError(f"Unknown file content: {content}")
+    rng = random.Random(seed)
+    genome_folder = os.path.join(output_dir, "genomes")
+    archive_dir = os.path.join(output_dir, "archive")
+    config_path = os.path.join(output_dir, "genomes.yaml")
+    os.makedirs(archive_dir, exist_ok=True)
+    genomes_section = {}
+    for g in range(genomes):
+        digest = _genome_digest(g)
+        assets_section = {}
+        for a in range(assets):
+            asset = f"asset{a}"
+            tags_section = {}
+            for t in range(tags):
+                tag = f"tag{t}"
+                asset_dir = os.path.join(genome_folder, "data", digest, asset, tag)
+                build_dir = os.path.join(asset_dir, BUILD_STATS_DIR)
+                os.makedirs(build_dir, exist_ok=True)
+                for i in range(files):
+                    path = os.path.join(asset_dir, f"{asset}_file{i}.dat")
+                    if content == "sequence":
+                        _write_sequence_file(path, file_size, rng)
+                    else:
+                        _write_random_file(path, file_size, rng)
+                _write_json(
+                    os.path.join(build_dir, TEMPLATE_RECIPE_JSON.format(asset, tag)),
+                    {"name": asset, "command_templates": ["touch {asset_outfolder}"]},
+                )
+                with open(os.path.join(build_dir, ORI_LOG_NAME), "w") as f:
+                    f.write(f"# Build log of {asset}:{tag}\n")
+                tags_section[tag] = {
+                    CFG_ASSET_PATH_KEY: asset,
+                    CFG_SEEK_KEYS_KEY: {asset: f"{asset}_file0.dat"},
+                    CFG_ASSET_CHECKSUM_KEY: hashlib.md5(
+                        f"{digest}/{asset}:{tag}".encode()
+                    ).hexdigest(),
+                    CFG_ASSET_PARENTS_KEY: [],
+                    CFG_ASSET_CHILDREN_KEY: [],
+                }
+            assets_section[asset] = {
+                CFG_ASSET_DESC_KEY: f"synthetic asset {asset}",
+                CFG_ASSET_DEFAULT_TAG_KEY: "tag0",
+                CFG_ASSET_TAGS_KEY: tags_section,
+            }
+        genomes_section[digest] = {
+            CFG_ALIASES_KEY: [f"genome{g}"],
+            CFG_GENOME_DESC_KEY: f"synthetic genome {g}",
+            CFG_ASSETS_KEY: assets_section,
+        }
+    cfg = {
+        CFG_VERSION_KEY: REQ_CFG_VERSION,
+        CFG_FOLDER_KEY: genome_folder,
+        CFG_ARCHIVE_KEY: archive_dir,
+        CFG_ARCHIVE_CONFIG_KEY: os.path.join(archive_dir, "server.yaml"),
+        CFG_SERVERS_KEY: [],
+        CFG_GENOMES_KEY: genomes_section,
+    }
+    with open(config_path, "w") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False)
+    return config_path
+
+
+def build_argparser() -> argparse.ArgumentParser:
+    """Build the argument parser of the generator."""
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic server config and archive directory"
+    )
+    parser.add_argument("output_dir", help="Directory to generate the files in")
+    parser.add_argument(
+        "--genome-tree",
+        action="store_true",
+        help="Generate a genome config and asset directories to archive instead "
+        "of a server config and archive directory to serve",
+    )
+    parser.add_argument("--genomes", type=int, default=10, help="Default: 10")
+    parser.add_argument("--assets", type=int, default=5, help="Per genome. Default: 5")
+    parser.add_argument("--tags", type=int, default=2, help="Per asset. Default: 2")
+    parser.add_argument(
+        "--files", type=int, default=10, help="Files per asset. Default: 10"
+    )
+    parser.add_argument(
+        "--file-size",
+        type=int,
+        default=1024 * 1024,
+        help="Size of each asset file in bytes, with --genome-tree. Default: 1048576",
+    )
+    parser.add_argument(
+        "--content",
+        choices=("sequence", "random"),
+        default="sequence",
+        help="Asset file contents, with --genome-tree. Default: sequence",
+    )
+    parser.add_argument(
+        "--archive-size",
+        type=int,
+        default=64 * 1024,
+        help="Size of each archive in bytes. Default: 65536",
+    )
+    parser.add_argument(
+        "--large-archive-size",
+        type=int,
+        default=0,
+        help="Size of an additional large archive in bytes. Default: 0 (none)",
+    )
+    parser.add_argument(
+        "--remotes", action="store_true", help="Define remote data providers"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Default: 0")
+    return parser
+
+
+def main() -> None:
+    args = build_argparser().parse_args()
+    if args.genome_tree:
+        config_path = make_genome_tree(
+            args.output_dir,
+            genomes=args.genomes,
+            assets=args.assets,
+            tags=args.tags,
+            files=args.files,
+            file_size=args.file_size,
+            content=args.content,
+            seed=args.seed,
+        )
+        print(f"Genome config written: {config_path}")
+        return
+    catalog = make_server_tree(
+        args.output_dir,
+        genomes=args.genomes,
+        assets=args.assets,
+        tags=args.tags,
+        files=args.files,
+        archive_size=args.archive_size,
+        large_archive_size=args.large_archive_size,
+        remotes=args.remotes,
+        seed=args.seed,
+    )
+    print(f"Server config written: {catalog.config_path}")
+
+
+if __name__ == "__main__":
+    main()
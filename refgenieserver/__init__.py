@@ -1,6 +1,57 @@
 from __future__ import annotations
 
+from importlib import import_module
+from typing import Any
+
 from .const import *
-from .helpers import *
-from .main import *
-from .server_builder import *
+
+# exported names by the module defining them; the modules are imported on
+# first access, so the archiver and the CLI start without importing FastAPI
+# and the server modules
+_LAZY_EXPORTS: dict[str, str] = {
+    # server_builder
+    "archive": "server_builder",
+    "TagJob": "server_builder",
+    # main
+    "app": "main",
+    "lifespan": "main",
+    "serve_config": "main",
+    "templates": "main",
+    # helpers
+    "create_asset_file_path": "helpers",
+    "get_archive_index": "helpers",
+    "get_asset_dir_contents": "helpers",
+    "get_datapath_for_genome": "helpers",
+    "get_openapi_version": "helpers",
+    "is_data_remote": "helpers",
+    "lookup_archive_digest": "helpers",
+    "negotiate_archive_format": "helpers",
+    "preprocess_attrs": "helpers",
+    "purge_nonservable": "helpers",
+    "redirect_to_remote": "helpers",
+    "require_asset": "helpers",
+    "safely_get_example": "helpers",
+    "serve_file_for_asset": "helpers",
+    "serve_json_for_asset": "helpers",
+    "sidecar_digest": "helpers",
+    "stream_archive_member": "helpers",
+    # catalog
+    "CatalogHolder": "catalog",
+    "CatalogSnapshotMiddleware": "catalog",
+    "ServingCatalog": "catalog",
+    # cli
+    "build_parser": "cli",
+    "main": "cli",
+}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name = _LAZY_EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return getattr(import_module(f".{module_name}", __name__), name)
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
@@ -7,14 +7,88 @@ import sys
 
 from fastapi import FastAPI
 from refgenconf import RefGenConf
-
-from .const import PKG_NAME, PRIVATE_API, TAGS_METADATA
+from starlette.staticfiles import StaticFiles
+
+from .catalog import CatalogHolder, CatalogSnapshotMiddleware, ServingCatalog
+from .const import (
+    DEFAULT_CHUNK_SIZE,
+    OPENAPI_CACHE_DIR,
+    PKG_NAME,
+    PRIVATE_API,
+    STATIC_DIRNAME,
+    STATIC_PATH,
+    TAGS_METADATA,
+)
+from .file_response import AssetFileResponse
 from .helpers import purge_nonservable
+from .metrics import (
+    MetricsMiddleware,
+    catalog_collector,
+    metrics_endpoint,
+    registry,
+)
+from .openapi import OpenAPISchemaCache
+from .reload import CatalogReloader
 
 _LOGGER = logging.getLogger(PKG_NAME)
 
 
-def create_app(config_path: str, archive_base_dir: str | None = None) -> FastAPI:
+def configure_app(
+    app: FastAPI,
+    catalog: CatalogHolder,
+    config_path: str,
+    base_dir: str | None = None,
+    reload_interval: float = 0.0,
+    openapi_cache_dir: str | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    fadvise: bool = True,
+) -> None:
+    """Set up the serving machinery of an app, short of the routers.
+
+    Mounts the static files, sets up the config reloader, the catalog snapshot
+    and metrics middleware, the metrics endpoint, the local file streaming
+    settings and the OpenAPI schema cache. Shared by the 'serve' subcommand
+    and create_app, so both serve the same way.
+
+    Args:
+        app: The application.
+        catalog: Holder of the served catalog.
+        config_path: Config file path, reloaded on changes.
+        base_dir: Local archive directory the reloaded catalogs use.
+        reload_interval: Seconds between checks of the config file for changes;
+            0 disables the checks.
+        openapi_cache_dir: Directory to cache the OpenAPI schema in; None to
+            build it in every process.
+        chunk_size: Size of the chunks local files are streamed in.
+        fadvise: Whether to advise the kernel that served files are read
+            sequentially.
+    """
+    # the splash pages link the static files
+    app.mount(
+        "/" + STATIC_DIRNAME, StaticFiles(directory=STATIC_PATH), name=STATIC_DIRNAME
+    )
+    app.state.reloader = CatalogReloader(
+        catalog, config_path, base_dir=base_dir, interval=reload_interval
+    )
+    # the last added middleware is the outermost one; the metrics are
+    # recorded within the catalog snapshot of the request
+    app.add_middleware(MetricsMiddleware, holder=catalog)
+    app.add_middleware(CatalogSnapshotMiddleware, holder=catalog)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    registry.add_collector("catalog", catalog_collector(catalog))
+    AssetFileResponse.chunk_size = chunk_size
+    AssetFileResponse.fadvise = fadvise
+    # the page handlers read the OpenAPI version and the linked paths from the
+    # schema cache
+    app.openapi = OpenAPISchemaCache(app, catalog, cache_dir=openapi_cache_dir)
+
+
+def create_app(
+    config_path: str,
+    archive_base_dir: str | None = None,
+    reload_interval: float = 0.0,
+    openapi_cache_dir: str | None = OPENAPI_CACHE_DIR,
+) -> FastAPI:
     """Create a configured FastAPI app for refgenieserver.
 
     This builds a fresh FastAPI app with the real refgenieserver routers,
@@ -25,13 +99,20 @@ def create_app(config_path: str, archive_base_dir: str | None = None) -> FastAPI
         config_path: Path to the refgenie server config YAML.
         archive_base_dir: Override for BASE_DIR (default: /genomes).
             Used in tests to point at a temp directory.
+        reload_interval: Seconds between checks of the config file for changes;
+            the served catalog is rebuilt when the file changes. 0 disables the
+            checks; the config is reloaded on SIGHUP regardless.
+        openapi_cache_dir: Directory to cache the OpenAPI schema in, by config
+            version; None to build it in every process. The schema is built,
+            or loaded, on first use.
 
     Returns:
         Configured FastAPI app ready to serve.
     """
     # Use sys.modules to get the actual module objects. Using
     # `import refgenieserver.main as m` can return a different object
-    # than what's in sys.modules (due to __init__.py's `from .main import *`),
+    # than what's in sys.modules (the package also exports the names defined
+    # in its modules, e.g. the `main` CLI entry point),
     # which means attribute modifications won't be visible to other modules.
     import refgenieserver.const  # noqa: F401 ensure loaded
     import refgenieserver.helpers  # noqa: F401 ensure loaded
@@ -39,24 +120,24 @@ def create_app(config_path: str, archive_base_dir: str | None = None) -> FastAPI
 
     main_module = sys.modules["refgenieserver.main"]
     const_module = sys.modules["refgenieserver.const"]
-    helpers_module = sys.modules["refgenieserver.helpers"]
 
-    # Load config and purge non-servable entries
+    # Load config, purge non-servable entries and build the serving catalog
     rgc = RefGenConf.from_yaml_file(config_path)
     purge_nonservable(rgc)
+    catalog = ServingCatalog(rgc, base_dir=archive_base_dir)
 
     # Override the module-level globals that the routers import.
-    # The routers do `from ..main import _LOGGER, rgc, app, templates`
-    # which reads from main's module dict at import time.
+    # The routers do `from ..main import _LOGGER, catalog, app, templates`
+    # which reads from main's module dict at import time. The catalog holder
+    # itself is kept, so routers imported earlier see the new catalog too.
     main_module.rgc = rgc
+    main_module.catalog.swap(catalog)
     main_module._LOGGER = _LOGGER
 
     if archive_base_dir is not None:
-        # Must override BASE_DIR in both const and helpers modules,
-        # because helpers.py uses `from .const import *` which copies
-        # BASE_DIR into helpers' own namespace.
+        # The catalog resolves the local file paths on its own; BASE_DIR is
+        # overridden for any other code that reads the constant.
         const_module.BASE_DIR = archive_base_dir
-        helpers_module.BASE_DIR = archive_base_dir
 
     from ._version import __version__ as server_v
 
@@ -65,13 +146,22 @@ def create_app(config_path: str, archive_base_dir: str | None = None) -> FastAPI
         description="a web interface and RESTful API for reference genome assets",
         version=server_v,
         openapi_tags=TAGS_METADATA,
+        lifespan=main_module.lifespan,
     )
 
     # Set the app on main_module so routers that import `app` from main
     # can access it (needed for openapi spec introspection)
     main_module.app = app
+    configure_app(
+        app,
+        main_module.catalog,
+        config_path,
+        base_dir=archive_base_dir,
+        reload_interval=reload_interval,
+        openapi_cache_dir=openapi_cache_dir,
+    )
 
-    # Import routers AFTER rgc is set (they read rgc at import time)
+    # Import routers AFTER catalog is set (they read it at import time)
     from .routers import private, version3
 
     app.include_router(version3.router)
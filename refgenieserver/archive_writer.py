@@ -0,0 +1,652 @@
+"""Single-pass asset archive writer
+
+The asset directory is tarred, compressed, digested and measured in one
+stream, so neither the archive nor the asset directory has to be read again
+to determine the archive digest and the sizes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+import struct
+import tarfile
+import zlib
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import BinaryIO, Callable, Iterable, NamedTuple
+
+from .const import *
+
+try:
+    import zstandard
+except ImportError:  # zstandard is an optional dependency
+    zstandard = None
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+# deflate window size; the dictionary each block is primed with
+WINDOW_SIZE = 32 * 1024
+
+
+class ArchiveStats(NamedTuple):
+    """Properties of a written archive, determined while writing it."""
+
+    digest: str
+    archive_size: int
+    asset_size: int
+    chunk_digests: tuple[str, ...] = ()
+
+
+class DigestingWriter:
+    """Binary file wrapper digesting and counting the bytes written through it.
+
+    Optionally, every fixed-size chunk of the stream is digested on its own as
+    well.
+    """
+
+    def __init__(
+        self, f: BinaryIO, algorithm: str = "md5", chunk_size: int = 0
+    ) -> None:
+        """Wrap a binary file.
+
+        Args:
+            f: File to write to.
+            algorithm: Name of the hash algorithm.
+            chunk_size: Size of the chunks to digest separately; 0 not to.
+        """
+        self._f = f
+        self._algorithm = algorithm
+        self._hash = hashlib.new(algorithm)
+        self.size = 0
+        self.chunk_size = chunk_size
+        self._chunk_digests: list[str] = []
+        self._chunk_hash = hashlib.new(algorithm)
+
+    def write(self, data: bytes) -> int:
+        self._f.write(data)
+        self._hash.update(data)
+        if self.chunk_size:
+            view = memoryview(data)
+            while view:
+                room = self.chunk_size - self.size % self.chunk_size
+                self._chunk_hash.update(view[:room])
+                self.size += min(room, len(view))
+                view = view[room:]
+                if self.size % self.chunk_size == 0:
+                    self._chunk_digests.append(self._chunk_hash.hexdigest())
+                    self._chunk_hash = hashlib.new(self._algorithm)
+        else:
+            self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def hexdigest(self) -> str:
+        """Digest of the bytes written so far."""
+        return self._hash.hexdigest()
+
+    def chunk_hexdigests(self) -> tuple[str, ...]:
+        """Digests of the chunks written so far, including a partial last one."""
+        if self.size % self.chunk_size:
+            return (*self._chunk_digests, self._chunk_hash.hexdigest())
+        return tuple(self._chunk_digests)
+
+
+def _deflate_block(data: bytes, zdict: bytes, level: int, last: bool) -> bytes:
+    """Compress a block into a raw deflate stream fragment.
+
+    Fragments of consecutive blocks concatenate to a single valid deflate
+    stream: every but the last one ends with a sync flush, i.e. on a byte
+    boundary and without the final block bit.
+    """
+    # an empty dictionary is not accepted
+    options = {"zdict": zdict} if zdict else {}
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, **options)
+    return compressor.compress(data) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    )
+
+
+class ParallelGzipWriter:
+    """Gzip compressing file object compressing blocks on a thread pool.
+
+    Works like pigz: the input is split into fixed-size blocks that are
+    deflated independently, each primed with the last 32 KiB of the preceding
+    block as the dictionary, so the compression ratio stays close to the one
+    of a single stream. zlib releases the GIL while compressing, so the blocks
+    are compressed in parallel. The result is a standard, single member gzip
+    stream; it does not depend on the number of threads.
+
+    With independent blocks the dictionary priming is skipped, so the stream
+    can be inflated starting at any block; the compressed offsets of the blocks
+    are collected in block_offsets, followed by the end of the deflate data.
+    """
+
+    def __init__(
+        self,
+        out: BinaryIO,
+        level: int = ARCHIVE_COMPRESSION_LEVEL,
+        threads: int = ARCHIVE_COMPRESSION_THREADS,
+        block_size: int = GZIP_BLOCK_SIZE,
+        independent: bool = False,
+    ) -> None:
+        """Start a gzip stream.
+
+        Args:
+            out: Binary file object to write the compressed stream to.
+            level: Compression level, 1-9.
+            threads: Number of compression threads; 0 to use one per CPU.
+            block_size: Size of the independently compressed blocks in bytes.
+            independent: Whether to compress the blocks without the preceding
+                data as the dictionary, so they can be inflated separately.
+        """
+        self._out = out
+        self._level = level
+        self._threads = threads or os.cpu_count() or 1
+        self.block_size = block_size
+        self._independent = independent
+        self.block_offsets: list[int] = []
+        self._buffer = bytearray()
+        self._window = b""
+        self._crc = 0
+        self._size = 0
+        self._pending: deque[Future] = deque()
+        self._pool = (
+            ThreadPoolExecutor(self._threads, thread_name_prefix="gzip")
+            if self._threads > 1
+            else None
+        )
+        self.closed = False
+        # header as written by gzip.GzipFile with mtime=0 and no file name
+        xfl = b"\002" if level == 9 else b"\004" if level == 1 else b"\000"
+        header = b"\037\213\010\000" + struct.pack("<L", 0) + xfl + b"\377"
+        out.write(header)
+        self._offset = len(header)
+
+    def _emit(self, compressed: bytes) -> None:
+        self.block_offsets.append(self._offset)
+        self._out.write(compressed)
+        self._offset += len(compressed)
+
+    def _submit(self, block: bytes, last: bool) -> None:
+        args = (block, self._window, self._level, last)
+        if not self._independent:
+            self._window = block[-WINDOW_SIZE:]
+        if self._pool is None:
+            self._emit(_deflate_block(*args))
+            return
+        self._pending.append(self._pool.submit(_deflate_block, *args))
+        # keep a bounded number of blocks in flight, written in order
+        while len(self._pending) > 2 * self._threads:
+            self._emit(self._pending.popleft().result())
+
+    def write(self, data: bytes) -> int:
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        if len(self._buffer) >= self.block_size:
+            view = memoryview(self._buffer)
+            start = 0
+            while len(self._buffer) - start >= self.block_size:
+                self._submit(bytes(view[start : start + self.block_size]), False)
+                start += self.block_size
+            view.release()
+            del self._buffer[:start]
+        return len(data)
+
+    def close(self) -> None:
+        """Compress the buffered data and complete the gzip stream."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._submit(bytes(self._buffer), True)
+            self._buffer.clear()
+            while self._pending:
+                self._emit(self._pending.popleft().result())
+            self.block_offsets.append(self._offset)
+            self._out.write(struct.pack("<LL", self._crc, self._size & 0xFFFFFFFF))
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def open_gzip_writer(
+    out: DigestingWriter,
+    level: int = ARCHIVE_COMPRESSION_LEVEL,
+    threads: int = ARCHIVE_COMPRESSION_THREADS,
+    independent: bool = False,
+) -> ParallelGzipWriter:
+    """Open a gzip compressing file object writing to the output.
+
+    Args:
+        out: Binary file object to write the compressed stream to.
+        level: Compression level, 1-9.
+        threads: Number of compression threads; 0 to use one per CPU.
+        independent: Whether to compress the blocks independently, so they can
+            be inflated separately.
+
+    Returns:
+        A writable binary file object; has to be closed to complete the stream.
+    """
+    return ParallelGzipWriter(out, level, threads, independent=independent)
+
+
+def _is_excluded(relpath: str, exclude: Iterable[str]) -> bool:
+    return any(part in exclude for part in relpath.split(os.sep))
+
+
+def _add_tree(
+    tar: tarfile.TarFile,
+    src_dir: str,
+    arcname: str,
+    exclude: Iterable[str],
+    rename: Callable[[str], str] | None,
+    dereference: bool = False,
+    members: dict[str, tuple[int, int]] | None = None,
+) -> int:
+    """Add a directory tree to a tar archive, like 'tar -C <parent> -c <dir>'.
+
+    Symbolic links are archived as links, unless dereferenced; dangling links
+    are then skipped. Members whose path contains any of the excluded names
+    are skipped, but still count towards the size.
+
+    If a members dictionary is provided, the offset of the data in the tar
+    stream and the size of every regular file are added to it, keyed by the
+    path relative to the directory.
+
+    Returns:
+        Size of the directory tree in bytes, as ubiquerg.size determines it.
+    """
+    asset_size = 0
+
+    def _add(path: str, relpath: str) -> None:
+        if dereference and not os.path.exists(path):
+            _LOGGER.warning(f"Skipping dangling symbolic link: {path}")
+            return
+        name = os.path.normpath(os.path.join(arcname, relpath))
+        if rename is not None:
+            name = rename(name)
+        tarinfo = tar.gettarinfo(path, arcname=name)
+        if tarinfo.isreg():
+            with open(path, "rb") as f:
+                tar.addfile(tarinfo, f)
+            if members is not None:
+                # the data is followed by the padding to the next tar block
+                padded = -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                key = os.path.normpath(relpath).replace(os.sep, "/")
+                members[key] = (tar.offset - padded, tarinfo.size)
+        else:
+            tar.addfile(tarinfo)
+
+    _add(src_dir, "")
+    for dirpath, dirnames, filenames in os.walk(src_dir, followlinks=dereference):
+        dirnames.sort()
+        rel_dir = os.path.relpath(dirpath, src_dir)
+        skip = rel_dir != "." and _is_excluded(rel_dir, exclude)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            st = os.lstat(path)
+            asset_size += (
+                st.st_size if stat.S_ISLNK(st.st_mode) else os.path.getsize(path)
+            )
+            if not skip and name not in exclude:
+                _add(path, os.path.join(rel_dir, name))
+        if skip:
+            continue
+        for name in dirnames:
+            if name not in exclude:
+                _add(os.path.join(dirpath, name), os.path.join(rel_dir, name))
+    return asset_size
+
+
+def build_member_index(
+    members: Mapping[str, tuple[int, int]],
+    block_offsets: list[int],
+    block_size: int,
+    archive_digest: str,
+) -> dict:
+    """Build the index of the files in a gzip archive of independent blocks.
+
+    Every file is described by the byte range of the blocks its data is
+    compressed in, the number of bytes to skip after inflating the range and
+    the file size. A single file can then be extracted from the archive by
+    inflating just that byte range, e.g. fetched with a Range request.
+
+    Args:
+        members: Offsets of the data in the tar stream and sizes of the files,
+            keyed by the paths relative to the archived directory.
+        block_offsets: Archive offsets of the compressed blocks, followed by
+            the end of the deflate data.
+        block_size: Uncompressed size of the blocks.
+        archive_digest: Digest of the archive the index describes.
+
+    Returns:
+        The index: the archive digest and the [start, end, skip, size] lists
+        keyed by the file paths.
+    """
+    index = {}
+    for name, (offset, size) in members.items():
+        first = offset // block_size
+        last = (offset + size - 1) // block_size if size else first
+        index[name] = [
+            block_offsets[first],
+            block_offsets[last + 1],
+            offset - first * block_size,
+            size,
+        ]
+    return {"archive_digest": archive_digest, "members": index}
+
+
+def build_chunk_manifest(
+    stats: Mapping[str, ArchiveStats],
+    file_names: Mapping[str, str],
+    chunk_size: int,
+    algorithm: str = "md5",
+) -> dict:
+    """Build the manifest of the fixed-size chunks of archives.
+
+    Every chunk is digested on its own, so a client can download the chunks
+    over several connections, verify each of them as it arrives and fetch
+    just the corrupted ones again. The root digest is the digest of the
+    concatenated hexadecimal chunk digests.
+
+    Args:
+        stats: Properties of the archives, including the chunk digests, keyed
+            by format.
+        file_names: Archive file names, keyed by format.
+        chunk_size: Size of the chunks; the last chunk may be shorter.
+        algorithm: Name of the hash algorithm the chunks were digested with.
+
+    Returns:
+        The manifest: the chunk size and algorithm, and the archive file name,
+        digest, size, root digest and chunk digests, keyed by format.
+    """
+    archives = {}
+    for fmt, archive_stats in stats.items():
+        root = hashlib.new(algorithm, "".join(archive_stats.chunk_digests).encode())
+        archives[fmt] = {
+            "file_name": file_names[fmt],
+            "archive_digest": archive_stats.digest,
+            "archive_size": archive_stats.archive_size,
+            "root_digest": root.hexdigest(),
+            "chunks": list(archive_stats.chunk_digests),
+        }
+    return {"chunk_size": chunk_size, "algorithm": algorithm, "archives": archives}
+
+
+def write_chunk_manifest(
+    outputs: Mapping[str, str],
+    manifest_output: str,
+    chunk_size: int = ARCHIVE_CHUNK_SIZE,
+) -> dict[str, ArchiveStats]:
+    """Write the chunk manifest of archives that have already been written.
+
+    The archives are read once. The manifest is written to a temporary file
+    that replaces the output once complete.
+
+    Args:
+        outputs: Paths to the archives, keyed by format.
+        manifest_output: Path to the chunk manifest to write.
+        chunk_size: Size of the manifest chunks.
+
+    Returns:
+        The archive digests, sizes and chunk digests, keyed by format; the
+        asset directory sizes are not known and set to 0.
+
+    Raises:
+        OSError: If an archive can't be read or the manifest can't be written.
+    """
+    stats = {}
+    for fmt, output in outputs.items():
+        with open(output, "rb") as f, open(os.devnull, "wb") as null:
+            out = DigestingWriter(null, chunk_size=chunk_size)
+            shutil.copyfileobj(f, out, COPY_BUFFER_SIZE)
+        stats[fmt] = ArchiveStats(out.hexdigest(), out.size, 0, out.chunk_hexdigests())
+    file_names = {fmt: os.path.basename(o) for fmt, o in outputs.items()}
+    with open(f"{manifest_output}.partial", "w") as f:
+        json.dump(
+            build_chunk_manifest(stats, file_names, chunk_size),
+            f,
+            separators=(",", ":"),
+        )
+    os.replace(f"{manifest_output}.partial", manifest_output)
+    return stats
+
+
+class _TeeWriter:
+    """Binary file object writing the same stream to several file objects."""
+
+    def __init__(self, writers: Iterable[BinaryIO]) -> None:
+        self._writers = list(writers)
+
+    def write(self, data: bytes) -> int:
+        for writer in self._writers:
+            writer.write(data)
+        return len(data)
+
+
+def open_zstd_writer(
+    out: DigestingWriter,
+    level: int = ZSTD_COMPRESSION_LEVEL,
+    threads: int = ARCHIVE_COMPRESSION_THREADS,
+) -> BinaryIO:
+    """Open a zstd compressing file object writing to the output.
+
+    Args:
+        out: Binary file object to write the compressed stream to.
+        level: Compression level, 1-22.
+        threads: Number of compression threads; 0 to use one per CPU.
+
+    Returns:
+        A writable binary file object; has to be closed to complete the frame.
+
+    Raises:
+        ImportError: If the optional zstandard package is not installed.
+    """
+    if zstandard is None:
+        raise ImportError(
+            "zstd archives require the 'zstandard' package; "
+            "install it with: pip install refgenieserver[zstd]"
+        )
+    compressor = zstandard.ZstdCompressor(
+        level=level,
+        # zstandard: -1 uses one thread per CPU, 0 compresses in this thread
+        threads=-1 if threads == 0 else 0 if threads == 1 else threads,
+        write_checksum=True,
+    )
+    return compressor.stream_writer(out, closefd=False)
+
+
+def write_archives(
+    src_dir: str,
+    outputs: Mapping[str, str],
+    arcname: str | None = None,
+    exclude: Iterable[str] = (BUILD_STATS_DIR,),
+    rename: Callable[[str], str] | None = None,
+    dereference: bool = False,
+    level: int = ARCHIVE_COMPRESSION_LEVEL,
+    threads: int = ARCHIVE_COMPRESSION_THREADS,
+    index_output: str | None = None,
+    manifest_output: str | None = None,
+    chunk_size: int = ARCHIVE_CHUNK_SIZE,
+) -> dict[str, ArchiveStats]:
+    """Write compressed tar archives of a directory in a single pass.
+
+    The directory is read once; the tar stream is compressed into all the
+    requested formats at the same time. Each archive is written to a temporary
+    file next to its output, which is renamed to the output once complete, so
+    an interrupted build never leaves a truncated archive behind. Member names
+    are transformed while streaming, so archives with renamed members don't
+    require a renamed copy of the tree.
+
+    If an index output is given, the gzip compressed archive is written in
+    independently compressed blocks and a member index is written along with
+    it; see build_member_index. If a manifest output is given, the archives
+    are digested in chunks as well and a chunk manifest is written; see
+    build_chunk_manifest.
+
+    Args:
+        src_dir: Directory to archive.
+        outputs: Paths to the archives to write, keyed by format: 'tgz' or
+            'zst'.
+        arcname: Name of the directory in the archive; the directory base name
+            by default.
+        exclude: Names of files and directories to leave out of the archive.
+        rename: Function transforming the member names, e.g. to replace the
+            genome digest with an alias.
+        dereference: Whether to archive the files symbolic links point to
+            instead of the links.
+        level: Gzip compression level, 1-9.
+        threads: Number of compression threads per format; 0 to use one per
+            CPU.
+        index_output: Path to the member index of the gzip compressed archive
+            to write, if any.
+        manifest_output: Path to the chunk manifest of the archives to write,
+            if any.
+        chunk_size: Size of the manifest chunks.
+
+    Returns:
+        The archive digests and sizes, the size of the source directory and,
+        with a manifest output, the chunk digests, keyed by format.
+
+    Raises:
+        OSError: If the directory to be archived does not exist, or an
+            archive can't be written.
+        ValueError: If an archive format is not known, or an index is requested
+            without a gzip compressed archive.
+        ImportError: If a zstd archive is requested and the optional
+            zstandard package is not installed.
+    """
+    if not os.path.isdir(src_dir):
+        raise OSError(f"Entity '{src_dir}' does not exist")
+    unknown = set(outputs) - set(ARCHIVE_SUFFIXES)
+    if unknown:
+        raise ValueError(f"Unknown archive formats: {', '.join(sorted(unknown))}")
+    if index_output is not None and ARCHIVE_FORMAT_TGZ not in outputs:
+        raise ValueError("A member index requires a gzip compressed archive")
+    arcname = arcname or os.path.basename(os.path.normpath(src_dir))
+    partial_outputs = {fmt: f"{output}.partial" for fmt, output in outputs.items()}
+    members = {} if index_output is not None else None
+    # JSON files written along with the archives, by path
+    sidecars = {}
+    with ExitStack() as stack:
+        try:
+            digesting, compressors = {}, []
+            for fmt, partial_output in partial_outputs.items():
+                out = DigestingWriter(
+                    stack.enter_context(open(partial_output, "wb")),
+                    chunk_size=chunk_size if manifest_output is not None else 0,
+                )
+                digesting[fmt] = out
+                if fmt == ARCHIVE_FORMAT_ZSTD:
+                    compressor = open_zstd_writer(out, threads=threads)
+                else:
+                    compressor = gz = open_gzip_writer(
+                        out, level, threads, independent=members is not None
+                    )
+                # the compressors are closed before the files they write to
+                stack.callback(compressor.close)
+                compressors.append(compressor)
+            with tarfile.open(
+                fileobj=_TeeWriter(compressors),
+                mode="w|",
+                format=tarfile.GNU_FORMAT,
+                dereference=dereference,
+                copybufsize=COPY_BUFFER_SIZE,
+            ) as tar:
+                asset_size = _add_tree(
+                    tar, src_dir, arcname, exclude, rename, dereference, members
+                )
+            stack.close()
+            stats = {}
+            for fmt, out in digesting.items():
+                stats[fmt] = ArchiveStats(
+                    out.hexdigest(),
+                    out.size,
+                    asset_size,
+                    out.chunk_hexdigests() if out.chunk_size else (),
+                )
+            if members is not None:
+                sidecars[index_output] = build_member_index(
+                    members,
+                    gz.block_offsets,
+                    gz.block_size,
+                    stats[ARCHIVE_FORMAT_TGZ].digest,
+                )
+            if manifest_output is not None:
+                file_names = {fmt: os.path.basename(o) for fmt, o in outputs.items()}
+                sidecars[manifest_output] = build_chunk_manifest(
+                    stats, file_names, chunk_size
+                )
+            for path, obj in sidecars.items():
+                with open(f"{path}.partial", "w") as f:
+                    json.dump(obj, f, separators=(",", ":"))
+            for fmt, output in outputs.items():
+                os.replace(partial_outputs[fmt], output)
+            for path in sidecars:
+                os.replace(f"{path}.partial", path)
+        except BaseException:
+            stack.close()
+            partials = [*partial_outputs.values()]
+            partials += [f"{path}.partial" for path in sidecars]
+            for partial_output in partials:
+                if os.path.exists(partial_output):
+                    os.remove(partial_output)
+            raise
+    for fmt, output in outputs.items():
+        _LOGGER.debug(f"Archive written: {output} ({stats[fmt].archive_size} bytes)")
+    return stats
+
+
+def write_archive(
+    src_dir: str,
+    output: str,
+    arcname: str | None = None,
+    exclude: Iterable[str] = (BUILD_STATS_DIR,),
+    rename: Callable[[str], str] | None = None,
+    dereference: bool = False,
+    level: int = ARCHIVE_COMPRESSION_LEVEL,
+    threads: int = ARCHIVE_COMPRESSION_THREADS,
+) -> ArchiveStats:
+    """Write a gzip compressed tar archive of a directory in a single pass.
+
+    See write_archives for the details.
+
+    Args:
+        src_dir: Directory to archive.
+        output: Path to the archive to write.
+        arcname: Name of the directory in the archive; the directory base name
+            by default.
+        exclude: Names of files and directories to leave out of the archive.
+        rename: Function transforming the member names.
+        dereference: Whether to archive the files symbolic links point to
+            instead of the links.
+        level: Compression level, 1-9.
+        threads: Number of compression threads; 0 to use one per CPU.
+
+    Returns:
+        The archive digest and size, and the size of the source directory.
+
+    Raises:
+        OSError: If the directory to be archived does not exist, or the
+            archive can't be written.
+    """
+    return write_archives(
+        src_dir,
+        {ARCHIVE_FORMAT_TGZ: output},
+        arcname=arcname,
+        exclude=exclude,
+        rename=rename,
+        dereference=dereference,
+        level=level,
+        threads=threads,
+    )[ARCHIVE_FORMAT_TGZ]
@@ -0,0 +1,187 @@
+"""Non-blocking file system and remote data access for the request handlers"""
+
+from __future__ import annotations
+
+import logging
+import os
+import stat
+from collections.abc import AsyncIterator
+from json import loads
+from typing import Any
+
+import anyio
+import httpx
+
+from .const import *
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+_disk_limiter: anyio.CapacityLimiter | None = None
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_disk_limiter() -> anyio.CapacityLimiter:
+    # the limiter binds to the running event loop, so it is created lazily
+    global _disk_limiter
+    if _disk_limiter is None:
+        _disk_limiter = anyio.CapacityLimiter(DISK_IO_THREADS)
+    return _disk_limiter
+
+
+async def run_disk_io(func: Any, *args: Any) -> Any:
+    """Run a blocking file system call in the bounded disk I/O thread pool.
+
+    Args:
+        func: Function to call.
+        *args: Positional arguments to call the function with.
+
+    Returns:
+        The function result.
+    """
+    return await anyio.to_thread.run_sync(func, *args, limiter=_get_disk_limiter())
+
+
+def _stat_regular_file(path: str) -> os.stat_result | None:
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result if stat.S_ISREG(stat_result.st_mode) else None
+
+
+async def stat_file(path: str) -> os.stat_result | None:
+    """Stat a file without blocking the event loop.
+
+    Args:
+        path: File path.
+
+    Returns:
+        Result of os.stat or None if the path is not an existing regular file.
+    """
+    return await run_disk_io(_stat_regular_file, path)
+
+
+def _read_text(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+async def read_json_file(path: str) -> Any:
+    """Read and decode a JSON file without blocking the event loop.
+
+    Args:
+        path: File path.
+
+    Returns:
+        The decoded JSON object.
+
+    Raises:
+        OSError: If the file can't be read.
+        ValueError: If the file is not valid JSON.
+    """
+    return loads(await run_disk_io(_read_text, path))
+
+
+def _pread(path: str, size: int, offset: int) -> bytes:
+    with open(path, "rb") as f:
+        return os.pread(f.fileno(), size, offset)
+
+
+async def read_file_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """Read a byte range of a file in chunks without blocking the event loop.
+
+    Args:
+        path: File path.
+        start: Offset of the first byte.
+        end: Offset after the last byte.
+
+    Yields:
+        The chunks of the range, each at most DEFAULT_CHUNK_SIZE bytes.
+
+    Raises:
+        OSError: If the file can't be read or ends before the range does.
+    """
+    while start < end:
+        chunk = await run_disk_io(
+            _pread, path, min(DEFAULT_CHUNK_SIZE, end - start), start
+        )
+        if not chunk:
+            raise OSError(f"Unexpected end of file at byte {start}: {path}")
+        start += len(chunk)
+        yield chunk
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the pooled HTTP client used for the remote data requests.
+
+    Returns:
+        The shared client, created on the first use.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REMOTE_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=REMOTE_MAX_CONNECTIONS,
+                max_keepalive_connections=REMOTE_MAX_CONNECTIONS,
+            ),
+            follow_redirects=True,
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the pooled HTTP client, if it has been created."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def fetch_json(url: str) -> Any:
+    """Download a JSON object without blocking the event loop.
+
+    Args:
+        url: URL to query.
+
+    Returns:
+        The decoded JSON object.
+
+    Raises:
+        httpx.HTTPError: If the request fails, times out or the response status
+            is not successful.
+        ValueError: If the response is not valid JSON.
+    """
+    _LOGGER.debug(f"Downloading JSON data; querying URL: {url}")
+    response = await get_http_client().get(url)
+    response.raise_for_status()
+    return response.json()
+
+
+async def fetch_range(url: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """Download a byte range of a remote file with a Range request.
+
+    Args:
+        url: URL of the file.
+        start: Offset of the first byte.
+        end: Offset after the last byte.
+
+    Yields:
+        The chunks of the range as they are received.
+
+    Raises:
+        httpx.HTTPError: If the request fails, times out or the response status
+            is not 206 (Partial Content), e.g. the server ignored the range.
+    """
+    _LOGGER.debug(f"Downloading bytes {start}-{end - 1}; querying URL: {url}")
+    headers = {"range": f"bytes={start}-{end - 1}"}
+    async with get_http_client().stream("GET", url, headers=headers) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise httpx.HTTPStatusError(
+                f"Range request not supported: {url}",
+                request=response.request,
+                response=response,
+            )
+        async for chunk in response.aiter_bytes():
+            yield chunk
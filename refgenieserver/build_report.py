@@ -0,0 +1,205 @@
+"""Wall time, bytes and throughput of the archiver build stages"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import BoundedSemaphore
+from typing import Any
+
+from .const import *
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+MIB: int = 1024 * 1024
+
+
+class StageTimer:
+    """Wall time and bytes processed by named build stages.
+
+    Repeated stages add up. A timer is not thread-safe; every tag is timed by
+    its own timer and the run-level stages by the report's one.
+    """
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self.bytes: dict[str, int] = {}
+        self.output_bytes: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage; the time is recorded even if the stage fails.
+
+        Args:
+            name: Stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_seconds(name, time.perf_counter() - start)
+
+    @contextmanager
+    def disk_stage(self, name: str, slots: BoundedSemaphore) -> Iterator[None]:
+        """Time a disk-heavy stage, and the wait for a disk slot separately.
+
+        Args:
+            name: Stage name.
+            slots: Semaphore limiting the concurrent disk-heavy stages.
+        """
+        with self.stage(STAGE_DISK_WAIT):
+            slots.acquire()
+        try:
+            with self.stage(name):
+                yield
+        finally:
+            slots.release()
+
+    def add_seconds(self, name: str, seconds: float) -> None:
+        """Record wall time of a stage timed by the caller.
+
+        Args:
+            name: Stage name.
+            seconds: Wall time in seconds.
+        """
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def add_bytes(self, name: str, nbytes: int, output_bytes: int = 0) -> None:
+        """Record bytes processed by a stage.
+
+        Args:
+            name: Stage name.
+            nbytes: Bytes read by the stage; the throughput is based on these.
+            output_bytes: Bytes written by the stage, if different, e.g. the
+                compressed archive size.
+        """
+        self.bytes[name] = self.bytes.get(name, 0) + nbytes
+        if output_bytes:
+            self.output_bytes[name] = self.output_bytes.get(name, 0) + output_bytes
+
+    def merge(self, other: StageTimer) -> None:
+        """Add the stages of another timer to the stages of this one.
+
+        Args:
+            other: Timer to add.
+        """
+        for name, seconds in other.seconds.items():
+            self.add_seconds(name, seconds)
+        for name, nbytes in other.bytes.items():
+            self.add_bytes(name, nbytes, other.output_bytes.get(name, 0))
+
+    def as_dict(self) -> dict[str, dict[str, float]]:
+        """Get the stages, in the order they were first timed.
+
+        Returns:
+            Wall time in seconds, bytes and throughput in MiB/s of every
+            stage, keyed by stage name.
+        """
+        stages = {}
+        for name, seconds in self.seconds.items():
+            stage = {"seconds": round(seconds, 6)}
+            if name in self.bytes:
+                stage["bytes"] = self.bytes[name]
+                if seconds > 0:
+                    stage["mb_per_s"] = round(self.bytes[name] / seconds / MIB, 3)
+            if name in self.output_bytes:
+                stage["output_bytes"] = self.output_bytes[name]
+            stages[name] = stage
+        return stages
+
+
+class BuildReport:
+    """Timing report of an archiver run: run-level stages and per-tag stages.
+
+    Tags are added from the thread that records the built tags in the server
+    config, so no locking is needed.
+    """
+
+    def __init__(self, settings: dict[str, Any] | None = None) -> None:
+        """Start a report.
+
+        Args:
+            settings: Build settings to include in the report, e.g. the
+                number of jobs and the compression options.
+        """
+        self.settings = settings or {}
+        self.run = StageTimer()
+        self.totals = StageTimer()
+        self.tags: list[dict[str, Any]] = []
+        # tag counts by outcome, set at the end of the run
+        self.summary: dict[str, int] = {}
+        self._started = time.time()
+        self._start = time.perf_counter()
+
+    def add_tag(self, registry_path: str, timer: StageTimer, built: bool) -> None:
+        """Add the stages of a built or failed tag.
+
+        Args:
+            registry_path: Registry path of the tag, 'genome/asset:tag'.
+            timer: Stage timer of the tag.
+            built: Whether the tag was built successfully.
+        """
+        self.totals.merge(timer)
+        self.tags.append(
+            {
+                "registry_path": registry_path,
+                "status": "built" if built else "failed",
+                "seconds": round(sum(timer.seconds.values()), 6),
+                "stages": timer.as_dict(),
+            }
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get the report as a JSON-serializable object.
+
+        Returns:
+            The report: the build settings, the run wall time, the tag counts
+            by outcome, the run-level stages, the tag stages summed over all
+            tags (these add up to more than the wall time when tags are built
+            concurrently) and the stages of every tag.
+        """
+        started = time.localtime(self._started)
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", started),
+            "wall_seconds": round(time.perf_counter() - self._start, 6),
+            "settings": self.settings,
+            "summary": self.summary,
+            "run_stages": self.run.as_dict(),
+            "tag_stage_totals": self.totals.as_dict(),
+            "tags": self.tags,
+        }
+
+    def log_summary(self) -> None:
+        """Log the stages that took the most time, over the tags and the run."""
+        stages = dict(self.totals.seconds)
+        stages.pop(STAGE_DISK_WAIT, None)
+        for name, seconds in self.run.seconds.items():
+            stages[name] = stages.get(name, 0.0) + seconds
+        total = sum(stages.values())
+        if not total:
+            return
+        shares = ", ".join(
+            f"{name} {seconds:.2f}s ({seconds / total:.0%})"
+            for name, seconds in sorted(stages.items(), key=lambda s: -s[1])
+        )
+        _LOGGER.info(f"Archive stage times: {shares}")
+
+    def write(self, path: str) -> None:
+        """Write the report as JSON.
+
+        The report is written to a temporary file that replaces the target
+        once complete.
+
+        Args:
+            path: Report file path.
+        """
+        partial = path + ".partial"
+        with open(partial, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+            f.write("\n")
+        os.replace(partial, path)
+        _LOGGER.info(f"Archive timing report saved: {path}")
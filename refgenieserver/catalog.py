@@ -0,0 +1,473 @@
+"""Precomputed, read-only serving catalog"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import deepcopy
+from hashlib import md5
+from json import dumps
+from typing import TYPE_CHECKING, Any
+
+from yacman import UndefinedAliasError
+
+from .const import *
+from .helpers import is_data_remote
+
+if TYPE_CHECKING:
+    from refgenconf import RefGenConf
+    from starlette.types import ASGIApp, Receive, Scope, Send
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+
+class ServingCatalog(Mapping):
+    """Immutable snapshot of the servable genome config with flat lookup indexes.
+
+    The catalog is built once from a RefGenConf object that has already been
+    processed with purge_nonservable. It keeps private copies of the 'genomes'
+    and 'remotes' config sections, so request handlers never traverse the live
+    config object.
+
+    The version attribute is a digest of the served config sections; it
+    identifies the catalog contents, e.g. for caching rendered responses.
+
+    The object behaves like a read-only mapping of the config sections (e.g.
+    catalog["genomes"]) and mirrors the subset of the RefGenConf read API used
+    by the routers and templates, e.g. get_default_tag or get_genome_alias.
+    """
+
+    __slots__ = (
+        "_cfg",
+        "_genome_keys",
+        "_aliases",
+        "_tags",
+        "_default_tags",
+        "_genome_attrs",
+        "_genomes_list",
+        "_genomes_by_asset",
+        "_assets_by_genome",
+        "_asset_tags_by_genome",
+        "_local_base",
+        "_remote_bases",
+        "is_remote",
+        "version",
+    )
+
+    def __init__(self, rgc: RefGenConf, base_dir: str | None = None) -> None:
+        """Build the catalog from a purged configuration object.
+
+        Args:
+            rgc: Configuration object with servable entries only.
+            base_dir: Local archive directory to build the file paths from.
+                BASE_DIR is used if not specified.
+        """
+        genomes = deepcopy(dict(rgc[CFG_GENOMES_KEY] or {}))
+        cfg = {CFG_GENOMES_KEY: genomes}
+        if "remotes" in rgc:
+            cfg["remotes"] = deepcopy(rgc["remotes"])
+        is_remote = is_data_remote(rgc)
+
+        genome_keys, aliases, genome_attrs = {}, {}, {}
+        tags, default_tags = {}, {}
+        genomes_by_asset = {}
+        for digest, genome in genomes.items():
+            aliases[digest] = list(genome.get(CFG_ALIASES_KEY) or [])
+            for alias in aliases[digest]:
+                genome_keys.setdefault(alias, digest)
+            try:
+                genome_attrs[digest] = rgc.get_genome_attributes(digest)
+            except KeyError:
+                pass
+            for asset_name, asset in (genome.get(CFG_ASSETS_KEY) or {}).items():
+                genomes_by_asset.setdefault(asset_name, []).append(digest)
+                default_tags[(digest, asset_name)] = rgc.get_default_tag(
+                    digest, asset_name
+                )
+                for tag_name, tag in (asset.get(CFG_ASSET_TAGS_KEY) or {}).items():
+                    tag.pop(CFG_SOURCE_FINGERPRINT_KEY, None)
+                    if CFG_ZSTD_ARCHIVE_CHECKSUM_KEY in tag and not tag.get(
+                        CFG_ZSTD_ARCHIVE_CHECKSUM_KEY
+                    ):
+                        # the zstd archive has been removed by a later build
+                        tag.pop(CFG_ZSTD_ARCHIVE_CHECKSUM_KEY)
+                        tag.pop(CFG_ZSTD_ARCHIVE_SIZE_KEY, None)
+                    tags[(digest, asset_name, tag_name)] = tag
+        # digests take precedence over aliases with the same name
+        genome_keys.update({digest: digest for digest in genomes})
+
+        def _by_digest(alias_keyed: Mapping[str, list[str]]) -> dict[str, list[str]]:
+            return {
+                rgc.get_genome_alias_digest(alias=alias, fallback=True): list(assets)
+                for alias, assets in alias_keyed.items()
+            }
+
+        setattr_ = super().__setattr__
+        setattr_("_cfg", cfg)
+        setattr_("_genome_keys", genome_keys)
+        setattr_("_aliases", aliases)
+        setattr_("_tags", tags)
+        setattr_("_default_tags", default_tags)
+        setattr_("_genome_attrs", genome_attrs)
+        setattr_("_genomes_list", rgc.genomes_list())
+        setattr_(
+            "_genomes_by_asset", {a: sorted(g) for a, g in genomes_by_asset.items()}
+        )
+        setattr_("_assets_by_genome", _by_digest(rgc.list_assets_by_genome()))
+        setattr_("_asset_tags_by_genome", _by_digest(rgc.list(include_tags=True)))
+        setattr_("_local_base", BASE_DIR if base_dir is None else base_dir)
+        setattr_(
+            "_remote_bases",
+            {k: r["prefix"].rstrip("/") for k, r in cfg["remotes"].items()}
+            if is_remote
+            else {},
+        )
+        setattr_("is_remote", is_remote)
+        setattr_(
+            "version",
+            md5(dumps(cfg, sort_keys=True, default=str).encode("utf-8")).hexdigest(),
+        )
+        _LOGGER.debug(
+            f"Serving catalog built: {len(genomes)} genomes, {len(tags)} tags, "
+            f"version {self.version}"
+        )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        return self._cfg[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._cfg)
+
+    def __len__(self) -> int:
+        return len(self._cfg)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(genomes={len(self.genomes)}, "
+            f"tags={len(self._tags)})"
+        )
+
+    @property
+    def genomes(self) -> dict[str, dict]:
+        """The 'genomes' section of the config, keyed by genome digests."""
+        return self._cfg[CFG_GENOMES_KEY]
+
+    @property
+    def remotes(self) -> dict[str, dict] | None:
+        """The 'remotes' section of the config, if defined."""
+        return self._cfg.get("remotes")
+
+    @property
+    def remote_classes(self) -> list[str]:
+        """Remote data provider classes the asset file paths can be built for."""
+        return list(self._remote_bases) if self.is_remote else ["http"]
+
+    @property
+    def tag_count(self) -> int:
+        """Number of servable genome/asset:tag combinations."""
+        return len(self._tags)
+
+    def resolve_genome(self, genome: str) -> str | None:
+        """Get the digest of a genome identified by a digest or an alias.
+
+        Args:
+            genome: Genome digest or alias.
+
+        Returns:
+            The genome digest or None if the genome is not served.
+        """
+        return self._genome_keys.get(genome)
+
+    def genomes_list(self) -> list[str]:
+        """Get a list of served genome names, as RefGenConf.genomes_list does.
+
+        Returns:
+            List of genome aliases (digests for genomes with no aliases).
+        """
+        return list(self._genomes_list)
+
+    def get_genome_alias_digest(self, alias: str, fallback: bool = False) -> str:
+        """Get the genome digest for an alias.
+
+        Args:
+            alias: Genome alias.
+            fallback: Whether to return the alias if no digest is found.
+
+        Returns:
+            The genome digest.
+
+        Raises:
+            UndefinedAliasError: If the alias is not defined and fallback is off.
+        """
+        digest = self._genome_keys.get(alias)
+        if digest is not None and digest != alias:
+            return digest
+        if fallback:
+            return alias
+        raise UndefinedAliasError(f"No digest defined for '{alias}'")
+
+    def get_genome_alias(
+        self, digest: str, fallback: bool = False, all_aliases: bool = False
+    ) -> str | list[str]:
+        """Get the genome alias (or all aliases) for a digest.
+
+        Args:
+            digest: Genome digest.
+            fallback: Whether to return the digest if no alias is found.
+            all_aliases: Whether to return all the aliases instead of the first.
+
+        Returns:
+            The genome alias or a list of aliases.
+
+        Raises:
+            UndefinedAliasError: If no alias is defined and fallback is off.
+        """
+        aliases = self._aliases.get(digest)
+        if aliases:
+            return list(aliases) if all_aliases else aliases[0]
+        if fallback:
+            return [digest] if all_aliases else digest
+        raise UndefinedAliasError(f"No alias defined for '{digest}'")
+
+    def get_genome_attributes(self, genome: str) -> dict[str, Any]:
+        """Get the genome attributes, as RefGenConf.get_genome_attributes does.
+
+        Args:
+            genome: Genome digest or alias.
+
+        Returns:
+            Mapping of genome attributes.
+
+        Raises:
+            KeyError: If the genome is not served.
+        """
+        return self._genome_attrs[self.resolve_genome(genome)]
+
+    def get_default_tag(self, genome: str, asset: str) -> str:
+        """Get the default tag of an asset.
+
+        Args:
+            genome: Genome digest or alias.
+            asset: Asset name.
+
+        Returns:
+            The default tag name; DEFAULT_TAG for nonexistent genome/asset.
+        """
+        return self._default_tags.get((self.resolve_genome(genome), asset), DEFAULT_TAG)
+
+    def has_asset(self, genome: str, asset: str) -> bool:
+        """Check whether an asset is defined for a genome.
+
+        Args:
+            genome: Genome digest or alias.
+            asset: Asset name.
+
+        Returns:
+            Whether the genome is served and has the asset defined.
+        """
+        return (self.resolve_genome(genome), asset) in self._default_tags
+
+    def get_tag(self, genome: str, asset: str, tag: str) -> dict[str, Any]:
+        """Get the attributes of a genome/asset:tag combination.
+
+        Args:
+            genome: Genome digest or alias.
+            asset: Asset name.
+            tag: Tag name.
+
+        Returns:
+            Mapping of tag attributes. Must not be modified.
+
+        Raises:
+            KeyError: If the genome/asset:tag combination is not served.
+        """
+        return self._tags[(self.resolve_genome(genome), asset, tag)]
+
+    def list_assets_by_genome(
+        self, genome: str | None = None
+    ) -> dict[str, list[str]] | list[str]:
+        """Get the asset names, either for a single genome or for all.
+
+        Args:
+            genome: Genome digest or alias. All genomes are listed if not given.
+
+        Returns:
+            List of asset names or a mapping of these keyed by genome digests.
+
+        Raises:
+            KeyError: If the genome is not served.
+        """
+        if genome is not None:
+            return list(self._assets_by_genome[self.resolve_genome(genome)])
+        return {g: list(a) for g, a in self._assets_by_genome.items()}
+
+    def list_asset_tags_by_genome(self) -> dict[str, list[str]]:
+        """Get the asset registry paths, as RefGenConf.list(include_tags=True) does.
+
+        Returns:
+            Mapping of asset registry path lists keyed by genome digests.
+        """
+        return {g: list(a) for g, a in self._asset_tags_by_genome.items()}
+
+    def list(self, include_tags: bool = False) -> dict[str, list[str]]:
+        """Get the assets keyed by genome aliases, as RefGenConf.list does.
+
+        Args:
+            include_tags: Whether to list the asset registry paths with tags.
+
+        Returns:
+            Mapping of asset lists keyed by genome aliases.
+        """
+        src = self._asset_tags_by_genome if include_tags else self._assets_by_genome
+        return {
+            self.get_genome_alias(digest=g, fallback=True): list(a)
+            for g, a in src.items()
+        }
+
+    def list_genomes_by_asset(self, asset: str) -> list[str]:
+        """Get the digests of the genomes that have the asset defined.
+
+        Args:
+            asset: Asset name.
+
+        Returns:
+            List of genome digests.
+        """
+        return list(self._genomes_by_asset.get(asset, []))
+
+    def get_path_base(self, remote_key: str | None = None) -> str:
+        """Get the data path prefix to build the served file paths from.
+
+        Args:
+            remote_key: Key identifying the remote data provider. Required if
+                'remotes' are defined in the config.
+
+        Returns:
+            Local archive directory or the remote URL prefix.
+
+        Raises:
+            ValueError: If remotes are defined and no remote key is given.
+            KeyError: If the remote key is not defined in the remotes mapping.
+        """
+        if not self.is_remote:
+            return self._local_base
+        if remote_key is None:
+            raise ValueError(
+                f"'remotes' key found in config; the 'remote_key' argument must "
+                f"be one of: {list(self._remote_bases.keys())} "
+            )
+        try:
+            return self._remote_bases[remote_key]
+        except KeyError:
+            raise KeyError(
+                f"In remotes mapping the '{remote_key}' not found. "
+                f"Can't determine a data path prefix identified by this key."
+            )
+
+
+class CatalogHolder:
+    """Swappable reference to the current serving catalog.
+
+    The routers hold on to a single CatalogHolder for the lifetime of the
+    process, while the catalog it refers to can be replaced atomically, e.g.
+    when the server config is reloaded. Attribute and item access is forwarded
+    to the current catalog, so the holder can be used wherever a ServingCatalog
+    is expected.
+
+    Within a pinned() block, e.g. for the duration of a request (see
+    CatalogSnapshotMiddleware), the holder keeps referring to the catalog that
+    was current when the block was entered, so a request sees a consistent
+    snapshot even if a new catalog is swapped in meanwhile.
+    """
+
+    __slots__ = ("_catalog", "_snapshot")
+
+    def __init__(self, catalog: ServingCatalog | None = None) -> None:
+        """Create a holder.
+
+        Args:
+            catalog: The initial catalog, if already built.
+        """
+        self._catalog = catalog
+        self._snapshot: ContextVar[ServingCatalog | None] = ContextVar(
+            f"catalog_snapshot_{id(self)}", default=None
+        )
+
+    @property
+    def current(self) -> ServingCatalog:
+        """The pinned catalog snapshot, if any, the latest catalog otherwise."""
+        catalog = self._snapshot.get()
+        if catalog is None:
+            catalog = self._catalog
+            if catalog is None:
+                raise RuntimeError("The serving catalog has not been built yet")
+        return catalog
+
+    def swap(self, catalog: ServingCatalog) -> ServingCatalog | None:
+        """Replace the catalog; pinned snapshots are not affected.
+
+        Args:
+            catalog: The new catalog.
+
+        Returns:
+            The replaced catalog, if any.
+        """
+        old, self._catalog = self._catalog, catalog
+        return old
+
+    @contextmanager
+    def pinned(self) -> Iterator[ServingCatalog]:
+        """Pin the current catalog for the duration of the block.
+
+        Returns:
+            Context manager yielding the pinned catalog.
+        """
+        token = self._snapshot.set(self._catalog)
+        try:
+            yield self._catalog
+        finally:
+            self._snapshot.reset(token)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.current, name)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.current[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.current)
+
+    def __len__(self) -> int:
+        return len(self.current)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.current
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._catalog!r})"
+
+
+class CatalogSnapshotMiddleware:
+    """ASGI middleware pinning the current catalog for each request."""
+
+    def __init__(self, app: ASGIApp, holder: CatalogHolder) -> None:
+        """Wrap an application.
+
+        Args:
+            app: The wrapped ASGI application.
+            holder: Catalog holder to pin the catalog of.
+        """
+        self.app = app
+        self.holder = holder
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with self.holder.pinned():
+            await self.app(scope, receive, send)
@@ -0,0 +1,299 @@
+"""Command line interface
+
+Only the subcommand being run imports what it needs: 'archive' runs without
+importing FastAPI, the routers or the server middleware.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+import logmuse
+from refgenconf import RefGenConf, select_genome_config
+from ubiquerg import VersionInHelpParser, parse_registry_path
+
+from ._version import __version__ as v
+from .const import *
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser.
+
+    Returns:
+        The configured argument parser.
+    """
+    env_var_val = "not set"
+    for var in CFG_ENV_VARS:
+        val = os.environ.get(var)
+        if val is not None:
+            env_var_val = val
+            break
+    banner = "%(prog)s - refgenie web server utilities"
+    additional_description = (
+        "For subcommand-specific options, type: '%(prog)s <subcommand> -h'"
+    )
+    additional_description += "\nhttps://github.com/databio/refgenieserver"
+
+    parser = VersionInHelpParser(
+        prog=PKG_NAME, description=banner, epilog=additional_description
+    )
+
+    parser.add_argument(
+        "-V", "--version", action="version", version="%(prog)s {v}".format(v=v)
+    )
+
+    msg_by_cmd = {"serve": "run the server", "archive": "prepare servable archives"}
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    def add_subparser(cmd, description):
+        return subparsers.add_parser(cmd, description=description, help=description)
+
+    sps = {}
+    # add arguments that are common for both subparsers
+    for cmd, desc in msg_by_cmd.items():
+        sps[cmd] = add_subparser(cmd, desc)
+        (
+            sps[cmd].add_argument(
+                "-c",
+                "--config",
+                required=False,
+                dest="config",
+                help=f"A path to the refgenie config file (YAML). If not provided, the "
+                f"first available environment variable among: "
+                f"'{', '.join(CFG_ENV_VARS)}' will be used if set. "
+                f"Currently: {env_var_val}",
+            ),
+        )
+        sps[cmd].add_argument(
+            "-d",
+            "--dbg",
+            action="store_true",
+            dest="debug",
+            help="Set logger verbosity to debug",
+        )
+    # add subparser-specific arguments
+    sps["serve"].add_argument(
+        "-p",
+        "--port",
+        dest="port",
+        type=int,
+        help="The port the webserver should be run on.",
+        default=DEFAULT_PORT,
+    )
+    sps["serve"].add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        type=int,
+        default=1,
+        help="Number of worker processes; the workers are forked after the "
+        "catalog is loaded and share it. Default: 1",
+    )
+    sps["serve"].add_argument(
+        "--uds",
+        dest="uds",
+        type=str,
+        default=None,
+        help="Bind to a UNIX domain socket at this path instead of the port",
+    )
+    sps["serve"].add_argument(
+        "--backlog",
+        dest="backlog",
+        type=int,
+        default=2048,
+        help="Max number of pending connections. Default: 2048",
+    )
+    sps["serve"].add_argument(
+        "--timeout-keep-alive",
+        dest="timeout_keep_alive",
+        type=int,
+        default=5,
+        help="Seconds to keep idle connections open. Default: 5",
+    )
+    sps["serve"].add_argument(
+        "--limit-concurrency",
+        dest="limit_concurrency",
+        type=int,
+        default=None,
+        help="Max number of concurrent connections and tasks per worker; "
+        "requests beyond it are answered with 503",
+    )
+    sps["serve"].add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Size (in bytes) of the chunks local files are read and sent in; "
+        "rounded up to a multiple of the memory page size. uvicorn, which 'serve' "
+        "runs, lacks the ASGI zero-copy send extension, so files are always "
+        "streamed in chunks; zero-copy sendfile needs an ASGI server with that "
+        f"extension, running create_app(). Default: {DEFAULT_CHUNK_SIZE}",
+    )
+    sps["serve"].add_argument(
+        "--no-fadvise",
+        action="store_false",
+        dest="fadvise",
+        help="Do not advise the kernel that served files are read sequentially",
+    )
+    sps["serve"].add_argument(
+        "--openapi-cache",
+        dest="openapi_cache",
+        type=str,
+        default=OPENAPI_CACHE_DIR,
+        help="Directory to cache the OpenAPI schema in, by config version, so "
+        "restarted servers do not build it again; an empty string disables the "
+        f"cache. Default: {OPENAPI_CACHE_DIR}",
+    )
+    sps["serve"].add_argument(
+        "--reload-interval",
+        dest="reload_interval",
+        type=float,
+        default=0,
+        help="Seconds between checks of the config file for changes; the served "
+        "catalog is rebuilt when the file changes. The config is also reloaded on "
+        "SIGHUP. Default: 0 (no checks)",
+    )
+    sps["archive"].add_argument(
+        "--genomes-desc",
+        dest="genomes_desc",
+        type=str,
+        default=None,
+        help="Path to a CSV file with genomes descriptions. "
+        "Format: genome_name, genome description",
+    )
+    sps["archive"].add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        dest="force",
+        help="whether the server file tree should be rebuilt even if exists",
+    )
+    sps["archive"].add_argument(
+        "-r",
+        "--remove",
+        action="store_true",
+        dest="remove",
+        help="Remove selected genome, genome/asset or genome/asset:tag",
+    )
+    sps["archive"].add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="Number of tags to build concurrently, largest assets first. Default: 1",
+    )
+    sps["archive"].add_argument(
+        "--disk-jobs",
+        dest="disk_jobs",
+        type=int,
+        default=DEFAULT_DISK_JOBS,
+        help="Max number of concurrent disk-heavy build stages (copying, "
+        f"archiving, checksumming) when building with multiple jobs. "
+        f"Default: {DEFAULT_DISK_JOBS}",
+    )
+    sps["archive"].add_argument(
+        "--flush-every",
+        dest="flush_every",
+        type=int,
+        default=DEFAULT_FLUSH_EVERY,
+        help="Number of tag updates to write the server config after; updates "
+        "are journaled in between. 0 writes the config only at the end. "
+        f"Default: {DEFAULT_FLUSH_EVERY}",
+    )
+    sps["archive"].add_argument(
+        "--compression-level",
+        dest="compression_level",
+        type=int,
+        choices=range(1, 10),
+        metavar="{1-9}",
+        default=ARCHIVE_COMPRESSION_LEVEL,
+        help=f"Archive gzip compression level. Default: {ARCHIVE_COMPRESSION_LEVEL}",
+    )
+    sps["archive"].add_argument(
+        "--compression-threads",
+        dest="compression_threads",
+        type=int,
+        default=ARCHIVE_COMPRESSION_THREADS,
+        help="Number of threads compressing each archive. Every tag built "
+        "concurrently (--jobs) compresses its gzip and, with --zstd, zstd archive "
+        "with this many threads each, so the total is up to jobs x 2 x threads. "
+        "0 divides the CPUs among them. "
+        f"Default: {ARCHIVE_COMPRESSION_THREADS}",
+    )
+    sps["archive"].add_argument(
+        "--zstd",
+        action="store_true",
+        dest="zstd",
+        help="Build zstd compressed archives (.tar.zst) along with the gzip "
+        "compressed ones. Requires the 'zstandard' package",
+    )
+    sps["archive"].add_argument(
+        "--report",
+        dest="report",
+        type=str,
+        default=None,
+        help="Path to write a JSON report of the wall time, bytes and throughput "
+        "of the build stages, per tag and in total, to",
+    )
+    sps["archive"].add_argument(
+        "asset_registry_paths",
+        metavar="asset-registry-paths",
+        type=str,
+        nargs="*",
+        help="One or more registry path strings that identify assets, e.g. hg38/fasta:tag",
+    )
+    return parser
+
+
+def main() -> None:
+    """Entry point for the refgenieserver CLI."""
+    parser = build_parser()
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        print("No subcommand given")
+        sys.exit(1)
+    logger_args = (
+        dict(name=PKG_NAME, fmt=LOG_FORMAT, level=5)
+        if args.debug
+        else dict(name=PKG_NAME, fmt=LOG_FORMAT)
+    )
+    logmuse.setup_logger(**logger_args)
+    selected_cfg = select_genome_config(args.config)
+    assert selected_cfg is not None, (
+        "You must provide a config file or set the {} environment variable".format(
+            "or ".join(CFG_ENV_VARS)
+        )
+    )
+    # this RefGenConf object will be used in the server, so it's read-only
+    rgc = RefGenConf.from_yaml_file(selected_cfg)
+    if args.command == "archive":
+        from .server_builder import archive
+
+        arp = (
+            [parse_registry_path(x) for x in args.asset_registry_paths]
+            if args.asset_registry_paths is not None
+            else None
+        )
+        archive(
+            rgc,
+            arp,
+            args.force,
+            args.remove,
+            selected_cfg,
+            args.genomes_desc,
+            jobs=args.jobs,
+            disk_jobs=args.disk_jobs,
+            flush_every=args.flush_every,
+            compression_level=args.compression_level,
+            compression_threads=args.compression_threads,
+            zstd=args.zstd,
+            report_path=args.report,
+        )
+    elif args.command == "serve":
+        from .main import serve_config
+
+        serve_config(rgc, selected_cfg, args)
@@ -0,0 +1,79 @@
+"""HTTP conditional request evaluation"""
+
+from __future__ import annotations
+
+from email.utils import parsedate_to_datetime
+from typing import Iterable
+
+from starlette.datastructures import Headers
+
+
+def parse_etag_list(header: str | None) -> list[str]:
+    """Split an entity tag list header value, e.g. If-None-Match, into the tags.
+
+    Args:
+        header: Header value, e.g. 'W/"abc", "def"'.
+
+    Returns:
+        List of entity tags, weak ones still prefixed with 'W/'.
+    """
+    if not header:
+        return []
+    return [e.strip() for e in header.split(",") if e.strip()]
+
+
+def etag_list_matches(header: str | None, etags: Iterable[str]) -> bool:
+    """Check whether an entity tag list header matches any of the tags.
+
+    The weak comparison function is used, as required for If-None-Match.
+
+    Args:
+        header: Header value.
+        etags: Quoted entity tags of the current representation(s).
+
+    Returns:
+        Whether the header lists '*' or any of the tags.
+    """
+    tags = {t.removeprefix("W/") for t in parse_etag_list(header)}
+    return "*" in tags or not tags.isdisjoint(etags)
+
+
+def parse_http_date(value: str | None) -> int | None:
+    """Parse an HTTP-date header value.
+
+    Args:
+        value: Header value, e.g. 'Wed, 21 Oct 2015 07:28:00 GMT'.
+
+    Returns:
+        POSIX timestamp in seconds or None if missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_not_modified(
+    headers: Headers, etags: Iterable[str], last_modified: float | None = None
+) -> bool:
+    """Evaluate the If-None-Match and If-Modified-Since request preconditions.
+
+    If-Modified-Since is only considered in the absence of If-None-Match.
+
+    Args:
+        headers: Request headers.
+        etags: Quoted entity tags of the current representation(s).
+        last_modified: POSIX timestamp of the last modification, if known.
+
+    Returns:
+        Whether a '304 Not Modified' response should be sent.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_list_matches(if_none_match, etags)
+    if last_modified is None:
+        return False
+    since = parse_http_date(headers.get("if-modified-since"))
+    return since is not None and int(last_modified) <= since
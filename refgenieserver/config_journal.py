@@ -0,0 +1,153 @@
+"""Journaled, batched server config updates for the archiver"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any
+
+from refgenconf.exceptions import RefgenconfError
+from ubiquerg import parse_registry_path
+from yacman import write_lock
+
+from .const import *
+
+if TYPE_CHECKING:
+    from refgenconf import RefGenConf
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+
+def _apply_update(rgc: RefGenConf, entry: dict[str, Any]) -> None:
+    """Apply a single journaled update to a configuration object in memory.
+
+    Args:
+        rgc: Configuration object to update.
+        entry: Journal entry; the 'op' key determines the kind of update.
+
+    Raises:
+        ValueError: If the update kind is not known.
+    """
+    op = entry["op"]
+    if op == "genome":
+        rgc[CFG_GENOMES_KEY].setdefault(entry["genome"], {})
+        rgc[CFG_GENOMES_KEY][entry["genome"]].update(entry["attrs"])
+    elif op == "asset":
+        rgc.update_assets(entry["genome"], entry["asset"], entry["attrs"])
+    elif op == "tag":
+        rgc.update_tags(entry["genome"], entry["asset"], entry["tag"], entry["attrs"])
+    elif op == "child":
+        # add the child to a pre-existing parent's children list
+        rp = parse_registry_path(entry["parent"])
+        try:
+            rgc.seek(rp["namespace"], rp["item"], rp["tag"], strict_exists=True)
+        except (RefgenconfError, OSError):
+            # an exception here would make the journal impossible to replay
+            _LOGGER.warning(
+                f"'{entry['child']}'s parent '{entry['parent']}' does not exist, "
+                f"skipping relationship updates"
+            )
+            return
+        rgc.update_relatives_assets(
+            rp["namespace"], rp["item"], rp["tag"], [entry["child"]], children=True
+        )
+    else:
+        raise ValueError(f"Unknown config journal operation: {op}")
+
+
+def _to_json(obj: Any) -> Any:
+    # config sections may be custom mapping/sequence types
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return list(obj)
+
+
+class ConfigJournal:
+    """Batches the archiver updates of the server config.
+
+    Every update is applied to the configuration object in memory and appended
+    to a JSON Lines journal next to the config file, which is only rewritten
+    when the updates are flushed: every flush_every tags and at the end of the
+    run. If a run is interrupted before a flush, the journal is replayed on the
+    next run, so no completed update is lost.
+    """
+
+    def __init__(self, rgc_server: RefGenConf, flush_every: int = 0) -> None:
+        """Create a journal for a server configuration object.
+
+        Args:
+            rgc_server: Server configuration object to update.
+            flush_every: Number of tag updates to write the config after; 0 to
+                write it only when flush is called.
+        """
+        self.rgc_server = rgc_server
+        self.flush_every = flush_every
+        self.path = rgc_server.file_path + JOURNAL_SUFFIX
+        self._file = None
+        self._pending_tags = 0
+        # bytes written to the journal and the config file, for the build report
+        self.bytes_written = 0
+
+    def replay(self) -> int:
+        """Apply the updates left behind by an interrupted run and flush them.
+
+        A truncated last entry, e.g. after a crash in the middle of a write, is
+        ignored.
+
+        Returns:
+            Number of replayed updates.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    _LOGGER.warning("Ignoring a truncated config journal entry")
+                    break
+                _apply_update(self.rgc_server, entry)
+                count += 1
+        _LOGGER.info(f"Replayed {count} config updates from journal: {self.path}")
+        self.flush()
+        return count
+
+    def record(self, op: str, **fields: Any) -> None:
+        """Journal an update and apply it to the configuration object.
+
+        Args:
+            op: Kind of update: 'genome', 'asset', 'tag' or 'child'.
+            **fields: Update arguments, e.g. genome, asset, tag and attrs.
+        """
+        entry = dict(op=op, **fields)
+        if self._file is None:
+            self._file = open(self.path, "a")
+        line = json.dumps(entry, default=_to_json) + "\n"
+        self._file.write(line)
+        self.bytes_written += len(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        _apply_update(self.rgc_server, entry)
+        if op == "tag":
+            self._pending_tags += 1
+            if self.flush_every and self._pending_tags >= self.flush_every:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write the configuration file and discard the journal."""
+        with write_lock(self.rgc_server) as r:
+            r.write()
+        self.bytes_written += os.path.getsize(self.rgc_server.file_path)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        _LOGGER.debug(
+            f"Server config written after {self._pending_tags} tag updates: "
+            f"{self.rgc_server.file_path}"
+        )
+        self._pending_tags = 0
@@ -28,6 +28,65 @@ STATIC_PATH: str = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), STATIC_DIRNAME
 )
 LOG_FORMAT: str = "%(levelname)s in %(funcName)s: %(message)s"
+# size of the chunks local files are streamed in, rounded up to the page size
+DEFAULT_CHUNK_SIZE: int = 1024 * 1024
+# archiver: gzip compression level of the asset archives, number of threads
+# compressing each archive (0: one per CPU), size of the independently
+# compressed blocks and size of the buffers the asset files are copied with
+ARCHIVE_COMPRESSION_LEVEL: int = 6
+ARCHIVE_COMPRESSION_THREADS: int = 0
+GZIP_BLOCK_SIZE: int = 128 * 1024
+ZSTD_COMPRESSION_LEVEL: int = 9
+COPY_BUFFER_SIZE: int = 1024 * 1024
+# archiver: size of the separately digested archive chunks listed in the chunk
+# manifests
+ARCHIVE_CHUNK_SIZE: int = 64 * 1024 * 1024
+# archiver: content-addressed store of the unarchived asset files and sidecars,
+# relative to the archive directory
+FILE_STORE_DIR: str = ".file_store"
+# archiver: max number of concurrent disk-heavy build stages (copy, tar, digest)
+DEFAULT_DISK_JOBS: int = 4
+# archiver: number of tag updates to write the server config after, and the
+# suffix of the journal file the updates are recorded in between the writes
+DEFAULT_FLUSH_EVERY: int = 100
+JOURNAL_SUFFIX: str = ".journal.jsonl"
+# archiver: names of the build stages in the timing report; the tag stages
+# (copy to disk_wait) are timed per tag, the others once per run
+STAGE_COPY: str = "copy"
+STAGE_DIR_CONTENTS: str = "dir_contents"
+STAGE_ARCHIVE: str = "archive"
+STAGE_LEGACY_ARCHIVE: str = "legacy_archive"
+STAGE_RECIPE_LOG_COPY: str = "recipe_log_copy"
+STAGE_DISK_WAIT: str = "disk_wait"
+STAGE_SCAN: str = "scan"
+STAGE_CHECKSUM: str = "checksum"
+STAGE_CONFIG_WRITE: str = "config_write"
+STAGE_STORE_PRUNE: str = "store_prune"
+# directory the OpenAPI schemas are cached in, by server version, route table
+# and catalog version
+OPENAPI_CACHE_DIR: str = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), PKG_NAME
+)
+TEMPLATE_OPENAPI_CACHE: str = "openapi_{}.json"
+# max number of OpenAPI schemas kept in the cache directory, the least
+# recently used removed
+OPENAPI_CACHE_SIZE: int = 16
+# responses may be stored by caches, but have to be revalidated before reuse
+CACHE_CONTROL: str = "public, no-cache"
+# max number of worker threads for blocking file system calls
+DISK_IO_THREADS: int = 16
+# remote data requests: seconds to wait for a connection/response, pool size
+REMOTE_TIMEOUT: float = 10.0
+REMOTE_MAX_CONNECTIONS: int = 20
+# remote asset directory contents cache: max entries, seconds fresh, seconds
+# served stale while being refreshed
+REMOTE_CACHE_SIZE: int = 1024
+REMOTE_CACHE_TTL: float = 300.0
+REMOTE_CACHE_STALE_TTL: float = 3600.0
+# max number of rendered HTML pages cached
+PAGE_CACHE_SIZE: int = 1024
+# max number of other rendered responses cached, e.g. per-tag digests
+RESPONSE_CACHE_SIZE: int = 4096
 MSG_404: str = "No such {} on server"
 DESC_PLACEHOLDER: str = "No description"
 CHECKSUM_PLACEHOLDER: str = "No digest"
@@ -37,6 +96,30 @@ CHANGED_KEYS: dict[str, str] = {CFG_ASSET_PATH_KEY: "path"}
 
 # TODO: to be removed in the future
 CFG_LEGACY_ARCHIVE_CHECKSUM_KEY: str = "legacy_archive_digest"
+# fingerprint of the asset directory an archive was built from; archiver
+# bookkeeping, not served
+CFG_SOURCE_FINGERPRINT_KEY: str = "source_fingerprint"
+CFG_ZSTD_ARCHIVE_CHECKSUM_KEY: str = "zstd_archive_digest"
+CFG_ZSTD_ARCHIVE_SIZE_KEY: str = "zstd_archive_size"
+# index of the files in the gzip compressed archive, for single file access
+TEMPLATE_ARCHIVE_INDEX: str = "archive_index_{}__{}.json"
+API_ID_ARCHIVE_MEMBER: str = "custom_Id_archive_member"
+# digests of the fixed-size archive chunks, for parallel verified downloads
+TEMPLATE_ARCHIVE_MANIFEST: str = "archive_manifest_{}__{}.json"
+API_ID_ARCHIVE_MANIFEST: str = "custom_Id_archive_manifest"
+
+# asset archive formats: gzip compressed tar archives are always built, zstd
+# compressed ones on request; archive file name suffixes and media types
+ARCHIVE_FORMAT_TGZ: str = "tgz"
+ARCHIVE_FORMAT_ZSTD: str = "zst"
+ARCHIVE_SUFFIXES: dict[str, str] = {
+    ARCHIVE_FORMAT_TGZ: ".tgz",
+    ARCHIVE_FORMAT_ZSTD: ".tar.zst",
+}
+ARCHIVE_MEDIA_TYPES: dict[str, str] = {
+    ARCHIVE_FORMAT_TGZ: "application/octet-stream",
+    ARCHIVE_FORMAT_ZSTD: "application/zstd",
+}
 
 API1_ID: str = "APIv1"
 API2_ID: str = "APIv2"
@@ -0,0 +1,391 @@
+"""File responses with HTTP range request support and zero-copy streaming"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+from email.utils import formatdate
+from functools import partial
+from secrets import token_hex
+from typing import Callable, Mapping
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from .conditional import is_not_modified, parse_etag_list, parse_http_date
+from .const import *
+
+ZEROCOPY_EXTENSION: str = "http.response.zerocopysend"
+PATHSEND_EXTENSION: str = "http.response.pathsend"
+# ranges requested above this count are served as the full representation
+MAX_RANGES: int = 100
+
+
+class RangeNotSatisfiable(Exception):
+    """None of the requested byte ranges overlaps the file."""
+
+
+def parse_range_header(header: str, size: int) -> list[tuple[int, int]] | None:
+    """Parse a Range request header value.
+
+    Overlapping and adjacent ranges are coalesced.
+
+    Args:
+        header: Range header value, e.g. 'bytes=0-499, -500'.
+        size: Size of the representation in bytes.
+
+    Returns:
+        Sorted list of (start, end) pairs, with end being exclusive, or None if
+        the header is syntactically invalid and should be ignored.
+
+    Raises:
+        RangeNotSatisfiable: If none of the ranges overlaps the representation.
+    """
+    unit, _, range_set = header.partition("=")
+    if unit.strip().lower() != "bytes" or not range_set.strip():
+        return None
+    ranges = []
+    for spec in range_set.split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, sep, last = spec.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or not (first.isdigit() or last.isdigit()):
+            return None
+        if (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size))
+            continue
+        start = int(first)
+        end = int(last) + 1 if last else size
+        if last and end <= start:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size)))
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(end, last_end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def align_chunk_size(chunk_size: int) -> int:
+    """Round a chunk size up to a multiple of the memory page size.
+
+    Args:
+        chunk_size: Requested chunk size in bytes.
+
+    Returns:
+        Page-aligned chunk size, at least one page.
+    """
+    return max(-(-chunk_size // mmap.PAGESIZE), 1) * mmap.PAGESIZE
+
+
+def _advise_sequential(fd: int, offset: int, length: int) -> None:
+    """Hint the kernel that a file region is going to be read sequentially.
+
+    Args:
+        fd: Open file descriptor.
+        offset: Region offset.
+        length: Region length.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+
+
+class AssetFileResponse(Response):
+    """Response streaming a local file, with HTTP range request support.
+
+    Single and multiple byte ranges are served with '206 Partial Content'
+    responses. The entity tag is derived from the file digest, if provided, so
+    that clients can resume a download with an If-Range request and be sure the
+    remaining bytes belong to the same archive. Conditional requests
+    (If-None-Match, If-Modified-Since) are answered with '304 Not Modified'.
+
+    The file contents never pass through Python when the ASGI server supports
+    the zero-copy send extension: the server transmits the open file with
+    os.sendfile. Whole-file responses use the path send extension if that is
+    the one available. Otherwise, e.g. with uvicorn, which has neither, the
+    file is read in large, page-aligned chunks in a worker thread. Either way the kernel is advised that the
+    file is read sequentially. The chunk size and the advice are configured
+    with the class attributes, e.g. from the 'serve' command line options.
+    """
+
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    fadvise: bool = True
+
+    def __init__(
+        self,
+        path: str,
+        filename: str | None = None,
+        media_type: str = "application/octet-stream",
+        digest: str | None = None,
+        headers: Mapping[str, str] | None = None,
+        stat_result: os.stat_result | None = None,
+    ) -> None:
+        """Prepare the response headers.
+
+        Args:
+            path: Path to the file to serve.
+            filename: File name to advertise in the Content-Disposition header.
+            media_type: Media type of the file.
+            digest: Digest of the file contents, used as the entity tag. If not
+                provided, the tag is derived from the file size and mtime.
+            headers: Additional response headers.
+            stat_result: Result of os.stat for the file, if already known.
+        """
+        self.path = path
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self._zerocopy = self._pathsend = False
+        self.stat_result = stat_result or os.stat(path)
+        self.init_headers(headers)
+        if filename is not None:
+            quoted = quote(filename)
+            self.headers.setdefault(
+                "content-disposition",
+                f'attachment; filename="{filename}"'
+                if quoted == filename
+                else f"attachment; filename*=utf-8''{quoted}",
+            )
+        if digest is None:
+            digest = hashlib.md5(
+                f"{self.stat_result.st_mtime}-{self.stat_result.st_size}".encode()
+            ).hexdigest()
+        self.etag = f'"{digest}"'
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers.setdefault("content-length", str(self.stat_result.st_size))
+        self.headers.setdefault(
+            "last-modified", formatdate(self.stat_result.st_mtime, usegmt=True)
+        )
+        self.headers.setdefault("etag", self.etag)
+        self.headers.setdefault("cache-control", CACHE_CONTROL)
+
+    @property
+    def size(self) -> int:
+        """Size of the served file in bytes."""
+        return self.stat_result.st_size
+
+    def _if_range_matches(self, if_range: str) -> bool:
+        """Check whether the If-Range validator matches the file.
+
+        Entity tags are compared with the strong comparison function, dates
+        must match the Last-Modified value exactly.
+
+        Args:
+            if_range: If-Range header value.
+
+        Returns:
+            Whether the requested ranges may be served.
+        """
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == self.etag
+        if if_range.startswith("W/"):
+            return False
+        return parse_http_date(if_range) == int(self.stat_result.st_mtime)
+
+    def _if_match_fails(self, if_match: str | None) -> bool:
+        """Check whether the If-Match precondition fails.
+
+        Args:
+            if_match: If-Match header value.
+
+        Returns:
+            Whether the precondition is present and fails.
+        """
+        tags = parse_etag_list(if_match)
+        return bool(tags) and "*" not in tags and self.etag not in tags
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        send_header_only = scope["method"].upper() == "HEAD"
+        extensions = scope.get("extensions") or {}
+        self._zerocopy = ZEROCOPY_EXTENSION in extensions
+        self._pathsend = PATHSEND_EXTENSION in extensions
+        if self._if_match_fails(request_headers.get("if-match")):
+            return await Response(status_code=412, headers={"etag": self.etag})(
+                scope, receive, send
+            )
+        if is_not_modified(request_headers, [self.etag], self.stat_result.st_mtime):
+            not_modified_headers = {
+                k: self.headers[k]
+                for k in ("etag", "last-modified", "cache-control")
+                if k in self.headers
+            }
+            return await Response(status_code=304, headers=not_modified_headers)(
+                scope, receive, send
+            )
+        ranges = None
+        http_range = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if http_range is not None and (
+            if_range is None or self._if_range_matches(if_range)
+        ):
+            try:
+                ranges = parse_range_header(http_range, self.size)
+            except RangeNotSatisfiable:
+                return await Response(
+                    status_code=416,
+                    headers={"content-range": f"bytes */{self.size}"},
+                )(scope, receive, send)
+            if ranges is not None and len(ranges) > MAX_RANGES:
+                ranges = None
+        if not ranges:
+            send_body = partial(self._send_full, send, send_header_only)
+        elif len(ranges) == 1:
+            send_body = partial(self._send_single, send, ranges[0], send_header_only)
+        else:
+            send_body = partial(self._send_multiple, send, ranges, send_header_only)
+        if send_header_only:
+            await send_body()
+            return
+        async with anyio.create_task_group() as task_group:
+
+            async def wrap(func: Callable[[], object]) -> None:
+                await func()
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(wrap, send_body)
+            await wrap(partial(self._listen_for_disconnect, receive))
+
+    @staticmethod
+    async def _listen_for_disconnect(receive: Receive) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+
+    async def _send_full(self, send: Send, send_header_only: bool) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if self._pathsend and not self._zerocopy and not send_header_only:
+            await send({"type": PATHSEND_EXTENSION, "path": str(self.path)})
+            return
+        if not send_header_only:
+            await self._send_file_range(send, 0, self.size)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _send_single(
+        self, send: Send, byte_range: tuple[int, int], send_header_only: bool
+    ) -> None:
+        start, end = byte_range
+        headers = MutableHeaders(raw=list(self.raw_headers))
+        headers["content-range"] = f"bytes {start}-{end - 1}/{self.size}"
+        headers["content-length"] = str(end - start)
+        await send(
+            {"type": "http.response.start", "status": 206, "headers": headers.raw}
+        )
+        if not send_header_only:
+            await self._send_file_range(send, start, end)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _send_multiple(
+        self, send: Send, ranges: list[tuple[int, int]], send_header_only: bool
+    ) -> None:
+        boundary = token_hex(13)
+        part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"content-type: {self.media_type}\r\n"
+                f"content-range: bytes {start}-{end - 1}/{self.size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode("latin-1")
+        content_length = len(closing) + sum(
+            len(h) + end - start + 2 for h, (start, end) in zip(part_headers, ranges)
+        )
+        headers = MutableHeaders(raw=list(self.raw_headers))
+        headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        headers["content-length"] = str(content_length)
+        await send(
+            {"type": "http.response.start", "status": 206, "headers": headers.raw}
+        )
+        if not send_header_only:
+            for part_header, (start, end) in zip(part_headers, ranges):
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": part_header,
+                        "more_body": True,
+                    }
+                )
+                await self._send_file_range(send, start, end)
+                await send(
+                    {"type": "http.response.body", "body": b"\r\n", "more_body": True}
+                )
+            await send(
+                {"type": "http.response.body", "body": closing, "more_body": True}
+            )
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _send_file_range(self, send: Send, start: int, end: int) -> None:
+        """Send a byte range of the file.
+
+        Args:
+            send: ASGI send callable.
+            start: First byte offset.
+            end: Offset past the last byte to send.
+        """
+        chunk_size = align_chunk_size(self.chunk_size)
+        f = await anyio.to_thread.run_sync(partial(open, self.path, "rb", buffering=0))
+        try:
+            if self.fadvise:
+                _advise_sequential(f.fileno(), start, end - start)
+            while start < end:
+                # after the first chunk all the reads start at aligned offsets
+                count = min(chunk_size - start % chunk_size, end - start)
+                if self._zerocopy:
+                    await send(
+                        {
+                            "type": ZEROCOPY_EXTENSION,
+                            "file": f,
+                            "offset": start,
+                            "count": count,
+                            "more_body": True,
+                        }
+                    )
+                else:
+                    chunk = await anyio.to_thread.run_sync(
+                        os.pread, f.fileno(), count, start
+                    )
+                    if not chunk:
+                        raise RuntimeError(
+                            f"File '{self.path}' is shorter than expected"
+                        )
+                    count = len(chunk)
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+                start += count
+        finally:
+            f.close()
@@ -0,0 +1,207 @@
+"""Content-addressed store for the files placed in the archive directory"""
+
+from __future__ import annotations
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from .const import *
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+# Linux ioctl request cloning a whole file (reflink); supported by e.g. Btrfs,
+# XFS and OCFS2
+_FICLONE = 0x40049409
+
+# errors of os.link meaning the file can't be hardlinked there, rather than
+# that the placement failed
+_LINK_ERRNOS = (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.ENOTSUP)
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    try:
+        import fcntl
+
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def _clone_file(src: str, dst: str) -> None:
+    """Copy a file, sharing its data blocks with the source if possible.
+
+    The data is cloned with a reflink if the file system supports it, copied
+    in the kernel with copy_file_range otherwise and copied in user space as
+    a last resort. The permission bits are copied as well.
+
+    Args:
+        src: Source file path.
+        dst: Destination file path; overwritten if it exists.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if not _reflink(fsrc.fileno(), fdst.fileno()):
+            remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(
+                        fsrc.fileno(), fdst.fileno(), min(remaining, 1 << 30)
+                    )
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            except (AttributeError, OSError):
+                # no copy_file_range on this platform or file system
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                remaining = 1
+            if remaining > 0:
+                shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+    shutil.copymode(src, dst)
+
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class FileStore:
+    """Stores every distinct file content once and places it by hardlink.
+
+    The files are stored under their SHA-256 digests. Placing a file makes the
+    destination a hardlink to the stored content, so identical files, e.g. the
+    same index in several tags or the build logs in the genome digest and
+    alias directories, take the space of one. If the destination can't be
+    hardlinked, e.g. on another file system, the content is cloned or copied.
+
+    A content is stored only while a placed file links to it, so the stored
+    files with a single link are not placed anywhere anymore and are removed
+    by prune.
+    The store is safe to use from multiple threads.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Create a store, or open an existing one.
+
+        Args:
+            path: Directory to keep the stored files in.
+        """
+        self.path = path
+        self.placed = 0
+        self.deduplicated = 0
+        # digests of the source files seen, by file identity and metadata
+        self._digests: dict[tuple, str] = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _digest(self, src: str) -> str:
+        st = os.stat(src)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(src, "rb") as f:
+                while chunk := f.read(COPY_BUFFER_SIZE):
+                    h.update(chunk)
+            digest = self._digests[key] = h.hexdigest()
+        return digest
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def _store(self, path: str, obj: str) -> None:
+        """Link a placed file into the store as the object for its content.
+
+        Nothing is stored if the file can't be hardlinked; a stored copy no
+        placed file links to would be removed by prune and stored again by the
+        next run.
+        """
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        tmp = _tmp_path(obj)
+        try:
+            os.link(path, tmp)
+        except OSError as e:
+            if e.errno not in _LINK_ERRNOS:
+                raise
+            return
+        os.replace(tmp, obj)
+
+    def place(self, src: str, dst: str) -> None:
+        """Place a file at the destination, backed by the stored content.
+
+        Args:
+            src: Path to the file; symbolic links are followed.
+            dst: Destination path; replaced if it exists. A destination that
+                is a directory gets the source file name.
+        """
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        obj = self._object_path(self._digest(src))
+        try:
+            if os.path.samefile(obj, dst):
+                return
+        except OSError:
+            pass
+        tmp = _tmp_path(dst)
+        if os.path.exists(obj):
+            self.deduplicated += 1
+            try:
+                os.link(obj, tmp)
+            except OSError as e:
+                if e.errno not in _LINK_ERRNOS:
+                    raise
+                _clone_file(obj, tmp)
+        else:
+            _clone_file(src, tmp)
+            self._store(tmp, obj)
+        os.replace(tmp, dst)
+        self.placed += 1
+
+    def place_tree(self, src_dir: str, dst_dir: str, exclude: tuple = ()) -> int:
+        """Place all files of a directory tree, like 'rsync -rL src/ dst/'.
+
+        Args:
+            src_dir: Source directory; symbolic links are followed.
+            dst_dir: Destination directory; created if it does not exist.
+            exclude: Names of files and directories to leave out.
+
+        Returns:
+            Number of placed files.
+        """
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(src_dir, followlinks=True):
+            dirnames[:] = sorted(d for d in dirnames if d not in exclude)
+            target = os.path.join(dst_dir, os.path.relpath(dirpath, src_dir))
+            os.makedirs(target, exist_ok=True)
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if name in exclude:
+                    continue
+                if not os.path.exists(path):
+                    _LOGGER.warning(f"Skipping dangling symbolic link: {path}")
+                    continue
+                self.place(path, os.path.join(target, name))
+                count += 1
+        return count
+
+    def prune(self) -> int:
+        """Remove the stored files that are not placed anywhere anymore.
+
+        Returns:
+            Number of removed files.
+        """
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.stat(path).st_nlink == 1:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        _LOGGER.debug(f"Removed {removed} unused files from the store: {self.path}")
+        return removed
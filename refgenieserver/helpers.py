@@ -1,126 +1,41 @@
 from __future__ import annotations
 
-import argparse
 import logging
-from json import load
+import zlib
+from collections.abc import AsyncIterator
+from functools import lru_cache, partial
+from hashlib import md5
 from string import Formatter
 from typing import TYPE_CHECKING, Any
 
+import httpx
 from fastapi import HTTPException
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
-from refgenconf.exceptions import RefgenconfError
-from refgenconf.helpers import send_data_request
-from ubiquerg import VersionInHelpParser, is_url
+from fastapi.responses import RedirectResponse
+from ubiquerg import is_url
 
 if TYPE_CHECKING:
     from fastapi import FastAPI
     from refgenconf import RefGenConf
     from starlette.responses import Response
 
-from ._version import __version__ as v
+    from .catalog import ServingCatalog
+
+from .async_io import (
+    fetch_json,
+    fetch_range,
+    read_file_range,
+    read_json_file,
+    stat_file,
+)
 from .const import *
+from .file_response import AssetFileResponse
+from .metrics import redirects
+from .ttl_cache import archive_index_cache, dir_contents_cache
 
 global _LOGGER
 _LOGGER = logging.getLogger(PKG_NAME)
 
 
-def build_parser() -> argparse.ArgumentParser:
-    """Build the argument parser.
-
-    Returns:
-        The configured argument parser.
-    """
-    env_var_val = "not set"
-    for var in CFG_ENV_VARS:
-        val = os.environ.get(var)
-        if val is not None:
-            env_var_val = val
-            break
-    banner = "%(prog)s - refgenie web server utilities"
-    additional_description = (
-        "For subcommand-specific options, type: '%(prog)s <subcommand> -h'"
-    )
-    additional_description += "\nhttps://github.com/databio/refgenieserver"
-
-    parser = VersionInHelpParser(
-        prog=PKG_NAME, description=banner, epilog=additional_description
-    )
-
-    parser.add_argument(
-        "-V", "--version", action="version", version="%(prog)s {v}".format(v=v)
-    )
-
-    msg_by_cmd = {"serve": "run the server", "archive": "prepare servable archives"}
-
-    subparsers = parser.add_subparsers(dest="command")
-
-    def add_subparser(cmd, description):
-        return subparsers.add_parser(cmd, description=description, help=description)
-
-    sps = {}
-    # add arguments that are common for both subparsers
-    for cmd, desc in msg_by_cmd.items():
-        sps[cmd] = add_subparser(cmd, desc)
-        (
-            sps[cmd].add_argument(
-                "-c",
-                "--config",
-                required=False,
-                dest="config",
-                help=f"A path to the refgenie config file (YAML). If not provided, the "
-                f"first available environment variable among: "
-                f"'{', '.join(CFG_ENV_VARS)}' will be used if set. "
-                f"Currently: {env_var_val}",
-            ),
-        )
-        sps[cmd].add_argument(
-            "-d",
-            "--dbg",
-            action="store_true",
-            dest="debug",
-            help="Set logger verbosity to debug",
-        )
-    # add subparser-specific arguments
-    sps["serve"].add_argument(
-        "-p",
-        "--port",
-        dest="port",
-        type=int,
-        help="The port the webserver should be run on.",
-        default=DEFAULT_PORT,
-    )
-    sps["archive"].add_argument(
-        "--genomes-desc",
-        dest="genomes_desc",
-        type=str,
-        default=None,
-        help="Path to a CSV file with genomes descriptions. "
-        "Format: genome_name, genome description",
-    )
-    sps["archive"].add_argument(
-        "-f",
-        "--force",
-        action="store_true",
-        dest="force",
-        help="whether the server file tree should be rebuilt even if exists",
-    )
-    sps["archive"].add_argument(
-        "-r",
-        "--remove",
-        action="store_true",
-        dest="remove",
-        help="Remove selected genome, genome/asset or genome/asset:tag",
-    )
-    sps["archive"].add_argument(
-        "asset_registry_paths",
-        metavar="asset-registry-paths",
-        type=str,
-        nargs="*",
-        help="One or more registry path strings that identify assets, e.g. hg38/fasta:tag",
-    )
-    return parser
-
-
 def preprocess_attrs(attrs: dict) -> dict:
     """Rename keys based on the CHANGED_KEYS mapping (new_key:old_key).
 
@@ -143,6 +58,9 @@ def preprocess_attrs(attrs: dict) -> dict:
 def get_openapi_version(app: FastAPI) -> str:
     """Get the OpenAPI version from the OpenAPI description JSON.
 
+    The version extracted by the OpenAPI schema cache is used if the app has
+    one, instead of looking it up in the schema.
+
     Args:
         app: FastAPI app object.
 
@@ -150,14 +68,28 @@ def get_openapi_version(app: FastAPI) -> str:
         The openAPI version in use.
     """
     try:
-        return app.openapi()["openapi"]
+        version = getattr(app.openapi, "openapi_version", None)
+        return version or app.openapi()["openapi"]
     except Exception as e:
         _LOGGER.debug(f"Could not determine openAPI version: {str(e)}")
         return "3.0.2"
 
 
+@lru_cache(maxsize=None)
+def _template_keys(pth_templ: str) -> tuple[str, ...]:
+    """Get the names of the replacement fields in a path template.
+
+    Args:
+        pth_templ: The path template.
+
+    Returns:
+        Replacement field names.
+    """
+    return tuple(i[1] for i in Formatter().parse(pth_templ) if i[1] is not None)
+
+
 def get_datapath_for_genome(
-    rgc: RefGenConf,
+    catalog: ServingCatalog,
     fill_dict: dict[str, str],
     pth_templ: str = "{base}/{genome}/{file_name}",
     remote_key: str | None = None,
@@ -168,7 +100,7 @@ def get_datapath_for_genome(
     URL to the file or a file path along with a flag indicating the source.
 
     Args:
-        rgc: Configuration object to use.
+        catalog: Serving catalog to use.
         fill_dict: Dictionary to fill in the path template.
         pth_templ: The path template.
         remote_key: Key identifying the remote data provider.
@@ -176,28 +108,12 @@ def get_datapath_for_genome(
     Returns:
         A pair of (file source, is_remote flag).
     """
-    req_keys = [i[1] for i in Formatter().parse(pth_templ) if i[1] is not None]
-    assert all([k in req_keys for k in list(fill_dict.keys())]), (
-        f"Only the these keys are allowed in the fill_dict: {req_keys}"
+    req_keys = _template_keys(pth_templ)
+    assert all([k in req_keys for k in fill_dict.keys()]), (
+        f"Only the these keys are allowed in the fill_dict: {list(req_keys)}"
     )
-    fill_dict.update({"base": BASE_DIR})
-    # fill_dict.update({"base": rgc["genome_archive_folder"]})
-    remote = is_data_remote(rgc)
-    if remote:
-        if remote_key is None:
-            raise ValueError(
-                f"'remotes' key found in config; the 'remote_key' argument must "
-                f"be one of: {list(rgc['remotes'].keys())} "
-            )
-        if remote_key not in rgc["remotes"]:
-            raise KeyError(
-                f"In remotes mapping the '{remote_key}' not found. "
-                f"Can't determine a data path prefix identified by this key."
-            )
-        # at this point we know that the 'remotes' mapping has the 'remote_key' key
-        # and the value is a dict with 'prefix' key defined.
-        fill_dict["base"] = rgc["remotes"][remote_key]["prefix"].rstrip("/")
-    return pth_templ.format(**fill_dict), remote
+    base = catalog.get_path_base(remote_key)
+    return pth_templ.format(**dict(fill_dict, base=base)), catalog.is_remote
 
 
 def is_data_remote(rgc: RefGenConf) -> bool:
@@ -274,14 +190,14 @@ def purge_nonservable(rgc: RefGenConf) -> RefGenConf:
 
 
 def safely_get_example(
-    rgc: RefGenConf, entity: str, rgc_method: str, default: str, **kwargs: Any
+    catalog: ServingCatalog, entity: str, method: str, default: str, **kwargs: Any
 ) -> str:
-    """Safely get an example value from the config, falling back to a default.
+    """Safely get an example value from the catalog, falling back to a default.
 
     Args:
-        rgc: Configuration object.
+        catalog: Serving catalog.
         entity: Description of the entity for logging.
-        rgc_method: Name of the method to call on rgc.
+        method: Name of the method to call on the catalog.
         default: Fallback value if the method call fails.
         **kwargs: Additional keyword arguments passed to the method.
 
@@ -289,7 +205,7 @@ def safely_get_example(
         The first result element (if list) or the result itself, or the default.
     """
     try:
-        res = getattr(rgc, rgc_method)(**kwargs)
+        res = getattr(catalog, method)(**kwargs)
         return res[0] if isinstance(res, list) else res
     except Exception as e:
         _LOGGER.warning(
@@ -299,8 +215,35 @@ def safely_get_example(
         return default
 
 
+def require_asset(
+    catalog: ServingCatalog, genome: str, asset: str | None = None
+) -> str:
+    """Get the digest of a served genome, failing the request if it is unknown.
+
+    Args:
+        catalog: Serving catalog.
+        genome: Genome digest or alias.
+        asset: Asset name that has to be defined for the genome, if given.
+
+    Returns:
+        The genome digest.
+
+    Raises:
+        HTTPException: If the genome or the asset is not served.
+    """
+    digest = catalog.resolve_genome(genome)
+    if digest is None:
+        msg = MSG_404.format(f"genome ({genome})")
+    elif asset is not None and not catalog.has_asset(digest, asset):
+        msg = MSG_404.format(f"asset ({genome}/{asset})")
+    else:
+        return digest
+    _LOGGER.warning(msg)
+    raise HTTPException(status_code=404, detail=msg)
+
+
 def create_asset_file_path(
-    rgc: RefGenConf,
+    catalog: ServingCatalog,
     genome: str,
     asset: str,
     tag: str | None,
@@ -310,7 +253,7 @@ def create_asset_file_path(
     """Construct a path to an unarchived asset file.
 
     Args:
-        rgc: Configuration object.
+        catalog: Serving catalog.
         genome: Genome name.
         asset: Asset name.
         tag: Tag name.
@@ -323,42 +266,174 @@ def create_asset_file_path(
     Raises:
         HTTPException: If the asset or seek key is not found.
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
     try:
-        rgc._assert_gat_exists(gname=genome, aname=asset, tname=tag)
-    except RefgenconfError:
+        tag_dict = catalog.get_tag(genome, asset, tag)
+    except KeyError:
         msg = MSG_404.format(f"asset ({genome}/{asset}:{tag})")
         _LOGGER.warning(msg)
         raise HTTPException(status_code=404, detail=msg)
-    tag_dict = rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][CFG_ASSET_TAGS_KEY][
-        tag
-    ]
-    if seek_key not in tag_dict[CFG_SEEK_KEYS_KEY]:
+    seek_keys = tag_dict.get(CFG_SEEK_KEYS_KEY) or {}
+    if seek_key not in seek_keys:
         msg = MSG_404.format(f"seek_key ({genome}/{asset}.{seek_key}:{tag})")
         _LOGGER.warning(msg)
         raise HTTPException(status_code=404, detail=msg)
-    seek_key_target = tag_dict[CFG_SEEK_KEYS_KEY][seek_key]
     # append the seek_key value to the path only if it isn't the "dir" seek_key.
     # Otherwise the result would be a path ending with "\."
     file_name = (
-        f"{asset}__{tag}/{seek_key_target}" if seek_key != "dir" else f"{asset}__{tag}/"
+        f"{asset}__{tag}/{seek_keys[seek_key]}"
+        if seek_key != "dir"
+        else f"{asset}__{tag}/"
     )
     path, _ = get_datapath_for_genome(
-        rgc, dict(genome=genome, file_name=file_name), remote_key=remote_key
+        catalog, dict(genome=genome, file_name=file_name), remote_key=remote_key
     )
-    _LOGGER.info(f"serving asset file path: {path}")
+    _LOGGER.debug(f"serving asset file path: {path}")
     return path
 
 
-def serve_file_for_asset(
-    rgc: RefGenConf, genome: str, asset: str, tag: str | None, template: str
+def lookup_archive_digest(
+    catalog: ServingCatalog,
+    genome: str,
+    asset: str,
+    tag: str,
+    legacy: bool = False,
+    archive_format: str = ARCHIVE_FORMAT_TGZ,
+) -> str | None:
+    """Get the recorded digest of an asset archive.
+
+    Args:
+        catalog: Serving catalog.
+        genome: Genome digest or alias.
+        asset: Asset name.
+        tag: Tag name.
+        legacy: Whether to get the digest of the legacy, alias-named archive.
+        archive_format: Archive format, 'tgz' or 'zst'.
+
+    Returns:
+        The archive digest or None if not recorded.
+    """
+    try:
+        tag_dict = catalog.get_tag(genome, asset, tag)
+    except KeyError:
+        return None
+    if legacy:
+        return tag_dict.get(CFG_LEGACY_ARCHIVE_CHECKSUM_KEY)
+    if archive_format == ARCHIVE_FORMAT_ZSTD:
+        return tag_dict.get(CFG_ZSTD_ARCHIVE_CHECKSUM_KEY)
+    return tag_dict.get(CFG_ARCHIVE_CHECKSUM_KEY)
+
+
+def _accepts_media_type(accept: str, media_type: str) -> bool:
+    # whether the Accept header lists the media type explicitly with a q > 0
+    for media_range in accept.split(","):
+        name, *params = media_range.split(";")
+        if name.strip().lower() != media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+
+def negotiate_archive_format(
+    catalog: ServingCatalog,
+    genome: str,
+    asset: str,
+    tag: str,
+    requested: str | None = None,
+    accept: str | None = None,
+) -> str | None:
+    """Choose the format of an asset archive to serve.
+
+    An explicitly requested format is served if it has been built. Otherwise
+    a zstd archive is served to clients accepting 'application/zstd', if it has
+    been built, and the gzip compressed archive to all others, e.g. old
+    clients.
+
+    Args:
+        catalog: Serving catalog.
+        genome: Genome digest or alias.
+        asset: Asset name.
+        tag: Tag name.
+        requested: Explicitly requested archive format, 'tgz' or 'zst'.
+        accept: Value of the Accept request header.
+
+    Returns:
+        The archive format or None if the requested format is not available.
+    """
+    zstd_built = (
+        lookup_archive_digest(
+            catalog, genome, asset, tag, archive_format=ARCHIVE_FORMAT_ZSTD
+        )
+        is not None
+    )
+    if requested == ARCHIVE_FORMAT_ZSTD and not zstd_built:
+        return None
+    if requested is not None:
+        return requested
+    if zstd_built and accept:
+        if _accepts_media_type(accept, ARCHIVE_MEDIA_TYPES[ARCHIVE_FORMAT_ZSTD]):
+            return ARCHIVE_FORMAT_ZSTD
+    return ARCHIVE_FORMAT_TGZ
+
+
+def redirect_to_remote(
+    url: str, remote_key: str = "http", headers: dict[str, str] | None = None
+) -> RedirectResponse:
+    """Redirect a request to a remote data provider.
+
+    Args:
+        url: URL of the file at the remote data provider.
+        remote_key: Key identifying the remote data provider.
+        headers: Additional response headers.
+
+    Returns:
+        The redirect response.
+    """
+    _LOGGER.debug(f"redirecting to URL: '{url}'")
+    redirects.inc((remote_key,))
+    return RedirectResponse(url, headers=headers)
+
+
+def sidecar_digest(
+    catalog: ServingCatalog, genome: str, asset: str, tag: str, file_name: str
+) -> str | None:
+    """Derive a digest for a file archived along with an asset, e.g. a build log.
+
+    The files are written by the archiver in the same run as the archive, so
+    the archive digest identifies their versions too.
+
+    Args:
+        catalog: Serving catalog.
+        genome: Genome digest or alias.
+        asset: Asset name.
+        tag: Tag name.
+        file_name: Name of the served file.
+
+    Returns:
+        The derived digest or None if the archive digest is not recorded.
+    """
+    archive_digest = lookup_archive_digest(catalog, genome, asset, tag)
+    if archive_digest is None:
+        return None
+    return md5(f"{archive_digest}/{file_name}".encode("utf-8")).hexdigest()
+
+
+async def serve_file_for_asset(
+    catalog: ServingCatalog, genome: str, asset: str, tag: str | None, template: str
 ) -> Response:
     """Serve a file, like a build log.
 
     Args:
-        rgc: Configuration object.
+        catalog: Serving catalog.
         genome: Genome name.
         asset: Asset name.
         tag: Tag name.
@@ -366,24 +441,28 @@ def serve_file_for_asset(
             e.g. 'build_log_{}__{}.md'.
 
     Returns:
-        A RedirectResponse for remote files, or a FileResponse for local files.
+        A RedirectResponse for remote files, or an AssetFileResponse for local
+        files, which supports range requests.
 
     Raises:
         HTTPException: If the file is not found.
     """
     # returns 'default' for nonexistent genome/asset; no need to catch
-    tag = tag or rgc.get_default_tag(genome, asset)
+    tag = tag or catalog.get_default_tag(genome, asset)
     file_name = template.format(asset, tag)
     path, remote = get_datapath_for_genome(
-        rgc, dict(genome=genome, file_name=file_name), remote_key="http"
+        catalog, dict(genome=genome, file_name=file_name), remote_key="http"
     )
     if remote:
-        _LOGGER.info(f"redirecting to URL: '{path}'")
-        return RedirectResponse(path)
-    _LOGGER.info(f"serving file: '{path}'")
-    if os.path.isfile(path):
-        return FileResponse(
-            path, filename=file_name, media_type="application/octet-stream"
+        return redirect_to_remote(path)
+    _LOGGER.debug(f"serving file: '{path}'")
+    stat_result = await stat_file(path)
+    if stat_result is not None:
+        return AssetFileResponse(
+            path,
+            filename=file_name,
+            digest=sidecar_digest(catalog, genome, asset, tag, file_name),
+            stat_result=stat_result,
         )
     else:
         msg = MSG_404.format(f"asset ({genome}/{asset}:{tag})")
@@ -391,13 +470,13 @@ def serve_file_for_asset(
         raise HTTPException(status_code=404, detail=msg)
 
 
-def serve_json_for_asset(
-    rgc: RefGenConf, genome: str, asset: str, tag: str | None, template: str
+async def serve_json_for_asset(
+    catalog: ServingCatalog, genome: str, asset: str, tag: str | None, template: str
 ) -> Response:
     """Serve a JSON object, like a recipe or asset directory contents.
 
     Args:
-        rgc: Configuration object.
+        catalog: Serving catalog.
         genome: Genome name.
         asset: Asset name.
         tag: Tag name.
@@ -405,62 +484,160 @@ def serve_json_for_asset(
             e.g. 'build_recipe_{}__{}.json'.
 
     Returns:
-        A RedirectResponse for remote files, or a JSONResponse for local files.
+        A RedirectResponse for remote files, or an AssetFileResponse serving the
+        JSON file as is for local files, which supports range requests.
 
     Raises:
         HTTPException: If the file is not found.
     """
     # returns 'default' for nonexistent genome/asset; no need to catch
-    tag = tag or rgc.get_default_tag(genome, asset)
+    tag = tag or catalog.get_default_tag(genome, asset)
     file_name = template.format(asset, tag)
     path, remote = get_datapath_for_genome(
-        rgc, dict(genome=genome, file_name=file_name), remote_key="http"
+        catalog, dict(genome=genome, file_name=file_name), remote_key="http"
     )
     if remote:
-        _LOGGER.info(f"redirecting to URL: '{path}'")
-        return RedirectResponse(path)
-    _LOGGER.info(f"serving JSON: '{path}'")
-    if os.path.isfile(path):
-        with open(path, "r") as f:
-            recipe = load(f)
-        return JSONResponse(recipe)
+        return redirect_to_remote(path)
+    _LOGGER.debug(f"serving JSON: '{path}'")
+    stat_result = await stat_file(path)
+    if stat_result is not None:
+        return AssetFileResponse(
+            path,
+            media_type="application/json",
+            digest=sidecar_digest(catalog, genome, asset, tag, file_name),
+            stat_result=stat_result,
+        )
     else:
         msg = MSG_404.format(f"asset ({asset})")
         _LOGGER.warning(msg)
         raise HTTPException(status_code=404, detail=msg)
 
 
-def get_asset_dir_contents(
-    rgc: RefGenConf, genome: str, asset: str, tag: str | None
+async def get_asset_dir_contents(
+    catalog: ServingCatalog, genome: str, asset: str, tag: str | None
 ) -> list:
     """Get the asset directory contents as a list.
 
     Args:
-        rgc: Configuration object.
+        catalog: Serving catalog.
         genome: Genome name.
         asset: Asset name.
         tag: Tag name.
 
     Returns:
-        List of files in the asset directory.
+        List of files in the asset directory. Remote lists are cached.
 
     Raises:
         TypeError: If the path is neither a valid URL nor an existing file.
+        httpx.HTTPError: If the remote file can't be downloaded.
     """
     # returns 'default' for nonexistent genome/asset; no need to catch
-    tag = tag or rgc.get_default_tag(genome, asset)
+    tag = tag or catalog.get_default_tag(genome, asset)
     file_name = TEMPLATE_ASSET_DIR_CONTENTS.format(asset, tag)
     path, remote = get_datapath_for_genome(
-        rgc, dict(genome=genome, file_name=file_name), remote_key="http"
+        catalog, dict(genome=genome, file_name=file_name), remote_key="http"
     )
     if is_url(path):
         _LOGGER.debug(f"Asset dir contents path is a URL: {path}")
-        dir_contents = send_data_request(url=path)
-    elif os.path.exists(path):
+        return await dir_contents_cache.get(
+            (catalog.resolve_genome(genome) or genome, asset, tag),
+            partial(fetch_json, path),
+        )
+    if await stat_file(path) is not None:
         _LOGGER.debug(f"Asset dir contents path is a file: {path}")
-        with open(path) as f:
-            dir_contents = load(f)
-    else:
-        raise TypeError(f"Path is neither a valid URL nor an existing file: {path}")
-    _LOGGER.debug(f"Asset dir contents: {dir_contents}")
-    return dir_contents
+        return await read_json_file(path)
+    raise TypeError(f"Path is neither a valid URL nor an existing file: {path}")
+
+
+async def get_archive_index(
+    catalog: ServingCatalog, genome: str, asset: str, tag: str
+) -> dict | None:
+    """Get the index of the files in an asset archive.
+
+    Indexes are cached by the archive digest, which they are checked against,
+    so an index left behind by an earlier archive is never used.
+
+    Args:
+        catalog: Serving catalog.
+        genome: Genome name.
+        asset: Asset name.
+        tag: Tag name.
+
+    Returns:
+        The index, see archive_writer.build_member_index, or None if the
+        archive is not indexed or the index can't be read.
+    """
+    archive_digest = lookup_archive_digest(catalog, genome, asset, tag)
+    if archive_digest is None:
+        return None
+    file_name = TEMPLATE_ARCHIVE_INDEX.format(asset, tag)
+    path, remote = get_datapath_for_genome(
+        catalog, dict(genome=genome, file_name=file_name), remote_key="http"
+    )
+    key = (catalog.resolve_genome(genome) or genome, asset, tag, archive_digest)
+    try:
+        index = await archive_index_cache.get(
+            key, partial(fetch_json if remote else read_json_file, path)
+        )
+    except (httpx.HTTPError, OSError, ValueError) as e:
+        _LOGGER.debug(f"Could not read the archive index '{path}': {e}")
+        return None
+    if index.get("archive_digest") != archive_digest:
+        _LOGGER.warning(f"Archive index does not match the archive: {path}")
+        return None
+    return index
+
+
+async def stream_archive_member(
+    catalog: ServingCatalog, genome: str, asset: str, tag: str, entry: list[int]
+) -> AsyncIterator[bytes]:
+    """Extract a single file from an indexed asset archive.
+
+    Only the compressed blocks holding the file are read, with a Range request
+    if the archive is remote, and inflated.
+
+    Args:
+        catalog: Serving catalog.
+        genome: Genome name.
+        asset: Asset name.
+        tag: Tag name.
+        entry: The file entry of the archive index: start and end of the
+            compressed blocks, bytes to skip after inflating them, file size.
+
+    Yields:
+        The file contents in chunks.
+
+    Raises:
+        httpx.HTTPError: If the remote archive range can't be downloaded.
+        OSError: If the local archive can't be read.
+        zlib.error: If the archive range is corrupt.
+    """
+    start, end, skip, remaining = entry
+    file_name = f"{asset}__{tag}{ARCHIVE_SUFFIXES[ARCHIVE_FORMAT_TGZ]}"
+    path, remote = get_datapath_for_genome(
+        catalog, dict(genome=genome, file_name=file_name), remote_key="http"
+    )
+    if not remaining:
+        return
+    chunks = (fetch_range if remote else read_file_range)(path, start, end)
+    # raw deflate: the range starts at a block boundary, not a gzip header
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+    try:
+        async for chunk in chunks:
+            # inflate in bounded pieces; deflate data may expand a thousandfold
+            while chunk and remaining:
+                data = inflater.decompress(chunk, DEFAULT_CHUNK_SIZE)
+                chunk = inflater.unconsumed_tail
+                if skip:
+                    skipped = min(skip, len(data))
+                    data, skip = data[skipped:], skip - skipped
+                if data:
+                    data = data[:remaining]
+                    remaining -= len(data)
+                    yield data
+            if not remaining:
+                break
+        if remaining:
+            raise OSError(f"Archive ended {remaining} bytes short of the file: {path}")
+    finally:
+        await chunks.aclose()
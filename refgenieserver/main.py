@@ -1,72 +1,110 @@
 from __future__ import annotations
 
-import sys
+import argparse
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-import logmuse
-import uvicorn
 from fastapi import FastAPI
-from refgenconf import RefGenConf, select_genome_config
-from starlette.staticfiles import StaticFiles
+from refgenconf import RefGenConf
 from starlette.templating import Jinja2Templates
-from ubiquerg import parse_registry_path
 
+from .app_factory import configure_app
+from .async_io import close_http_client
+from .catalog import CatalogHolder, ServingCatalog
+from .cli import main  # noqa: F401 the CLI entry point used to be defined here
 from .const import *
-from .helpers import build_parser, purge_nonservable
-from .server_builder import archive
+from .helpers import purge_nonservable
+from .metrics import registry
+from .prefork import serve
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Application lifespan; runs the config reloader, if any, shares the
+    metrics with the other worker processes, if any, and releases the pooled
+    remote data connections on shutdown.
+
+    Args:
+        app: The application.
+    """
+    reloader = getattr(app.state, "reloader", None)
+    if reloader is not None:
+        await reloader.start()
+    flusher = None
+    if registry.shared_dir is not None:
+        flusher = asyncio.create_task(registry.flush_periodically())
+    try:
+        yield
+    finally:
+        if reloader is not None:
+            await reloader.stop()
+        if flusher is not None:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+        await close_http_client()
+
 
 app = FastAPI(
     title=PKG_NAME,
     description="a web interface and RESTful API for reference genome assets",
     version=server_v,
     openapi_tags=TAGS_METADATA,
+    lifespan=lifespan,
 )
 
-app.mount("/" + STATIC_DIRNAME, StaticFiles(directory=STATIC_PATH), name=STATIC_DIRNAME)
 templates = Jinja2Templates(directory=TEMPLATES_PATH)
 templates.env.filters["os_path_join"] = lambda paths: os.path.join(*paths)
+# the routers import this holder; the catalog it refers to is swapped on reload
+catalog = CatalogHolder()
 
 
-def main() -> None:
-    """Entry point for the refgenieserver CLI."""
-    global rgc, _LOGGER
-    parser = build_parser()
-    args = parser.parse_args()
-    if not args.command:
-        parser.print_help()
-        print("No subcommand given")
-        sys.exit(1)
-    logger_args = (
-        dict(name=PKG_NAME, fmt=LOG_FORMAT, level=5)
-        if args.debug
-        else dict(name=PKG_NAME, fmt=LOG_FORMAT)
-    )
-    _LOGGER = logmuse.setup_logger(**logger_args)
-    selected_cfg = select_genome_config(args.config)
-    assert selected_cfg is not None, (
-        "You must provide a config file or set the {} environment variable".format(
-            "or ".join(CFG_ENV_VARS)
-        )
+def serve_config(rgc: RefGenConf, config_path: str, args: argparse.Namespace) -> None:
+    """Serve a config with the options of the 'serve' subcommand.
+
+    The routers are imported once the serving catalog is built, and the
+    OpenAPI schema is built, or loaded from the cache, before the workers are
+    forked, so they share it.
+
+    Args:
+        rgc: Configuration object to serve.
+        config_path: Config file path, reloaded on changes.
+        args: Parsed 'serve' command line arguments.
+    """
+    global _LOGGER
+    # the routers import the logger from this module
+    _LOGGER = logging.getLogger(PKG_NAME)
+    # the router imports need to be after the serving catalog is built
+    purge_nonservable(rgc)
+    catalog.swap(ServingCatalog(rgc))
+    configure_app(
+        app,
+        catalog,
+        config_path,
+        reload_interval=args.reload_interval,
+        openapi_cache_dir=args.openapi_cache or None,
+        chunk_size=args.chunk_size,
+        fadvise=args.fadvise,
     )
-    # this RefGenConf object will be used in the server, so it's read-only
-    rgc = RefGenConf.from_yaml_file(selected_cfg)
-    if args.command == "archive":
-        arp = (
-            [parse_registry_path(x) for x in args.asset_registry_paths]
-            if args.asset_registry_paths is not None
-            else None
-        )
-        archive(rgc, arp, args.force, args.remove, selected_cfg, args.genomes_desc)
-    elif args.command == "serve":
-        # the router imports need to be after the RefGenConf object is declared
-        purge_nonservable(rgc)
-        from .routers import private, version1, version2, version3
+    from .routers import private, version1, version2, version3
 
-        # v3 is registered at both root (latest/default API) and /v3 (versioned).
-        # This intentional dual-registration causes harmless "Duplicate Operation ID"
-        # warnings from FastAPI. These only affect OpenAPI codegen tools, not API usage.
-        app.include_router(version3.router)
-        app.include_router(version1.router, prefix="/v1")
-        app.include_router(version2.router, prefix="/v2")
-        app.include_router(version3.router, prefix="/v3")
-        app.include_router(private.router, prefix=f"/{PRIVATE_API}")
-        uvicorn.run(app, host="0.0.0.0", port=args.port)
+    # v3 is registered at both root (latest/default API) and /v3 (versioned).
+    # This intentional dual-registration causes harmless "Duplicate Operation ID"
+    # warnings from FastAPI. These only affect OpenAPI codegen tools, not API usage.
+    app.include_router(version3.router)
+    app.include_router(version1.router, prefix="/v1")
+    app.include_router(version2.router, prefix="/v2")
+    app.include_router(version3.router, prefix="/v3")
+    app.include_router(private.router, prefix=f"/{PRIVATE_API}")
+    app.openapi()
+    serve(
+        app,
+        workers=args.workers,
+        host="0.0.0.0",
+        port=args.port,
+        uds=args.uds,
+        backlog=args.backlog,
+        timeout_keep_alive=args.timeout_keep_alive,
+        limit_concurrency=args.limit_concurrency,
+    )
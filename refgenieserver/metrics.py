@@ -0,0 +1,513 @@
+"""Prometheus metrics of the served requests"""
+
+from __future__ import annotations
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, Any
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .const import *
+from .file_response import PATHSEND_EXTENSION, ZEROCOPY_EXTENSION
+
+if TYPE_CHECKING:
+    from .catalog import CatalogHolder
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+# media type of the Prometheus text exposition format
+EXPOSITION_MEDIA_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+# upper bounds of the request duration histogram buckets, in seconds
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+# seconds between the metric snapshots written by each worker process
+METRICS_FLUSH_INTERVAL: float = 5.0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """A metric family: values keyed by label value tuples."""
+
+    kind: str = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        """Create a metric without any values.
+
+        Args:
+            name: Metric name.
+            documentation: Help text.
+            labelnames: Names of the labels the values are keyed by.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], Any] = {}
+
+    def render(self, values: dict[tuple[str, ...], Any]) -> list[str]:
+        """Format the values in the Prometheus text exposition format.
+
+        Args:
+            values: Values to format, keyed by label value tuples.
+
+        Returns:
+            The exposition lines, including the HELP and TYPE lines.
+        """
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for labels, value in sorted(values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def inc(self, labels: tuple[str, ...] = (), amount: float = 1.0) -> None:
+        """Increment the value.
+
+        Args:
+            labels: Label values, in the order of the label names.
+            amount: Non-negative amount to increment the value by.
+        """
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def dec(self, labels: tuple[str, ...] = (), amount: float = 1.0) -> None:
+        """Decrement the value.
+
+        Args:
+            labels: Label values, in the order of the label names.
+            amount: Amount to decrement the value by.
+        """
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple[str, ...], value: float) -> None:
+        """Set the value.
+
+        Args:
+            labels: Label values, in the order of the label names.
+            value: The new value.
+        """
+        self.values[labels] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in buckets.
+
+    The values are lists of the per-bucket counts, the last bucket being +Inf,
+    followed by the sum of the observations.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        """Create a histogram without any observations.
+
+        Args:
+            name: Metric name.
+            documentation: Help text.
+            labelnames: Names of the labels the values are keyed by.
+            buckets: Upper bounds of the buckets, excluding +Inf.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        """Record an observation.
+
+        Args:
+            labels: Label values, in the order of the label names.
+            value: The observed value.
+        """
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render(self, values: dict[tuple[str, ...], Any]) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        bucket_labels = (*self.labelnames, "le")
+        for labels, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = _format_labels(bucket_labels, (*labels, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+def _merge(into: dict[tuple[str, ...], Any], values: Iterable[tuple]) -> None:
+    for labels, value in values:
+        labels = tuple(labels)
+        current = into.get(labels)
+        if current is None:
+            into[labels] = list(value) if isinstance(value, list) else value
+        elif isinstance(current, list):
+            into[labels] = [a + b for a, b in zip(current, value)]
+        else:
+            into[labels] = current + value
+
+
+class MetricsRegistry:
+    """The metrics of a server and their exposition.
+
+    The metrics are updated in the event loop without any locking, so updating
+    them costs a dictionary lookup and an addition.
+
+    With multiple worker processes every worker writes a snapshot of its
+    metrics to a shared directory every METRICS_FLUSH_INTERVAL seconds and
+    when it stops. A scrape served by any worker sums its own current values
+    with the latest snapshots of the other workers. The counters of workers
+    that exited are kept, their gauges are dropped.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: dict[str, Callable[[], Iterable[_Metric]]] = {}
+        self.shared_dir: str | None = None
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Gauge:
+        """Create and register a gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(
+        self, name: str, collector: Callable[[], Iterable[_Metric]]
+    ) -> None:
+        """Register a function producing metrics at scrape time.
+
+        Collected metrics are exposed by each process as is; they are neither
+        shared nor summed across worker processes.
+
+        Args:
+            name: Collector name; a collector registered under the same name
+                before is replaced.
+            collector: Function returning the metrics, e.g. gauges of the
+                served catalog.
+        """
+        self._collectors[name] = collector
+
+    def share(self, directory: str) -> None:
+        """Share the metrics across the worker processes forked after the call.
+
+        Args:
+            directory: Directory to exchange the metric snapshots in; created
+                if it does not exist.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.shared_dir = directory
+
+    def snapshot(self) -> dict[str, list]:
+        """Get the current metric values in a JSON serializable form.
+
+        Returns:
+            [label values, value] lists keyed by the metric names.
+        """
+        return {
+            name: [[list(k), v] for k, v in metric.values.items()]
+            for name, metric in self._metrics.items()
+        }
+
+    def write_snapshot(self) -> None:
+        """Write the snapshot of this process to the shared directory."""
+        if self.shared_dir is None:
+            return
+        path = os.path.join(self.shared_dir, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.snapshot(), f, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+
+    def retire(self, pid: int) -> None:
+        """Keep the counters, but not the gauges, of a worker that exited.
+
+        Args:
+            pid: Process ID of the worker.
+        """
+        if self.shared_dir is None:
+            return
+        path = os.path.join(self.shared_dir, f"{pid}.json")
+        retired = f"retired-{pid}-{time.time_ns()}.json"
+        if os.path.exists(path):
+            os.replace(path, os.path.join(self.shared_dir, retired))
+
+    async def flush_periodically(self) -> None:
+        """Write the snapshot of this process periodically and when cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+                self.write_snapshot()
+        finally:
+            self.write_snapshot()
+
+    def _merged_values(self) -> dict[str, dict[tuple[str, ...], Any]]:
+        merged = {name: {} for name in self._metrics}
+        for name, metric in self._metrics.items():
+            _merge(merged[name], metric.values.items())
+        if self.shared_dir is None:
+            return merged
+        own = f"{os.getpid()}.json"
+        for path in glob.glob(os.path.join(self.shared_dir, "*.json")):
+            file_name = os.path.basename(path)
+            if file_name == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            retired = file_name.startswith("retired-")
+            for name, values in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None or (retired and metric.kind == "gauge"):
+                    continue
+                _merge(merged[name], values)
+        return merged
+
+    def render(self) -> str:
+        """Render all the metrics in the Prometheus text exposition format.
+
+        Returns:
+            The exposition text.
+        """
+        lines = []
+        for name, values in self._merged_values().items():
+            lines.extend(self._metrics[name].render(values))
+        for collector in self._collectors.values():
+            for metric in collector():
+                lines.extend(metric.render(metric.values))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+request_duration = registry.histogram(
+    "refgenieserver_request_duration_seconds",
+    "Time to serve a request, including sending the response body",
+    ("operation_id",),
+)
+responses_in_progress = registry.gauge(
+    "refgenieserver_responses_in_progress",
+    "Responses being sent, e.g. downloads in progress",
+    ("operation_id",),
+)
+bytes_served = registry.counter(
+    "refgenieserver_bytes_served_total",
+    "Response body bytes sent for successful requests of served assets",
+    ("genome", "asset"),
+)
+not_found = registry.counter(
+    "refgenieserver_not_found_total",
+    "Requests answered with 404 Not Found",
+    ("operation_id",),
+)
+redirects = registry.counter(
+    "refgenieserver_redirects_total",
+    "Requests redirected to a remote data provider",
+    ("remote_class",),
+)
+
+
+def catalog_collector(holder: CatalogHolder) -> Callable[[], list[_Metric]]:
+    """Create a collector of the served catalog size and version.
+
+    Args:
+        holder: Holder of the served catalog.
+
+    Returns:
+        The collector, to register with MetricsRegistry.add_collector.
+    """
+
+    def _collect() -> list[_Metric]:
+        catalog = holder.current
+        genomes = Gauge("refgenieserver_catalog_genomes", "Served genomes")
+        genomes.set((), len(catalog.genomes))
+        assets = Gauge("refgenieserver_catalog_assets", "Served assets")
+        assets.set(
+            (),
+            sum(len(g.get(CFG_ASSETS_KEY) or {}) for g in catalog.genomes.values()),
+        )
+        tags = Gauge("refgenieserver_catalog_tags", "Served asset tags")
+        tags.set((), catalog.tag_count)
+        info = Gauge(
+            "refgenieserver_catalog_info", "Served catalog version", ("version",)
+        )
+        info.set((catalog.version,), 1)
+        return [genomes, assets, tags, info]
+
+    return _collect
+
+
+def _operation_id(scope: Scope) -> str:
+    # API routes have operation IDs, others are named after their endpoints
+    operation_id = getattr(scope.get("route"), "operation_id", None)
+    if operation_id is None:
+        endpoint = scope.get("endpoint")
+        return getattr(endpoint, "__name__", None) or "unmatched"
+    return operation_id
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the request metrics.
+
+    Records the request duration until the response is sent, the responses in
+    progress and 404 responses by operation, and the bytes sent for the
+    successful requests of served genome assets. The bytes are labeled with
+    the genome digest, whether the genome was requested by digest or alias;
+    redirects and requests of genomes or assets not in the catalog are not
+    counted, so the label values are bounded by the catalog.
+
+    The catalog is read within the request, so the middleware has to be
+    wrapped by CatalogSnapshotMiddleware to check the assets against the
+    catalog the request was served from.
+    """
+
+    def __init__(self, app: ASGIApp, holder: CatalogHolder) -> None:
+        """Wrap an application.
+
+        Args:
+            app: The wrapped ASGI application.
+            holder: Holder of the served catalog.
+        """
+        self.app = app
+        self.holder = holder
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+        content_length = 0
+        in_progress: tuple[str, ...] | None = None
+
+        async def _send(message: Message) -> None:
+            nonlocal status, sent, content_length, in_progress
+            kind = message["type"]
+            if kind == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key.lower() == b"content-length":
+                        content_length = int(value)
+                # the route is resolved by now
+                in_progress = (_operation_id(scope),)
+                responses_in_progress.inc(in_progress)
+            elif kind == "http.response.body":
+                sent += len(message.get("body", b""))
+            elif kind == ZEROCOPY_EXTENSION:
+                sent += message["count"]
+            elif kind == PATHSEND_EXTENSION:
+                sent += content_length
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            if in_progress is not None:
+                responses_in_progress.dec(in_progress)
+            operation_id = _operation_id(scope)
+            request_duration.observe((operation_id,), time.perf_counter() - start)
+            if status == 404:
+                not_found.inc((operation_id,))
+            params = scope.get("path_params") or {}
+            if 200 <= status < 300 and "genome" in params and "asset" in params:
+                catalog = self.holder.current
+                genome, asset = params["genome"], params["asset"]
+                if catalog.has_asset(genome, asset):
+                    bytes_served.inc((catalog.resolve_genome(genome), asset), sent)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Return the metrics in the Prometheus text exposition format."""
+    return Response(registry.render(), media_type=EXPOSITION_MEDIA_TYPE)
@@ -0,0 +1,251 @@
+"""OpenAPI schema built once per catalog version and cached on disk"""
+
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+from hashlib import md5
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from refgenconf.refgenconf import map_paths_by_id
+
+from .catalog import CatalogHolder, ServingCatalog
+from .const import *
+from .helpers import safely_get_example
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+# parameter examples used until the schema is built, and if the catalog does
+# not provide any, by parameter name
+DEFAULT_EXAMPLES: dict[str, str] = {
+    "genome": "2230c535660fb4774114bfa966a62f823fdb6d21acf138d4",
+    "alias": "hg38",
+    "asset": "fasta",
+    "seek_key": "fasta",
+}
+
+
+def catalog_examples(catalog: ServingCatalog) -> dict[str, str]:
+    """Get parameter examples that exist in the catalog.
+
+    Args:
+        catalog: Serving catalog.
+
+    Returns:
+        Examples by parameter name; the defaults where the catalog has none.
+    """
+    alias = safely_get_example(
+        catalog, "genome alias", "genomes_list", DEFAULT_EXAMPLES["alias"]
+    )
+    digest = safely_get_example(
+        catalog,
+        "genome digest",
+        "get_genome_alias_digest",
+        DEFAULT_EXAMPLES["genome"],
+        alias=alias,
+    )
+    asset = safely_get_example(
+        catalog,
+        "asset",
+        "list_assets_by_genome",
+        DEFAULT_EXAMPLES["asset"],
+        genome=alias,
+    )
+    return {"genome": digest, "alias": alias, "asset": asset, "seek_key": asset}
+
+
+def set_examples(schema: dict[str, Any], examples: dict[str, str]) -> None:
+    """Set the default examples of the path parameters in a schema.
+
+    Only parameters defined with examples are updated.
+
+    Args:
+        schema: OpenAPI schema; updated in place.
+        examples: Examples by parameter name.
+    """
+    for path_item in schema.get("paths", {}).values():
+        for operation in path_item.values():
+            for param in operation.get("parameters", []):
+                param_examples = param.get("schema", {}).get("examples")
+                if isinstance(param_examples, dict) and param["name"] in examples:
+                    param_examples["default"] = examples[param["name"]]
+
+
+def set_enums(schema: dict[str, Any], enums: dict[str, list[str]]) -> None:
+    """Set the allowed values of the query parameters in a schema.
+
+    Args:
+        schema: OpenAPI schema; updated in place.
+        enums: Allowed values by parameter name.
+    """
+    for path_item in schema.get("paths", {}).values():
+        for operation in path_item.values():
+            for param in operation.get("parameters", []):
+                if param.get("in") == "query" and param["name"] in enums:
+                    param.setdefault("schema", {})["enum"] = enums[param["name"]]
+
+
+class OpenAPISchemaCache:
+    """Replacement of app.openapi building the schema once per catalog version.
+
+    FastAPI builds the schema on the first call and keeps it for the lifetime
+    of the app; the parameter examples used to be computed from the catalog
+    when the routers were imported. Here both happen when the schema is first
+    needed, and again only when a reload swaps in a new catalog version. The
+    schema is also stored in a cache directory, keyed by the server version,
+    the route table and the catalog version, so processes serving the same
+    config, e.g. restarted or autoscaled containers sharing the directory,
+    load it instead of building it. Only the OPENAPI_CACHE_SIZE most recently
+    stored or loaded schemas are kept in the directory.
+
+    Along with the schema, the OpenAPI version and the path templates of the
+    operations the splash pages link to are extracted, so the pages don't
+    walk the schema.
+    """
+
+    def __init__(
+        self, app: FastAPI, holder: CatalogHolder, cache_dir: str | None = None
+    ) -> None:
+        """Create the schema cache of an app.
+
+        Args:
+            app: The application; set app.openapi to the cache to use it.
+            holder: Holder of the served catalog.
+            cache_dir: Directory to store the schemas in; None to keep them in
+                memory only.
+        """
+        self.app = app
+        self.holder = holder
+        self.cache_dir = cache_dir
+        self._schema: dict[str, Any] | None = None
+        self._version: str | None = None
+        self._openapi_version = "3.0.2"
+        self._links: dict[str, dict[str, str]] = {}
+
+    def __call__(self) -> dict[str, Any]:
+        """Get the schema of the current catalog version.
+
+        Returns:
+            The OpenAPI schema.
+        """
+        catalog = self.holder.current
+        if self._schema is None or self._version != catalog.version:
+            key = self._key(catalog)
+            schema = self._load(key)
+            if schema is None:
+                schema = self._build(catalog)
+                self._store(key, schema)
+            self._openapi_version = schema["openapi"]
+            paths_by_id = map_paths_by_id(schema)
+            self._links = {
+                group: {
+                    name: paths_by_id[oid]
+                    for oid, name in operation_ids.items()
+                    if oid in paths_by_id
+                }
+                for group, operation_ids in OPERATION_IDS.items()
+            }
+            self._schema, self._version = schema, catalog.version
+            self.app.openapi_schema = schema
+        return self._schema
+
+    @property
+    def openapi_version(self) -> str:
+        """OpenAPI version of the schema of the current catalog version."""
+        self()
+        return self._openapi_version
+
+    def links(self, group: str) -> dict[str, str]:
+        """Get the path templates of the operations linked from a splash page.
+
+        Args:
+            group: Operation group in OPERATION_IDS, e.g. 'v3_asset'.
+
+        Returns:
+            Path templates by link name, in the order of the group.
+        """
+        self()
+        return self._links.get(group, {})
+
+    def _key(self, catalog: ServingCatalog) -> str:
+        """Digest the inputs of the schema: versions, routes and their sources."""
+        routes, sources = [], set()
+        for route in self.app.routes:
+            methods = sorted(getattr(route, "methods", None) or [])
+            routes.append(f"{','.join(methods)} {getattr(route, 'path', '')}")
+            if isinstance(route, APIRoute):
+                sources.add(route.endpoint.__code__.co_filename)
+        mtimes = []
+        for source in sorted(sources):
+            try:
+                mtimes.append(f"{source} {os.stat(source).st_mtime_ns}")
+            except OSError:
+                mtimes.append(source)
+        key = "\n".join([server_v, catalog.version, *sorted(routes), *mtimes])
+        return md5(key.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, TEMPLATE_OPENAPI_CACHE.format(key))
+
+    def _load(self, key: str) -> dict[str, Any] | None:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                schema = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _LOGGER.debug(f"OpenAPI schema loaded: {self._path(key)}")
+        try:
+            # keeps the schema among the most recently used ones
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return schema
+
+    def _build(self, catalog: ServingCatalog) -> dict[str, Any]:
+        # FastAPI.openapi returns the schema it has built before, if any
+        self.app.openapi_schema = None
+        schema = FastAPI.openapi(self.app)
+        set_examples(schema, catalog_examples(catalog))
+        # validated against the catalog pinned for each request
+        set_enums(schema, {"remoteClass": catalog.remote_classes})
+        _LOGGER.debug(f"OpenAPI schema built for catalog version {catalog.version}")
+        return schema
+
+    def _store(self, key: str, schema: dict[str, Any]) -> None:
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        partial = f"{path}.{os.getpid()}.partial"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(partial, "w") as f:
+                json.dump(schema, f)
+            os.replace(partial, path)
+        except OSError as e:
+            _LOGGER.debug(f"Could not store the OpenAPI schema: {e}")
+            return
+        _LOGGER.debug(f"OpenAPI schema stored: {path}")
+        self._prune()
+
+    def _prune(self) -> None:
+        """Remove all but the OPENAPI_CACHE_SIZE most recently used schemas."""
+        mtimes = {}
+        pattern = TEMPLATE_OPENAPI_CACHE.format("*")
+        for path in glob.glob(os.path.join(glob.escape(self.cache_dir), pattern)):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                # removed by another process meanwhile
+                continue
+        for path in sorted(mtimes, key=mtimes.get, reverse=True)[OPENAPI_CACHE_SIZE:]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            _LOGGER.debug(f"OpenAPI schema removed: {path}")
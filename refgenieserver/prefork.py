@@ -0,0 +1,133 @@
+"""Pre-fork multi-process serving"""
+
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import time
+from typing import TYPE_CHECKING, Any
+
+import uvicorn
+
+from .const import *
+from .metrics import registry
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+# seconds to wait before replacing a worker that exited unexpectedly
+RESPAWN_DELAY: float = 1.0
+
+
+def _run_worker(config: uvicorn.Config, sock: Any) -> None:
+    # the supervisor signal handlers are inherited; uvicorn installs its own
+    # SIGINT/SIGTERM handlers and the reloader its SIGHUP handler at startup
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    status = 0
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        _LOGGER.exception(f"Worker {os.getpid()} crashed")
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def serve(app: FastAPI, workers: int = 1, **config_kwargs: Any) -> None:
+    """Serve the application with one or more worker processes.
+
+    With multiple workers the listening socket is bound and the application,
+    including the serving catalog, is fully set up once in this process, which
+    then forks the workers. The workers share the catalog memory copy-on-write,
+    so the memory use stays flat as workers are added. Workers that exit
+    unexpectedly are replaced; SIGHUP is forwarded to all workers, SIGINT and
+    SIGTERM shut them down gracefully. The workers share their metrics through
+    a temporary directory, so a metrics scrape served by any of them covers
+    all of them.
+
+    Args:
+        app: The configured application.
+        workers: Number of worker processes.
+        **config_kwargs: uvicorn.Config keyword arguments, e.g. host, port, uds,
+            backlog, timeout_keep_alive or limit_concurrency.
+
+    Raises:
+        RuntimeError: If multiple workers are requested on a platform that
+            does not support fork.
+    """
+    config = uvicorn.Config(app, **config_kwargs)
+    if workers <= 1:
+        uvicorn.Server(config).run()
+        return
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Multiple workers require a platform that supports fork")
+
+    sock = config.bind_socket()
+    registry.share(tempfile.mkdtemp(prefix=f"{PKG_NAME}-metrics-"))
+    # keep the garbage collector from touching, and thus copying, the pages
+    # of the objects created so far in every worker
+    gc.collect()
+    gc.freeze()
+
+    children: set[int] = set()
+    stopping = False
+
+    def _spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock)
+        children.add(pid)
+        _LOGGER.info(f"Started worker process [{pid}]")
+
+    def _forward(signum: int) -> None:
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _on_stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        _forward(signal.SIGTERM)
+
+    def _on_hup(signum: int, frame: Any) -> None:
+        _forward(signal.SIGHUP)
+
+    for _ in range(workers):
+        _spawn()
+    signal.signal(signal.SIGINT, _on_stop)
+    signal.signal(signal.SIGTERM, _on_stop)
+    signal.signal(signal.SIGHUP, _on_hup)
+    _LOGGER.info(f"Serving with {workers} worker processes [{os.getpid()}]")
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            children.discard(pid)
+            registry.retire(pid)
+            if stopping:
+                continue
+            _LOGGER.warning(
+                f"Worker process [{pid}] exited with status "
+                f"{os.waitstatus_to_exitcode(status)}; starting a new one"
+            )
+            time.sleep(RESPAWN_DELAY)
+            if not stopping:
+                _spawn()
+    finally:
+        sock.close()
+        shutil.rmtree(registry.shared_dir, ignore_errors=True)
+        if config.uds and os.path.exists(config.uds):
+            os.remove(config.uds)
+        _LOGGER.info("All worker processes stopped")
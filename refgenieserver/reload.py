@@ -0,0 +1,169 @@
+"""Hot reload of the serving catalog"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import time
+
+import anyio
+from refgenconf import RefGenConf
+
+from .catalog import CatalogHolder, ServingCatalog
+from .const import *
+from .helpers import purge_nonservable
+from .ttl_cache import dir_contents_cache
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+
+def load_catalog(config_path: str, base_dir: str | None = None) -> ServingCatalog:
+    """Read the server config, purge the non-servable entries and build a catalog.
+
+    Args:
+        config_path: Path to the refgenie server config YAML.
+        base_dir: Local archive directory to build the file paths from.
+            BASE_DIR is used if not specified.
+
+    Returns:
+        The serving catalog.
+    """
+    rgc = RefGenConf.from_yaml_file(config_path)
+    purge_nonservable(rgc)
+    return ServingCatalog(rgc, base_dir=base_dir)
+
+
+class CatalogReloader:
+    """Rebuilds the serving catalog from the server config and swaps it in.
+
+    A reload is triggered by a SIGHUP signal or, if a poll interval is set, by
+    a change of the config file modification time. The catalog is built in a
+    worker thread, so the event loop keeps serving requests meanwhile.
+    Requests in flight keep using the catalog they started with.
+    """
+
+    def __init__(
+        self,
+        holder: CatalogHolder,
+        config_path: str,
+        base_dir: str | None = None,
+        interval: float = 0.0,
+    ) -> None:
+        """Create a reloader.
+
+        Args:
+            holder: Catalog holder to swap the rebuilt catalogs into.
+            config_path: Path to the refgenie server config YAML.
+            base_dir: Local archive directory to build the file paths from.
+            interval: Seconds between config file modification checks; 0
+                disables the polling.
+        """
+        self.holder = holder
+        self.config_path = config_path
+        self.base_dir = base_dir
+        self.interval = interval
+        self.reload_count = 0
+        self.last_reload_seconds: float | None = None
+        self.last_reload_time: float | None = None
+        self.last_error: str | None = None
+        self._lock = asyncio.Lock()
+        self._mtime = self._config_mtime()
+        self._watcher: asyncio.Task | None = None
+        self._signaled: asyncio.Task | None = None
+        self._signal_installed = False
+
+    @property
+    def stats(self) -> dict:
+        """The current catalog version and the reload statistics."""
+        return {
+            "version": self.holder.current.version,
+            "reload_count": self.reload_count,
+            "last_reload_seconds": self.last_reload_seconds,
+            "last_reload_time": self.last_reload_time,
+            "last_error": self.last_error,
+        }
+
+    def _config_mtime(self) -> float | None:
+        try:
+            return os.stat(self.config_path).st_mtime
+        except OSError:
+            return None
+
+    async def reload(self) -> bool:
+        """Rebuild the catalog and swap it in, unless its contents are the same.
+
+        Errors are logged and the current catalog is kept.
+
+        Returns:
+            Whether a new catalog version has been swapped in.
+        """
+        async with self._lock:
+            start = time.perf_counter()
+            try:
+                catalog = await anyio.to_thread.run_sync(
+                    load_catalog, self.config_path, self.base_dir
+                )
+            except Exception as e:
+                self.last_error = f"{e.__class__.__name__}: {e}"
+                _LOGGER.error(
+                    f"Could not reload the server config; keeping the current "
+                    f"catalog. Caught error: {self.last_error}"
+                )
+                return False
+            self.last_reload_seconds = time.perf_counter() - start
+            self.last_reload_time = time.time()
+            self.last_error = None
+            if catalog.version == self.holder.current.version:
+                _LOGGER.info(
+                    f"Server config reloaded in {self.last_reload_seconds:.3f}s; "
+                    f"catalog unchanged (version {catalog.version})"
+                )
+                return False
+            self.holder.swap(catalog)
+            dir_contents_cache.clear()
+            self.reload_count += 1
+            _LOGGER.info(
+                f"Server config reloaded in {self.last_reload_seconds:.3f}s; "
+                f"serving {catalog!r}, version {catalog.version}"
+            )
+            return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            mtime = self._config_mtime()
+            if mtime is not None and mtime != self._mtime:
+                self._mtime = mtime
+                _LOGGER.info(f"Server config changed: {self.config_path}")
+                await self.reload()
+
+    def _on_sighup(self) -> None:
+        _LOGGER.info("SIGHUP received; reloading the server config")
+        self._signaled = asyncio.ensure_future(self.reload())
+
+    async def start(self) -> None:
+        """Install the SIGHUP handler and start polling the config file."""
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self._on_sighup)
+            self._signal_installed = True
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            # no SIGHUP on this platform or not running in the main thread
+            _LOGGER.debug("Could not install the SIGHUP reload handler")
+        if self.interval > 0:
+            self._watcher = asyncio.ensure_future(self._watch())
+
+    async def stop(self) -> None:
+        """Remove the SIGHUP handler and stop polling the config file."""
+        if self._signal_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal_installed = False
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
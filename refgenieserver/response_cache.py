@@ -0,0 +1,305 @@
+"""Pre-serialized, precompressed response cache"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+from collections import OrderedDict
+from hashlib import md5
+from typing import Any, Callable
+
+from pydantic import TypeAdapter
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .conditional import is_not_modified
+from .const import *
+
+try:
+    import brotli
+except ImportError:  # brotli is an optional dependency
+    brotli = None
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+# responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE: int = 500
+# preferred content-coding first; 'identity' is always available
+ENCODINGS: tuple[str, ...] = ("br", "gzip", "identity")
+
+
+def select_encoding(accept_encoding: str | None, available: Any) -> str:
+    """Select the content-coding to respond with.
+
+    Args:
+        accept_encoding: Accept-Encoding request header value.
+        available: Collection of the available content-codings.
+
+    Returns:
+        The preferred acceptable content-coding, 'identity' if none.
+    """
+    if not accept_encoding:
+        return "identity"
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qvalues[coding.strip().lower()] = q
+    default_q = qvalues.get("*", 0.0)
+    best, best_q = "identity", 0.0
+    for coding in ENCODINGS:
+        if coding not in available:
+            continue
+        q = qvalues.get(coding, default_q)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CachedResponse:
+    """A response body rendered once, along with its compressed variants.
+
+    Each content-coding variant has its own strong entity tag, derived from
+    the digest of the uncompressed body.
+    """
+
+    __slots__ = ("media_type", "bodies", "etags", "headers")
+
+    def __init__(
+        self,
+        body: bytes,
+        media_type: str,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        """Render the compressed variants of a body.
+
+        Args:
+            body: Uncompressed response body.
+            media_type: Response media type.
+            headers: Additional headers to send with every variant.
+        """
+        digest = md5(body).hexdigest()
+        self.media_type = media_type
+        self.headers = headers or {}
+        self.bodies = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body)
+        self.etags = {
+            coding: f'"{digest}"' if coding == "identity" else f'"{digest}-{coding}"'
+            for coding in self.bodies
+        }
+
+    def not_modified(self, request: Request) -> bool:
+        """Check whether the client already holds a current representation.
+
+        Args:
+            request: The incoming request.
+
+        Returns:
+            Whether any of the If-None-Match tags matches one of the variants.
+        """
+        return is_not_modified(request.headers, self.etags.values())
+
+    def to_response(self, request: Request) -> Response:
+        """Create a response for the content-coding accepted by the client.
+
+        Args:
+            request: The incoming request.
+
+        Returns:
+            A 304 response if the client representation is current, the cached
+            variant otherwise.
+        """
+        coding = select_encoding(request.headers.get("accept-encoding"), self.bodies)
+        headers = dict(self.headers, etag=self.etags[coding], vary="Accept-Encoding")
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["content-encoding"] = coding
+        return Response(
+            content=self.bodies[coding], media_type=self.media_type, headers=headers
+        )
+
+
+def render_json(content: Any, response_model: Any = None) -> bytes:
+    """Serialize content the way FastAPI serializes JSON responses.
+
+    Args:
+        content: Object to serialize.
+        response_model: Type to validate and filter the content with, just like
+            the route response_model would.
+
+    Returns:
+        The JSON encoded body.
+    """
+    if response_model is not None and content is not None:
+        adapter = TypeAdapter(response_model)
+        content = adapter.dump_python(adapter.validate_python(content), mode="json")
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class ResponseCache:
+    """Cache of rendered responses, invalidated when the catalog version changes."""
+
+    def __init__(self, maxsize: int | None = None) -> None:
+        """Create an empty cache.
+
+        Args:
+            maxsize: Max number of cached responses; least recently used are
+                evicted. None for no limit, for responses keyed by the catalog
+                contents only.
+        """
+        self.maxsize = maxsize
+        self._version = None
+        self._entries: OrderedDict[Any, CachedResponse] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Cache counters and the current size."""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def get(
+        self, version: str, key: Any, render: Callable[[], CachedResponse]
+    ) -> CachedResponse:
+        """Get a cached response, rendering it on the first use.
+
+        Args:
+            version: Version of the catalog the response is rendered from.
+            key: Hashable key identifying the response, e.g. the route path and
+                the relevant query parameters.
+            render: Function that renders the response.
+
+        Returns:
+            The cached response.
+
+        Raises:
+            Exception: Whatever the render function raises, e.g. KeyError for
+                content the catalog doesn't have; nothing is cached then, so
+                requests for nonexistent content don't fill the cache.
+        """
+        if version != self._version:
+            if self._version is not None:
+                _LOGGER.debug(
+                    f"Catalog version changed to {version}; dropping "
+                    f"{len(self._entries)} cached responses"
+                )
+            self._entries = OrderedDict()
+            self._version = version
+        try:
+            entry = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            entry = self._entries[key] = render()
+            if self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return entry
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def json(
+        self,
+        request: Request,
+        version: str,
+        key: Any,
+        build: Callable[[], Any],
+        response_model: Any = None,
+    ) -> Response:
+        """Respond with a cached JSON rendering of the built content.
+
+        Args:
+            request: The incoming request.
+            version: Version of the catalog the content is built from.
+            key: Hashable key identifying the response.
+            build: Function that builds the content to serialize.
+            response_model: Type to validate the content with, once.
+
+        Returns:
+            The response for the content-coding accepted by the client.
+        """
+        return self.get(
+            version,
+            key,
+            lambda: CachedResponse(
+                render_json(build(), response_model),
+                media_type="application/json",
+                headers={"cache-control": CACHE_CONTROL},
+            ),
+        ).to_response(request)
+
+    def text(
+        self, request: Request, version: str, key: Any, build: Callable[[], str]
+    ) -> Response:
+        """Respond with a cached plain text content.
+
+        Args:
+            request: The incoming request.
+            version: Version of the catalog the content is built from.
+            key: Hashable key identifying the response.
+            build: Function that builds the text to respond with.
+
+        Returns:
+            The response for the content-coding accepted by the client.
+        """
+        return self.get(
+            version,
+            key,
+            lambda: CachedResponse(
+                build().encode("utf-8"),
+                media_type="text/plain",
+                headers={"cache-control": CACHE_CONTROL},
+            ),
+        ).to_response(request)
+
+    def html(
+        self, request: Request, version: str, key: Any, build: Callable[[], str]
+    ) -> Response:
+        """Respond with a cached HTML page.
+
+        Args:
+            request: The incoming request.
+            version: Version of the catalog the page is rendered from.
+            key: Hashable key identifying the page, including everything the
+                rendering depends on besides the catalog.
+            build: Function that renders the page.
+
+        Returns:
+            The response for the content-coding accepted by the client.
+        """
+        return self.get(
+            version,
+            key,
+            lambda: CachedResponse(
+                build().encode("utf-8"),
+                media_type="text/html",
+                headers={"cache-control": CACHE_CONTROL},
+            ),
+        ).to_response(request)
+
+
+# rendered responses shared by all the routers; bounded, since the keys of the
+# per-tag responses include request parameters
+response_cache = ResponseCache(maxsize=RESPONSE_CACHE_SIZE)
+# rendered HTML pages; bounded, since the keys include request parameters
+page_cache = ResponseCache(maxsize=PAGE_CACHE_SIZE)
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 from fastapi import APIRouter
+from starlette.requests import Request
+from starlette.responses import Response
 
 from ..const import *
 from ..data_models import Dict, Genome
-from ..main import _LOGGER, rgc
+from ..main import catalog
+from ..response_cache import page_cache, response_cache
+from ..ttl_cache import dir_contents_cache
 
 router = APIRouter()
 
@@ -17,7 +21,39 @@ api_version_tags = [PRIV_API_ID]
     operation_id=PRIVATE_API + API_ID_GENOMES_DICT,
     response_model=Dict[str, Genome],
 )
-async def get_genomes_dict() -> dict:
+async def get_genomes_dict(request: Request) -> Response:
     """Return the entire 'genomes' section of the config (private endpoint)."""
-    _LOGGER.info(f"serving genomes dict: '{rgc[CFG_GENOMES_KEY]}'")
-    return rgc[CFG_GENOMES_KEY]
+    return response_cache.json(
+        request,
+        catalog.version,
+        "genomes_dict",
+        lambda: catalog.genomes,
+        response_model=Dict[str, Genome],
+    )
+
+
+@router.get(
+    "/cache/stats",
+    tags=api_version_tags,
+    operation_id=PRIVATE_API + "_cache_stats",
+)
+async def get_cache_stats() -> dict:
+    """Return the response and directory contents cache counters (private endpoint)."""
+    return {
+        "dir_contents": dir_contents_cache.stats,
+        "pages": page_cache.stats,
+        "responses": response_cache.stats,
+    }
+
+
+@router.get(
+    "/catalog",
+    tags=api_version_tags,
+    operation_id=PRIVATE_API + "_catalog",
+)
+async def get_catalog_info(request: Request) -> dict:
+    """Return the served catalog version and config reload statistics (private endpoint)."""
+    reloader = getattr(request.app.state, "reloader", None)
+    if reloader is None:
+        return {"version": catalog.version}
+    return reloader.stats
@@ -5,11 +5,19 @@ from copy import copy
 from fastapi import APIRouter, HTTPException
 from refgenconf.helpers import replace_str_in_obj
 from starlette.requests import Request
-from starlette.responses import FileResponse, RedirectResponse, Response
+from starlette.responses import Response
 
 from ..const import *
-from ..helpers import get_datapath_for_genome, get_openapi_version, preprocess_attrs
-from ..main import _LOGGER, app, rgc, templates
+from ..file_response import AssetFileResponse
+from ..helpers import (
+    get_datapath_for_genome,
+    get_openapi_version,
+    lookup_archive_digest,
+    preprocess_attrs,
+    redirect_to_remote,
+)
+from ..main import _LOGGER, app, catalog, templates
+from ..response_cache import page_cache
 
 router = APIRouter()
 
@@ -20,30 +28,33 @@ api_version_tags = [API1_ID]
 @router.get("/index", tags=api_version_tags)
 async def index(request: Request) -> Response:
     """Return a landing page HTML with the server resources ready to download."""
-    _LOGGER.debug("RefGenConf object:\n{}".format(rgc))
     templ_vars = {
         "request": request,
-        "genomes": rgc[CFG_GENOMES_KEY],
-        "rgc": rgc[CFG_GENOMES_KEY],
+        "genomes": catalog.genomes,
+        "rgc": catalog.genomes,
         "openapi_version": get_openapi_version(app),
     }
-    _LOGGER.debug("merged vars: {}".format(dict(templ_vars, **ALL_VERSIONS)))
-    return templates.TemplateResponse("index.html", dict(templ_vars, **ALL_VERSIONS))
+    # the static file links are absolute, so the pages depend on the base URL
+    return page_cache.html(
+        request,
+        catalog.version,
+        ("index.html", str(request.base_url)),
+        lambda: templates.get_template("index.html").render(
+            dict(templ_vars, **ALL_VERSIONS)
+        ),
+    )
 
 
 @router.get("/genomes", tags=api_version_tags)
 def list_available_genomes() -> list[str]:
     """Return a list of genomes this server holds at least one asset for."""
-    _LOGGER.info("serving genomes string: '{}'".format(rgc.genomes_str()))
-    return rgc.genomes_list()
+    return catalog.genomes_list()
 
 
 @router.get("/assets", tags=api_version_tags)
 def list_available_assets() -> dict:
     """Return a list of all assets that can be downloaded."""
-    ret_dict = rgc.list(include_tags=True)
-    _LOGGER.info("serving assets dict: {}".format(ret_dict))
-    return ret_dict
+    return catalog.list(include_tags=True)
 
 
 @router.get("/asset/{genome}/{asset}/archive", tags=api_version_tags)
@@ -57,26 +68,25 @@ async def download_asset(genome: str, asset: str, tag: str | None = None) -> Res
         asset: Asset name.
         tag: Tag name (default tag used if not specified).
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
     file_name = "{}__{}{}".format(asset, tag, ".tgz")
     path, remote = get_datapath_for_genome(
-        rgc,
+        catalog,
         dict(
-            genome=rgc.get_genome_alias(digest=genome, fallback=True),
+            genome=catalog.get_genome_alias(digest=genome, fallback=True),
             file_name=file_name,
         ),
         remote_key="http",
     )
-    _LOGGER.info("file source: {}".format(path))
     if remote:
-        _LOGGER.info("redirecting to URL: '{}'".format(path))
-        return RedirectResponse(path)
-    _LOGGER.info("serving asset file: '{}'".format(path))
+        return redirect_to_remote(path)
+    _LOGGER.debug("serving asset file: '{}'".format(path))
     if os.path.isfile(path):
-        return FileResponse(
-            path, filename=file_name, media_type="application/octet-stream"
+        return AssetFileResponse(
+            path,
+            filename=file_name,
+            digest=lookup_archive_digest(catalog, genome, asset, tag, legacy=True),
         )
     else:
         msg = MSG_404.format("asset ({})".format(asset))
@@ -95,11 +105,7 @@ def download_asset_attributes(genome: str, asset: str) -> dict:
         asset: Asset name.
     """
     try:
-        attrs = preprocess_attrs(
-            rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][CFG_ASSET_TAGS_KEY][
-                DEFAULT_TAG
-            ]
-        )
+        attrs = preprocess_attrs(catalog.get_tag(genome, asset, DEFAULT_TAG))
         attrs_copy = copy(attrs)
         if CFG_LEGACY_ARCHIVE_CHECKSUM_KEY in attrs_copy:
             # TODO: remove in future releases
@@ -112,11 +118,10 @@ def download_asset_attributes(genome: str, asset: str) -> dict:
                 CFG_LEGACY_ARCHIVE_CHECKSUM_KEY
             ]
             del attrs_copy[CFG_LEGACY_ARCHIVE_CHECKSUM_KEY]
-        _LOGGER.info(f"attributes returned for {genome}/{asset}:{tag}: \n{attrs_copy}")
         return replace_str_in_obj(
             attrs_copy,
-            x=rgc.get_genome_alias_digest(alias=genome, fallback=True),
-            y=rgc.get_genome_alias(digest=genome, fallback=True),
+            x=catalog.get_genome_alias_digest(alias=genome, fallback=True),
+            y=catalog.get_genome_alias(digest=genome, fallback=True),
         )
     except KeyError:
         _LOGGER.warning(_LOGGER.warning(MSG_404.format("genome, asset or tag")))
@@ -132,6 +137,4 @@ def list_genomes_by_asset(asset: str) -> list[str]:
     Args:
         asset: Asset name.
     """
-    genomes = rgc.list_genomes_by_asset(asset)
-    _LOGGER.info("serving genomes by '{}' asset: {}".format(asset, genomes))
-    return genomes
+    return catalog.list_genomes_by_asset(asset)
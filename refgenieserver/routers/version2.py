@@ -4,14 +4,24 @@ from copy import copy
 
 from fastapi import APIRouter, HTTPException
 from refgenconf.helpers import replace_str_in_obj
-from refgenconf.refgenconf import map_paths_by_id
 from starlette.requests import Request
-from starlette.responses import FileResponse, JSONResponse, RedirectResponse, Response
+from starlette.responses import Response
 from ubiquerg import parse_registry_path
+from yacman import UndefinedAliasError
 
+from ..async_io import stat_file
 from ..const import *
-from ..helpers import get_datapath_for_genome, get_openapi_version
-from ..main import _LOGGER, app, rgc, templates
+from ..file_response import AssetFileResponse
+from ..helpers import (
+    get_datapath_for_genome,
+    get_openapi_version,
+    lookup_archive_digest,
+    redirect_to_remote,
+    require_asset,
+    sidecar_digest,
+)
+from ..main import _LOGGER, app, catalog, templates
+from ..response_cache import page_cache, response_cache
 
 router = APIRouter()
 
@@ -22,15 +32,21 @@ api_version_tags = [API2_ID]
 @router.get("/index", tags=api_version_tags)
 async def index(request: Request) -> Response:
     """Return a landing page HTML with the server resources ready to download."""
-    _LOGGER.debug("RefGenConf object:\n{}".format(rgc))
     templ_vars = {
         "request": request,
-        "genomes": rgc[CFG_GENOMES_KEY],
-        "rgc": rgc[CFG_GENOMES_KEY],
+        "genomes": catalog.genomes,
+        "rgc": catalog.genomes,
         "openapi_version": get_openapi_version(app),
     }
-    _LOGGER.debug("merged vars: {}".format(dict(templ_vars, **ALL_VERSIONS)))
-    return templates.TemplateResponse("index.html", dict(templ_vars, **ALL_VERSIONS))
+    # the static file links are absolute, so the pages depend on the base URL
+    return page_cache.html(
+        request,
+        catalog.version,
+        ("index.html", str(request.base_url)),
+        lambda: templates.get_template("index.html").render(
+            dict(templ_vars, **ALL_VERSIONS)
+        ),
+    )
 
 
 @router.get("/asset/{genome}/{asset}/splash", tags=api_version_tags)
@@ -45,41 +61,43 @@ async def asset_splash_page(
         asset: Asset name.
         tag: Tag name (default tag used if not specified).
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
+    # the catalog and the page cache are keyed by genome digest
+    genome = require_asset(catalog, genome, asset)
+    tag = tag or catalog.get_default_tag(genome, asset)
     links_dict = {
-        OPERATION_IDS["asset"][oid]: path.format(genome=genome, asset=asset, tag=tag)
-        for oid, path in map_paths_by_id(app.openapi()).items()
-        if oid in OPERATION_IDS["asset"].keys()
+        name: path.format(genome=genome, asset=asset, tag=tag)
+        for name, path in app.openapi.links("asset").items()
     }
     templ_vars = {
         "request": request,
         "genome": genome,
         "asset": asset,
         "tag": tag,
-        "rgc": rgc,
+        "rgc": catalog,
         "prp": parse_registry_path,
         "links_dict": links_dict,
         "openapi_version": get_openapi_version(app),
     }
-    _LOGGER.debug("merged vars: {}".format(dict(templ_vars, **ALL_VERSIONS)))
-    return templates.TemplateResponse("asset.html", dict(templ_vars, **ALL_VERSIONS))
+    return page_cache.html(
+        request,
+        catalog.version,
+        ("asset.html", str(request.base_url), genome, asset, tag),
+        lambda: templates.get_template("asset.html").render(
+            dict(templ_vars, **ALL_VERSIONS)
+        ),
+    )
 
 
 @router.get("/genomes", tags=api_version_tags)
 async def list_available_genomes() -> list[str]:
     """Return a list of genomes this server holds at least one asset for."""
-    _LOGGER.info("serving genomes string: '{}'".format(rgc.genomes_str()))
-    return rgc.genomes_list()
+    return catalog.genomes_list()
 
 
 @router.get("/assets", operation_id=API_ID_ASSETS, tags=api_version_tags)
 async def list_available_assets() -> dict:
     """Return a list of all assets that can be downloaded."""
-    ret_dict = rgc.list(include_tags=True)
-    _LOGGER.info("serving assets dict: {}".format(ret_dict))
-    return ret_dict
+    return catalog.list(include_tags=True)
 
 
 @router.get(
@@ -95,26 +113,27 @@ async def download_asset(genome: str, asset: str, tag: str | None = None) -> Res
         asset: Asset name.
         tag: Tag name (default tag used if not specified).
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
     file_name = "{}__{}{}".format(asset, tag, ".tgz")
     path, remote = get_datapath_for_genome(
-        rgc,
+        catalog,
         dict(
-            genome=rgc.get_genome_alias(digest=genome, fallback=True),
+            genome=catalog.get_genome_alias(digest=genome, fallback=True),
             file_name=file_name,
         ),
         remote_key="http",
     )
-    _LOGGER.info("file source: {}".format(path))
     if remote:
-        _LOGGER.info("redirecting to URL: '{}'".format(path))
-        return RedirectResponse(path)
-    _LOGGER.info("serving asset file: '{}'".format(path))
-    if os.path.isfile(path):
-        return FileResponse(
-            path, filename=file_name, media_type="application/octet-stream"
+        return redirect_to_remote(path)
+    _LOGGER.debug("serving asset file: '{}'".format(path))
+    stat_result = await stat_file(path)
+    if stat_result is not None:
+        return AssetFileResponse(
+            path,
+            filename=file_name,
+            digest=lookup_archive_digest(catalog, genome, asset, tag, legacy=True),
+            stat_result=stat_result,
         )
     else:
         msg = MSG_404.format("asset ({})".format(asset))
@@ -134,7 +153,8 @@ async def get_asset_default_tag(genome: str, asset: str) -> str:
         genome: Genome name.
         asset: Asset name.
     """
-    return rgc.get_default_tag(genome, asset)
+    require_asset(catalog, genome, asset)
+    return catalog.get_default_tag(genome, asset)
 
 
 @router.get(
@@ -142,18 +162,24 @@ async def get_asset_default_tag(genome: str, asset: str) -> str:
     operation_id=API_ID_DIGEST,
     tags=api_version_tags,
 )
-async def get_asset_digest(genome: str, asset: str, tag: str) -> str:
+async def get_asset_digest(
+    request: Request, genome: str, asset: str, tag: str
+) -> Response:
     """Return the asset digest.
 
     Args:
+        request: The incoming request.
         genome: Genome name.
         asset: Asset name.
         tag: Tag name.
     """
     try:
-        return rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][CFG_ASSET_TAGS_KEY][
-            tag
-        ][CFG_ASSET_CHECKSUM_KEY]
+        return response_cache.json(
+            request,
+            catalog.version,
+            (API2_ID, "asset_digest", genome, asset, tag),
+            lambda: catalog.get_tag(genome, asset, tag)[CFG_ASSET_CHECKSUM_KEY],
+        )
     except KeyError:
         msg = MSG_404.format(
             "genome/asset:tag combination ({}/{}:{})".format(genome, asset, tag)
@@ -167,18 +193,24 @@ async def get_asset_digest(genome: str, asset: str, tag: str) -> str:
     operation_id=API_ID_ARCHIVE_DIGEST,
     tags=api_version_tags,
 )
-async def get_archive_digest(genome: str, asset: str, tag: str) -> str:
+async def get_archive_digest(
+    request: Request, genome: str, asset: str, tag: str
+) -> Response:
     """Return the archive digest.
 
     Args:
+        request: The incoming request.
         genome: Genome name.
         asset: Asset name.
         tag: Tag name.
     """
     try:
-        return rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][CFG_ASSET_TAGS_KEY][
-            tag
-        ][CFG_ARCHIVE_CHECKSUM_KEY]
+        return response_cache.json(
+            request,
+            catalog.version,
+            (API2_ID, "archive_digest", genome, asset, tag),
+            lambda: catalog.get_tag(genome, asset, tag)[CFG_ARCHIVE_CHECKSUM_KEY],
+        )
     except KeyError:
         msg = MSG_404.format(
             "genome/asset:tag combination ({}/{}:{})".format(genome, asset, tag)
@@ -200,25 +232,27 @@ async def download_asset_build_log(
         asset: Asset name.
         tag: Tag name (default tag used if not specified).
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
     file_name = TEMPLATE_LOG.format(asset, tag)
     path, remote = get_datapath_for_genome(
-        rgc,
+        catalog,
         dict(
-            genome=rgc.get_genome_alias(digest=genome, fallback=True),
+            genome=catalog.get_genome_alias(digest=genome, fallback=True),
             file_name=file_name,
         ),
         remote_key="http",
     )
     if remote:
-        _LOGGER.info("redirecting to URL: '{}'".format(path))
-        return RedirectResponse(path)
-    _LOGGER.info("serving build log file: '{}'".format(path))
-    if os.path.isfile(path):
-        return FileResponse(
-            path, filename=file_name, media_type="application/octet-stream"
+        return redirect_to_remote(path)
+    _LOGGER.debug("serving build log file: '{}'".format(path))
+    stat_result = await stat_file(path)
+    if stat_result is not None:
+        return AssetFileResponse(
+            path,
+            filename=file_name,
+            digest=sidecar_digest(catalog, genome, asset, tag, file_name),
+            stat_result=stat_result,
         )
     else:
         msg = MSG_404.format("asset ({})".format(asset))
@@ -239,28 +273,28 @@ async def download_asset_build_recipe(
         asset: Asset name.
         tag: Tag name (default tag used if not specified).
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
     file_name = TEMPLATE_RECIPE_JSON.format(asset, tag)
     path, remote = get_datapath_for_genome(
-        rgc,
+        catalog,
         dict(
-            genome=rgc.get_genome_alias(digest=genome, fallback=True),
+            genome=catalog.get_genome_alias(digest=genome, fallback=True),
             file_name=file_name,
         ),
         remote_key="http",
     )
     if remote:
-        _LOGGER.info("redirecting to URL: '{}'".format(path))
-        return RedirectResponse(path)
-    _LOGGER.info("serving build log file: '{}'".format(path))
-    if os.path.isfile(path):
-        import json
-
-        with open(path, "r") as f:
-            recipe = json.load(f)
-        return JSONResponse(recipe)
+        return redirect_to_remote(path)
+    _LOGGER.debug("serving build recipe file: '{}'".format(path))
+    stat_result = await stat_file(path)
+    if stat_result is not None:
+        return AssetFileResponse(
+            path,
+            media_type="application/json",
+            digest=sidecar_digest(catalog, genome, asset, tag, file_name),
+            stat_result=stat_result,
+        )
     else:
         msg = MSG_404.format("asset ({})".format(asset))
         _LOGGER.warning(msg)
@@ -271,23 +305,21 @@ async def download_asset_build_recipe(
     "/asset/{genome}/{asset}", operation_id=API_ID_ASSET_ATTRS, tags=api_version_tags
 )
 async def download_asset_attributes(
-    genome: str, asset: str, tag: str | None = None
-) -> dict:
+    request: Request, genome: str, asset: str, tag: str | None = None
+) -> Response:
     """Return a dictionary of asset attributes (archive size, digest, etc.).
 
     Args:
+        request: The incoming request.
         genome: Genome name.
         asset: Asset name.
         tag: Tag name (default tag used if not specified).
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
-    try:
-        attrs = rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][CFG_ASSET_TAGS_KEY][
-            tag
-        ]
-        attrs_copy = copy(attrs)
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
+
+    def _get_attrs() -> dict:
+        attrs_copy = copy(catalog.get_tag(genome, asset, tag))
         if CFG_LEGACY_ARCHIVE_CHECKSUM_KEY in attrs_copy:
             # TODO: remove in future releases
             # new asset archives consist of different file names, so the new
@@ -298,11 +330,18 @@ async def download_asset_attributes(
                 CFG_LEGACY_ARCHIVE_CHECKSUM_KEY
             ]
             del attrs_copy[CFG_LEGACY_ARCHIVE_CHECKSUM_KEY]
-        _LOGGER.info(f"attributes returned for {genome}/{asset}:{tag}: \n{attrs_copy}")
         return replace_str_in_obj(
             attrs_copy,
-            x=rgc.get_genome_alias_digest(alias=genome, fallback=True),
-            y=rgc.get_genome_alias(digest=genome, fallback=True),
+            x=catalog.get_genome_alias_digest(alias=genome, fallback=True),
+            y=catalog.get_genome_alias(digest=genome, fallback=True),
+        )
+
+    try:
+        return response_cache.json(
+            request,
+            catalog.version,
+            (API2_ID, "asset_attrs", genome, asset, tag),
+            _get_attrs,
         )
     except KeyError:
         msg = MSG_404.format(
@@ -320,10 +359,8 @@ async def download_genome_digest(genome: str) -> str:
         genome: Genome name.
     """
     try:
-        digest = rgc.get_genome_alias_digest(alias=genome)
-        _LOGGER.info("digest returned for '{}': {}".format(genome, digest))
-        return digest
-    except KeyError:
+        return catalog.get_genome_alias_digest(alias=genome)
+    except (KeyError, UndefinedAliasError):
         msg = MSG_404.format("genome ({})".format(genome))
         _LOGGER.warning(msg)
         raise HTTPException(status_code=404, detail=msg)
@@ -337,11 +374,7 @@ async def download_genome_attributes(genome: str) -> dict:
         genome: Genome name.
     """
     try:
-        attrs = rgc.get_genome_attributes(genome)
-        _LOGGER.info(
-            "attributes returned for genome '{}': \n{}".format(genome, str(attrs))
-        )
-        return attrs
+        return catalog.get_genome_attributes(genome)
     except KeyError:
         msg = MSG_404.format("genome ({})".format(genome))
         _LOGGER.warning(msg)
@@ -355,6 +388,4 @@ async def list_genomes_by_asset(asset: str) -> list[str]:
     Args:
         asset: Asset name.
     """
-    genomes = rgc.list_genomes_by_asset(asset)
-    _LOGGER.info("serving genomes by '{}' asset: {}".format(asset, genomes))
-    return genomes
+    return catalog.list_genomes_by_asset(asset)
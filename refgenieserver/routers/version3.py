@@ -1,77 +1,72 @@
 from __future__ import annotations
 
+import posixpath
 from copy import copy
 from datetime import date
 from enum import Enum
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Path, Query, Response
-from refgenconf.refgenconf import map_paths_by_id
 from starlette.requests import Request
-from starlette.responses import FileResponse, RedirectResponse
+from starlette.responses import StreamingResponse
 from ubiquerg import parse_registry_path
 from yacman import UndefinedAliasError
 
+from ..async_io import stat_file
+from ..conditional import is_not_modified
 from ..const import *
 from ..data_models import Dict, List, Tag
+from ..file_response import AssetFileResponse
 from ..helpers import (
     create_asset_file_path,
+    get_archive_index,
     get_asset_dir_contents,
     get_datapath_for_genome,
     get_openapi_version,
-    is_data_remote,
-    safely_get_example,
+    lookup_archive_digest,
+    negotiate_archive_format,
+    redirect_to_remote,
+    require_asset,
     serve_file_for_asset,
     serve_json_for_asset,
+    sidecar_digest,
+    stream_archive_member,
 )
-from ..main import _LOGGER, app, rgc, templates
+from ..main import _LOGGER, app, catalog, templates
+from ..openapi import DEFAULT_EXAMPLES
+from ..response_cache import page_cache, response_cache
 
-RemoteClassEnum = Enum(
-    "RemoteClassEnum",
-    {r: r for r in rgc["remotes"]} if is_data_remote(rgc) else {"http": "http"},
-)
-
-ex_alias = safely_get_example(
-    rgc,
-    "genome digest",
-    "genomes_list",
-    "2230c535660fb4774114bfa966a62f823fdb6d21acf138d4",
-)
-ex_digest = safely_get_example(
-    rgc, "genome alias", "get_genome_alias_digest", "hg38", alias=ex_alias
-)
-ex_asset = safely_get_example(
-    rgc, "asset", "list_assets_by_genome", "fasta", genome=ex_alias
-)
+ArchiveFormatEnum = Enum("ArchiveFormatEnum", {f: f for f in ARCHIVE_SUFFIXES})
 
 router = APIRouter()
 
-# API query path definitions
+# API query path definitions; the examples are replaced with ones from the
+# catalog when the OpenAPI schema is built
 g = Path(
     ...,
     description="Genome digest",
     pattern=r"^\w+$",
     max_length=48,
     min_length=48,
-    examples={"default": ex_digest},
+    examples={"default": DEFAULT_EXAMPLES["genome"]},
 )
 al = Path(
     ...,
     description="Genome alias",
     pattern=r"^\S+$",
-    examples={"default": ex_alias},
+    examples={"default": DEFAULT_EXAMPLES["alias"]},
 )
 a = Path(
     ...,
     description="Asset name",
     pattern=r"^\S+$",
-    examples={"default": ex_asset},
+    examples={"default": DEFAULT_EXAMPLES["asset"]},
 )
 s = Path(
     ...,
     description="Seek key name",
     pattern=r"^\S+$",
-    examples={"default": ex_asset},
+    examples={"default": DEFAULT_EXAMPLES["seek_key"]},
 )
 t = Path(
     ...,
@@ -95,33 +90,47 @@ current_year = date.today().year
 @router.get("/index", tags=api_version_tags)
 async def index(request: Request) -> Response:
     """Return a landing page HTML with the server resources ready to download."""
-    _LOGGER.debug(f"RefGenConf object:\n{rgc}")
     templ_vars = {
         "request": request,
-        "genomes": rgc[CFG_GENOMES_KEY],
-        "rgc": rgc,
+        "genomes": catalog.genomes,
+        "rgc": catalog,
         "openapi_version": get_openapi_version(app),
         "columns": ["aliases", "digest", "description", "fasta asset", "# assets"],
         "current_year": current_year,
     }
-    return templates.TemplateResponse("v3/index.html", dict(templ_vars, **ALL_VERSIONS))
+    # the static file links are absolute, so the pages depend on the base URL
+    return page_cache.html(
+        request,
+        catalog.version,
+        ("v3/index.html", str(request.base_url)),
+        lambda: templates.get_template("v3/index.html").render(
+            dict(templ_vars, **ALL_VERSIONS)
+        ),
+    )
 
 
 @router.get(
     "/remotes/dict", tags=api_version_tags, response_model=Dict[str, Dict[str, str]]
 )
-async def get_remotes_dict() -> dict[str, dict[str, str]] | None:
+async def get_remotes_dict(request: Request) -> Response:
     """Return the remotes section of the server configuration file."""
-    return rgc["remotes"] if "remotes" in rgc else None
+    return response_cache.json(
+        request,
+        catalog.version,
+        "remotes_dict",
+        lambda: catalog.remotes,
+        response_model=Dict[str, Dict[str, str]],
+    )
 
 
 @router.get("/genomes/splash/{genome}", tags=api_version_tags)
 async def genome_splash_page(request: Request, genome: str = g) -> Response:
     """Return a genome splash page."""
+    require_asset(catalog, genome)
     templ_vars = {
         "openapi_version": get_openapi_version(app),
         "genome": genome,
-        "genome_dict": rgc[CFG_GENOMES_KEY][genome],
+        "genome_dict": catalog.genomes[genome],
         "request": request,
         "current_year": current_year,
         "columns": [
@@ -132,9 +141,13 @@ async def genome_splash_page(request: Request, genome: str = g) -> Response:
             "archive digest",
         ],
     }
-    _LOGGER.debug(f"merged vars: {dict(templ_vars, **ALL_VERSIONS)}")
-    return templates.TemplateResponse(
-        "v3/genome.html", dict(templ_vars, **ALL_VERSIONS)
+    return page_cache.html(
+        request,
+        catalog.version,
+        ("v3/genome.html", str(request.base_url), genome),
+        lambda: templates.get_template("v3/genome.html").render(
+            dict(templ_vars, **ALL_VERSIONS)
+        ),
     )
 
 
@@ -143,18 +156,16 @@ async def asset_splash_page(
     request: Request, genome: str = g, asset: str = a, tag: Optional[str] = tq
 ) -> Response:
     """Return an asset splash page."""
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
+    require_asset(catalog, genome, asset)
+    tag = tag or catalog.get_default_tag(genome, asset)
     links_dict = {
-        OPERATION_IDS["v3_asset"][oid]: path.format(genome=genome, asset=asset, tag=tag)
-        for oid, path in map_paths_by_id(app.openapi()).items()
-        if oid in OPERATION_IDS["v3_asset"].keys()
+        name: path.format(genome=genome, asset=asset, tag=tag)
+        for name, path in app.openapi.links("v3_asset").items()
     }
 
     try:
-        asset_dir_contents = get_asset_dir_contents(
-            rgc=rgc, genome=genome, asset=asset, tag=tag
+        asset_dir_contents = await get_asset_dir_contents(
+            catalog=catalog, genome=genome, asset=asset, tag=tag
         )
     except Exception as e:
         _LOGGER.warning(
@@ -163,11 +174,11 @@ async def asset_splash_page(
         asset_dir_contents = None
 
     asset_dir_paths = {}
-    if is_data_remote(rgc):
-        for remote_key in rgc["remotes"].keys():
+    if catalog.is_remote:
+        for remote_key in catalog["remotes"].keys():
             try:
                 asset_dir_path = create_asset_file_path(
-                    rgc, genome, asset, tag, "dir", remote_key=remote_key
+                    catalog, genome, asset, tag, "dir", remote_key=remote_key
                 )
             except Exception as e:
                 _LOGGER.warning(
@@ -181,24 +192,37 @@ async def asset_splash_page(
         "genome": genome,
         "asset": asset,
         "tag": tag,
-        "rgc": rgc,
+        "rgc": catalog,
         "prp": parse_registry_path,
         "links_dict": links_dict,
         "current_year": current_year,
         "openapi_version": get_openapi_version(app),
         "asset_dir_contents": asset_dir_contents,
         "asset_dir_paths": asset_dir_paths,
-        "is_data_remote": is_data_remote(rgc),
+        "is_data_remote": catalog.is_remote,
     }
-    _LOGGER.debug(f"merged vars: {dict(templ_vars, **ALL_VERSIONS)}")
-    return templates.TemplateResponse("v3/asset.html", dict(templ_vars, **ALL_VERSIONS))
+    # the remote directory contents change without a catalog version change
+    contents_key = None if asset_dir_contents is None else tuple(asset_dir_contents)
+    return page_cache.html(
+        request,
+        catalog.version,
+        ("v3/asset.html", str(request.base_url), genome, asset, tag, contents_key),
+        lambda: templates.get_template("v3/asset.html").render(
+            dict(templ_vars, **ALL_VERSIONS)
+        ),
+    )
 
 
 @router.get("/genomes/list", response_model=List[str], tags=api_version_tags)
-async def list_available_genomes() -> list[str]:
+async def list_available_genomes(request: Request) -> Response:
     """Return a list of genome digests this server serves at least one asset for."""
-    _LOGGER.info("serving genomes list")
-    return list(rgc[CFG_GENOMES_KEY].keys())
+    return response_cache.json(
+        request,
+        catalog.version,
+        "genomes_list",
+        lambda: list(catalog.genomes.keys()),
+        response_model=List[str],
+    )
 
 
 @router.get(
@@ -207,13 +231,18 @@ async def list_available_genomes() -> list[str]:
     tags=api_version_tags,
     operation_id=API_VERSION + API_ID_ALIASES_DICT,
 )
-async def get_alias_dict() -> dict[str, list[str]]:
+async def get_alias_dict(request: Request) -> Response:
     """Return a dictionary of alias lists keyed by genome digests."""
-    _LOGGER.info("serving genomes alias dict")
-    return {
-        g: rgc[CFG_GENOMES_KEY][g].get(CFG_ALIASES_KEY, [])
-        for g in rgc[CFG_GENOMES_KEY].keys()
-    }
+    return response_cache.json(
+        request,
+        catalog.version,
+        "alias_dict",
+        lambda: {
+            g: catalog.genomes[g].get(CFG_ALIASES_KEY, [])
+            for g in catalog.genomes.keys()
+        },
+        response_model=Dict[str, List[str]],
+    )
 
 
 @router.get(
@@ -223,20 +252,23 @@ async def get_alias_dict() -> dict[str, list[str]]:
     tags=api_version_tags,
 )
 async def list_available_assets(
+    request: Request,
     includeSeekKeys: Optional[bool] = Query(
         False, description="Whether to include seek keys in the response"
     ),
-) -> dict[str, list[str]]:
+) -> Response:
     """Return a list of assets that can be downloaded, keyed by genome digests."""
-    ret_dict = (
-        rgc.list(include_tags=True) if includeSeekKeys else rgc.list_assets_by_genome()
+    return response_cache.json(
+        request,
+        catalog.version,
+        ("assets_list", bool(includeSeekKeys)),
+        lambda: (
+            catalog.list_asset_tags_by_genome()
+            if includeSeekKeys
+            else catalog.list_assets_by_genome()
+        ),
+        response_model=Dict[str, List[str]],
     )
-    digest_dict = {
-        rgc.get_genome_alias_digest(alias=alias): assets
-        for alias, assets in ret_dict.items()
-    }
-    _LOGGER.info(f"serving assets dict: {digest_dict}")
-    return digest_dict
 
 
 @router.get(
@@ -245,28 +277,61 @@ async def list_available_assets(
     tags=api_version_tags,
 )
 async def download_asset(
-    genome: str = g, asset: str = a, tag: Optional[str] = tq
+    request: Request,
+    genome: str = g,
+    asset: str = a,
+    tag: Optional[str] = tq,
+    archiveFormat: Optional[ArchiveFormatEnum] = Query(
+        None, description="Archive format: 'tgz' or, if available, 'zst'"
+    ),
 ) -> Response:
     """Return an asset archive.
 
     Optionally, 'tag' query parameter can be specified to get a tagged asset
     archive. Default tag is returned otherwise.
+
+    A zstd compressed archive (.tar.zst) is returned if it is available and
+    requested, either with the 'archiveFormat' query parameter or by accepting
+    'application/zstd'. The gzip compressed archive (.tgz) is returned
+    otherwise.
+
+    Byte range requests are supported, so interrupted downloads can be resumed
+    with a Range request; use the archive digest as the If-Range validator.
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
-    file_name = f"{asset}__{tag}.tgz"
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
+    archive_format = negotiate_archive_format(
+        catalog,
+        genome,
+        asset,
+        tag,
+        requested=archiveFormat.value if archiveFormat is not None else None,
+        accept=request.headers.get("accept"),
+    )
+    if archive_format is None:
+        msg = MSG_404.format(f"asset archive ({asset}, {archiveFormat.value})")
+        _LOGGER.warning(msg)
+        raise HTTPException(status_code=404, detail=msg)
+    file_name = f"{asset}__{tag}{ARCHIVE_SUFFIXES[archive_format]}"
     path, remote = get_datapath_for_genome(
-        rgc, dict(genome=genome, file_name=file_name), remote_key="http"
+        catalog, dict(genome=genome, file_name=file_name), remote_key="http"
     )
-    _LOGGER.info(f"file source: {path}")
+    # the archive format may be negotiated with the Accept header
+    headers = {"vary": "accept"}
     if remote:
-        _LOGGER.info(f"redirecting to URL: '{path}'")
-        return RedirectResponse(path)
-    _LOGGER.info(f"serving asset file: '{path}'")
-    if os.path.isfile(path):
-        return FileResponse(
-            path, filename=file_name, media_type="application/octet-stream"
+        return redirect_to_remote(path, headers=headers)
+    _LOGGER.debug(f"serving asset file: '{path}'")
+    stat_result = await stat_file(path)
+    if stat_result is not None:
+        return AssetFileResponse(
+            path,
+            filename=file_name,
+            media_type=ARCHIVE_MEDIA_TYPES[archive_format],
+            digest=lookup_archive_digest(
+                catalog, genome, asset, tag, archive_format=archive_format
+            ),
+            headers=headers,
+            stat_result=stat_result,
         )
     else:
         msg = MSG_404.format(f"asset ({asset})")
@@ -274,6 +339,70 @@ async def download_asset(
         raise HTTPException(status_code=404, detail=msg)
 
 
+@router.get(
+    "/assets/archive_member/{genome}/{asset}",
+    operation_id=API_VERSION + API_ID_ARCHIVE_MEMBER,
+    tags=api_version_tags,
+)
+async def download_archive_member(
+    request: Request,
+    genome: str = g,
+    asset: str = a,
+    tag: Optional[str] = tq,
+    seekKey: Optional[str] = Query(
+        None, description="Seek key of the file", pattern=r"^\S+$"
+    ),
+    path: Optional[str] = Query(
+        None, description="File path relative to the asset directory"
+    ),
+) -> Response:
+    """Return a single file of an asset archive.
+
+    The file is selected either by its seek key or by its path relative to the
+    asset directory. Optionally, 'tag' query parameter can be specified. Default
+    tag is returned otherwise.
+
+    Only the part of the archive holding the file is read, so single files,
+    e.g. a FASTA index, can be retrieved without downloading the whole archive.
+    """
+    if (seekKey is None) == (path is None):
+        raise HTTPException(
+            status_code=422, detail="Specify exactly one of 'seekKey' and 'path'"
+        )
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
+    if seekKey is not None:
+        try:
+            seek_keys = catalog.get_tag(genome, asset, tag).get(CFG_SEEK_KEYS_KEY)
+            path = (seek_keys or {})[seekKey]
+        except KeyError:
+            msg = MSG_404.format(f"seek_key ({genome}/{asset}.{seekKey}:{tag})")
+            _LOGGER.warning(msg)
+            raise HTTPException(status_code=404, detail=msg)
+    member = posixpath.normpath(path).lstrip("/")
+    index = await get_archive_index(catalog, genome, asset, tag)
+    if index is None or member not in index["members"]:
+        msg = MSG_404.format(f"archived file ({genome}/{asset}:{tag}/{path})")
+        _LOGGER.warning(msg)
+        raise HTTPException(status_code=404, detail=msg)
+    entry = index["members"][member]
+    headers = {"cache-control": CACHE_CONTROL}
+    digest = sidecar_digest(catalog, genome, asset, tag, member)
+    if digest is not None:
+        headers["etag"] = f'"{digest}"'
+        if is_not_modified(request.headers, [headers["etag"]]):
+            return Response(status_code=304, headers=headers)
+    headers["content-length"] = str(entry[3])
+    headers["content-disposition"] = (
+        f'attachment; filename="{posixpath.basename(member)}"'
+    )
+    return StreamingResponse(
+        stream_archive_member(catalog, genome, asset, tag, entry),
+        media_type="application/octet-stream",
+        headers=headers,
+    )
+
+
 @router.get(
     "/assets/file_path/{genome}/{asset}/{seek_key}",
     operation_id=API_VERSION + API_ID_ASSET_PATH,
@@ -285,8 +414,8 @@ async def get_asset_file_path(
     asset: str = a,
     seek_key: str = s,
     tag: Optional[str] = tq,
-    remoteClass: RemoteClassEnum = Query(
-        "http", description="Remote data provider class"
+    remoteClass: str = Query(
+        "http", description="Remote data provider class", pattern=r"^\S+$"
     ),
 ) -> Response:
     """Return a path to the unarchived asset file.
@@ -296,14 +425,22 @@ async def get_asset_file_path(
     - **tag**: to get a tagged asset file path. Default tag is returned if not specified.
     - **remoteClass**: to set a remote data provider class. 'http' is used if not specified.
     """
-    if not is_data_remote(rgc):
-        _LOGGER.info(
+    # the remote classes are those of the catalog pinned for this request
+    if remoteClass not in catalog.remote_classes:
+        msg = (
+            f"Unknown remote data provider class: '{remoteClass}'. "
+            f"Available: {', '.join(catalog.remote_classes)}"
+        )
+        _LOGGER.warning(msg)
+        raise HTTPException(status_code=422, detail=msg)
+    if not catalog.is_remote:
+        _LOGGER.debug(
             "No 'remotes' defined in the server genome configuration file. "
             "Serving a local asset file path."
         )
     return Response(
         content=create_asset_file_path(
-            rgc, genome, asset, tag, seek_key, remote_key=remoteClass.value
+            catalog, genome, asset, tag, seek_key, remote_key=remoteClass
         ),
         media_type="text/plain",
     )
@@ -317,7 +454,10 @@ async def get_asset_file_path(
 )
 async def get_asset_default_tag(genome: str = g, asset: str = a) -> Response:
     """Return the default tag name for a genome/asset pair."""
-    return Response(content=rgc.get_default_tag(genome, asset), media_type="text/plain")
+    require_asset(catalog, genome, asset)
+    return Response(
+        content=catalog.get_default_tag(genome, asset), media_type="text/plain"
+    )
 
 
 @router.get(
@@ -327,16 +467,16 @@ async def get_asset_default_tag(genome: str = g, asset: str = a) -> Response:
     tags=api_version_tags,
 )
 async def get_asset_digest(
-    genome: str = g, asset: str = a, tag: Optional[str] = tq
+    request: Request, genome: str = g, asset: str = a, tag: Optional[str] = tq
 ) -> Response:
     """Return the asset digest for a genome/asset:tag combination."""
     tag = tag or DEFAULT_TAG
     try:
-        return Response(
-            content=rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][
-                CFG_ASSET_TAGS_KEY
-            ][tag][CFG_ASSET_CHECKSUM_KEY],
-            media_type="text/plain",
+        return response_cache.text(
+            request,
+            catalog.version,
+            ("asset_digest", genome, asset, tag),
+            lambda: catalog.get_tag(genome, asset, tag)[CFG_ASSET_CHECKSUM_KEY],
         )
     except KeyError:
         msg = MSG_404.format(f"genome/asset:tag combination ({genome}/{asset}:{tag})")
@@ -351,16 +491,16 @@ async def get_asset_digest(
     tags=api_version_tags,
 )
 async def get_archive_digest(
-    genome: str = g, asset: str = a, tag: Optional[str] = tq
+    request: Request, genome: str = g, asset: str = a, tag: Optional[str] = tq
 ) -> Response:
     """Return the archive digest for a genome/asset:tag combination."""
     tag = tag or DEFAULT_TAG
     try:
-        return Response(
-            content=rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][
-                CFG_ASSET_TAGS_KEY
-            ][tag][CFG_ARCHIVE_CHECKSUM_KEY],
-            media_type="text/plain",
+        return response_cache.text(
+            request,
+            catalog.version,
+            ("archive_digest", genome, asset, tag),
+            lambda: catalog.get_tag(genome, asset, tag)[CFG_ARCHIVE_CHECKSUM_KEY],
         )
     except KeyError:
         msg = MSG_404.format(f"genome/asset:tag combination ({genome}/{asset}:{tag})")
@@ -381,8 +521,8 @@ async def download_asset_build_recipe(
     Optionally, 'tag' query parameter can be specified. Default tag is returned
     otherwise.
     """
-    return serve_json_for_asset(
-        rgc=rgc,
+    return await serve_json_for_asset(
+        catalog=catalog,
         genome=genome,
         asset=asset,
         tag=tag,
@@ -403,8 +543,8 @@ async def download_asset_build_log(
     Optionally, 'tag' query parameter can be specified. Default tag is returned
     otherwise.
     """
-    return serve_file_for_asset(
-        rgc=rgc,
+    return await serve_file_for_asset(
+        catalog=catalog,
         genome=genome,
         asset=asset,
         tag=tag,
@@ -425,8 +565,8 @@ async def download_asset_directory_contents(
     Optionally, 'tag' query parameter can be specified. Default tag is returned
     otherwise.
     """
-    return serve_json_for_asset(
-        rgc=rgc,
+    return await serve_json_for_asset(
+        catalog=catalog,
         genome=genome,
         asset=asset,
         tag=tag,
@@ -434,6 +574,31 @@ async def download_asset_directory_contents(
     )
 
 
+@router.get(
+    "/assets/archive_manifest/{genome}/{asset}",
+    operation_id=API_VERSION + API_ID_ARCHIVE_MANIFEST,
+    tags=api_version_tags,
+)
+async def download_archive_manifest(
+    genome: str = g, asset: str = a, tag: Optional[str] = tq
+) -> Response:
+    """Return the chunk manifest of the asset archives.
+
+    The manifest lists the digests of the fixed-size chunks of each archive
+    format, so an archive can be downloaded in chunks over several connections
+    with Range requests, each chunk verified on its own and only corrupted
+    chunks downloaded again. Optionally, 'tag' query parameter can be
+    specified. Default tag is returned otherwise.
+    """
+    return await serve_json_for_asset(
+        catalog=catalog,
+        genome=genome,
+        asset=asset,
+        tag=tag,
+        template=TEMPLATE_ARCHIVE_MANIFEST,
+    )
+
+
 @router.get(
     "/assets/attrs/{genome}/{asset}",
     operation_id=API_VERSION + API_ID_ASSET_ATTRS,
@@ -441,21 +606,18 @@ async def download_asset_directory_contents(
     tags=api_version_tags,
 )
 async def download_asset_attributes(
-    genome: str = g, asset: str = a, tag: Optional[str] = tq
-) -> dict:
+    request: Request, genome: str = g, asset: str = a, tag: Optional[str] = tq
+) -> Response:
     """Return a dictionary of asset attributes (archive size, digest, etc.).
 
     Optionally, 'tag' query parameter can be specified to get tagged asset
     attributes.
     """
-    tag = tag or rgc.get_default_tag(
-        genome, asset
-    )  # returns 'default' for nonexistent genome/asset; no need to catch
-    try:
-        attrs = rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset][CFG_ASSET_TAGS_KEY][
-            tag
-        ]
-        attrs_copy = copy(attrs)
+    # returns 'default' for nonexistent genome/asset; no need to catch
+    tag = tag or catalog.get_default_tag(genome, asset)
+
+    def _get_attrs() -> dict:
+        attrs_copy = copy(catalog.get_tag(genome, asset, tag))
         if CFG_LEGACY_ARCHIVE_CHECKSUM_KEY in attrs_copy:
             # TODO: remove in future releases
             # new asset archives consist of different file names, so the new
@@ -463,8 +625,16 @@ async def download_asset_attributes(
             # archiver saves the old archive digest along with the new. So in
             # this API version we need remove the old entry from served attrs
             del attrs_copy[CFG_LEGACY_ARCHIVE_CHECKSUM_KEY]
-        _LOGGER.info(f"attributes returned for {genome}/{asset}:{tag}: \n{attrs_copy}")
         return attrs_copy
+
+    try:
+        return response_cache.json(
+            request,
+            catalog.version,
+            ("asset_attrs", genome, asset, tag),
+            _get_attrs,
+            response_model=Tag,
+        )
     except KeyError:
         msg = MSG_404.format(f"genome/asset:tag combination ({genome}/{asset}:{tag})")
         _LOGGER.warning(msg)
@@ -480,9 +650,7 @@ async def download_asset_attributes(
 async def download_genome_attributes(genome: str = g) -> dict:
     """Return a dictionary of genome attributes (archive size, digest, etc.)."""
     try:
-        attrs = rgc.get_genome_attributes(genome)
-        _LOGGER.info(f"attributes returned for genome '{genome}': \n{attrs}")
-        return attrs
+        return catalog.get_genome_attributes(genome)
     except KeyError:
         msg = MSG_404.format(f"genome ({genome})")
         _LOGGER.warning(msg)
@@ -494,9 +662,7 @@ async def download_genome_attributes(genome: str = g) -> dict:
 )
 async def list_genomes_by_asset(asset: str = a) -> list[str]:
     """Return a list of genomes that have the requested asset defined."""
-    genomes = rgc.list_genomes_by_asset(asset)
-    _LOGGER.info(f"serving genomes by '{asset}' asset: {genomes}")
-    return genomes
+    return catalog.list_genomes_by_asset(asset)
 
 
 @router.get(
@@ -508,9 +674,10 @@ async def list_genomes_by_asset(asset: str = a) -> list[str]:
 async def get_genome_alias_digest(alias: str = al) -> Response:
     """Return the genome digest for a given alias."""
     try:
-        digest = rgc.get_genome_alias_digest(alias=alias)
-        _LOGGER.info(f"digest returned for '{alias}': {digest}")
-        return Response(content=digest, media_type="text/plain")
+        return Response(
+            content=catalog.get_genome_alias_digest(alias=alias),
+            media_type="text/plain",
+        )
     except (KeyError, UndefinedAliasError):
         msg = MSG_404.format(f"alias ({alias})")
         _LOGGER.warning(msg)
@@ -526,9 +693,7 @@ async def get_genome_alias_digest(alias: str = al) -> Response:
 async def get_genome_alias(genome: str = g) -> list[str]:
     """Return the genome aliases for a given digest."""
     try:
-        alias = rgc[CFG_GENOMES_KEY][genome][CFG_ALIASES_KEY]
-        _LOGGER.info(f"alias returned for '{genome}': {alias}")
-        return alias
+        return catalog.genomes[genome][CFG_ALIASES_KEY]
     except (KeyError, UndefinedAliasError):
         msg = MSG_404.format(f"genome ({genome})")
         _LOGGER.warning(msg)
@@ -2,22 +2,36 @@ from __future__ import annotations
 
 import logging
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from glob import glob
+from hashlib import md5
 from json import dump
-from subprocess import run
+from threading import BoundedSemaphore
+from typing import Any, Mapping, NamedTuple
 
 from refgenconf import RefGenConf
 from refgenconf.exceptions import (
     ConfigNotCompliantError,
     GenomeConfigFormatError,
     MissingConfigDataError,
-    RefgenconfError,
 )
-from refgenconf.helpers import replace_str_in_obj, swap_names_in_tree
-from ubiquerg import checksum, is_command_callable, parse_registry_path, size
+from refgenconf.helpers import replace_str_in_obj
+from ubiquerg import checksum, filesize_to_str, size
 from yacman import write_lock
 
+from .archive_writer import (
+    ArchiveStats,
+    write_archive,
+    write_archives,
+    write_chunk_manifest,
+    zstandard,
+)
+from .build_report import BuildReport, StageTimer
+from .config_journal import ConfigJournal
 from .const import *
+from .file_store import FileStore
 
 global _LOGGER
 _LOGGER = logging.getLogger(PKG_NAME)
@@ -30,6 +44,13 @@ def archive(
     remove: bool,
     cfg_path: str,
     genomes_desc: str | None,
+    jobs: int = 1,
+    disk_jobs: int = DEFAULT_DISK_JOBS,
+    flush_every: int = DEFAULT_FLUSH_EVERY,
+    compression_level: int = ARCHIVE_COMPRESSION_LEVEL,
+    compression_threads: int = ARCHIVE_COMPRESSION_THREADS,
+    zstd: bool = False,
+    report_path: str | None = None,
 ) -> None:
     """Build tar archives for serving with 'refgenieserver serve'.
 
@@ -37,14 +58,40 @@ def archive(
     config with these data. If specific assets/genomes are requested, checks
     for the server config file and updates it to preserve archive metadata.
 
+    Tags are only rebuilt if their archives are missing, or if the asset digest
+    or the fingerprint of the asset directory (file names, sizes and
+    modification times) differ from the ones recorded for the archive.
+
+    The wall time, bytes and throughput of the build stages are recorded per
+    tag; the stages that took the most time are logged at the end of the run
+    and the full report is written as JSON, if requested.
+
     Args:
         rgc: Configuration object with data to build servable archives for.
         registry_paths: Collection of mappings identifying assets to update.
-        force: Whether to force the build regardless of existence.
+        force: Whether to rebuild the archives even if they are up to date.
         remove: Whether to remove specified genome/asset:tag from the archive.
         cfg_path: Config file path.
         genomes_desc: Path to CSV file with genome descriptions.
+        jobs: Max number of tags built concurrently.
+        disk_jobs: Max number of concurrent disk-heavy build stages.
+        flush_every: Number of tag updates to write the server config after;
+            0 to write it only at the end of the run.
+        compression_level: Archive gzip compression level, 1-9.
+        compression_threads: Number of threads compressing each archive; 0 to
+            share the CPUs among the tags built concurrently and, with zstd,
+            the two archive formats.
+        zstd: Whether to build zstd compressed archives along with the gzip
+            compressed ones.
+        report_path: Path to write the JSON build stage timing report to, if
+            any.
     """
+    if zstd and zstandard is None:
+        _LOGGER.error(
+            "Building zstd archives requires the 'zstandard' package; "
+            "install it with: pip install refgenieserver[zstd]"
+        )
+        exit(1)
     if float(rgc[CFG_VERSION_KEY]) < float(REQ_CFG_VERSION):
         raise ConfigNotCompliantError(
             f"You need to update the genome config to v{REQ_CFG_VERSION} in order to use the archiver. "
@@ -74,7 +121,24 @@ def archive(
             )
         )
     if force:
-        _LOGGER.info("Build forced; file existence will be ignored")
+        _LOGGER.info("Build forced; up-to-date archives will be rebuilt")
+    if not compression_threads:
+        # every archive format of every concurrent tag has its own threads
+        compressors = max(jobs, 1) * (2 if zstd else 1)
+        compression_threads = max((os.cpu_count() or 1) // compressors, 1)
+        _LOGGER.debug(f"Compression threads per archive: {compression_threads}")
+    report = BuildReport(
+        settings=dict(
+            force=force,
+            jobs=jobs,
+            disk_jobs=disk_jobs,
+            flush_every=flush_every,
+            compression_level=compression_level,
+            compression_threads=compression_threads,
+            zstd=zstd,
+            cpus=os.cpu_count(),
+        )
+    )
     _LOGGER.debug("Registry_paths: {}".format(registry_paths))
     # original RefGenConf has been created in read-only mode,
     # make it RW compatible and point to new target path for server use or initialize a new object
@@ -103,6 +167,11 @@ def archive(
         rgc_server.write_copy(server_rgc_path)
         rgc_server.filepath = os.path.abspath(server_rgc_path)
         rgc_server.locker.set_file_path(os.path.abspath(server_rgc_path))
+    journal = ConfigJournal(rgc_server, flush_every=flush_every)
+    # apply the updates of an interrupted run, if any
+    with report.run.stage(STAGE_CONFIG_WRITE):
+        journal.replay()
+    scan_start = time.perf_counter()
     if registry_paths:
         genomes = _get_paths_element(registry_paths, "namespace")
         asset_list = _get_paths_element(registry_paths, "item")
@@ -130,6 +199,8 @@ def archive(
             )
             sys.exit(1)
     counter = 0
+    tag_jobs = []
+    invalidated = skipped = 0
     for genome in genomes:
         genome_dir = os.path.join(rgc.data_dir, genome)
         target_dir = os.path.join(rgc[CFG_ARCHIVE_KEY], genome)
@@ -153,10 +224,7 @@ def archive(
             CFG_GENOME_DESC_KEY: genome_desc,
             CFG_ALIASES_KEY: genome_aliases,
         }
-        with write_lock(rgc_server) as r:
-            r[CFG_GENOMES_KEY].setdefault(genome, {})
-            r[CFG_GENOMES_KEY][genome].update(genome_attrs)
-            r.write()
+        journal.record("genome", genome=genome, attrs=genome_attrs)
         _LOGGER.debug(f"Updating '{genome}' genome attributes...")
         asset = asset_list[counter] if asset_list is not None else None
         assets = asset or list(rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY].keys())
@@ -177,9 +245,7 @@ def archive(
                 CFG_ASSET_DEFAULT_TAG_KEY: default_tag,
             }
             _LOGGER.debug(f"Updating '{genome}/{asset_name}' asset attributes...")
-            with write_lock(rgc_server) as r:
-                r.update_assets(genome, asset_name, asset_attrs)
-                r.write()
+            journal.record("asset", genome=genome, asset=asset_name, attrs=asset_attrs)
 
             tag = tag_list[counter] if tag_list is not None else None
             tags = tag or list(
@@ -199,7 +265,18 @@ def archive(
                     CFG_ASSET_TAGS_KEY
                 ][tag_name][CFG_ASSET_PATH_KEY]
                 target_file_core = os.path.join(target_dir, f"{asset_name}__{tag_name}")
-                target_file = f"{target_file_core}.tgz"
+                target_file = target_file_core + ARCHIVE_SUFFIXES[ARCHIVE_FORMAT_TGZ]
+                zstd_target_file = (
+                    target_file_core + ARCHIVE_SUFFIXES[ARCHIVE_FORMAT_ZSTD]
+                    if zstd
+                    else None
+                )
+                index_file = os.path.join(
+                    target_dir, TEMPLATE_ARCHIVE_INDEX.format(asset_name, tag_name)
+                )
+                manifest_file = os.path.join(
+                    target_dir, TEMPLATE_ARCHIVE_MANIFEST.format(asset_name, tag_name)
+                )
                 input_file = os.path.join(genome_dir, file_name, tag_name)
                 # these attributes have to be read from the original RefGenConf in case the archiver just increments
                 # an existing server RefGenConf
@@ -215,215 +292,618 @@ def archive(
                 asset_digest = rgc[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset_name][
                     CFG_ASSET_TAGS_KEY
                 ][tag_name].setdefault(CFG_ASSET_CHECKSUM_KEY, None)
-                if not os.path.exists(target_file) or force:
-                    _LOGGER.info(
-                        f"Creating archive '{target_file}' from '{input_file}' asset"
-                    )
-                    try:
-                        _copy_asset_dir(input_file, target_file_core)
-                        _get_asset_dir_contents(target_file_core, asset_name, tag_name)
-                        _check_tgz(input_file, target_file)
-                        _copy_recipe(input_file, target_dir, asset_name, tag_name)
-                        _copy_log(input_file, target_dir, asset_name, tag_name)
-                        # TODO: remove the rest of this try block in the future
-                        _check_tgz_legacy(
-                            input_file,
-                            target_file,
-                            asset_name,
-                            rgc.get_genome_alias_digest(alias=genome, fallback=True),
-                            rgc.get_genome_alias(digest=genome, fallback=True),
+                genome_digest = rgc.get_genome_alias_digest(alias=genome, fallback=True)
+                genome_alias = rgc.get_genome_alias(digest=genome, fallback=True)
+                legacy_target_file = replace_str_in_obj(
+                    target_file, x=genome_digest, y=genome_alias
+                )
+                recorded = _recorded_tag(rgc_server, genome, asset_name, tag_name)
+                fingerprint = _source_fingerprint(input_file)
+                # missing sidecars are no reason to rewrite up-to-date archives
+                reason = _rebuild_reason(
+                    recorded,
+                    [target_file, legacy_target_file]
+                    + ([zstd_target_file] if zstd_target_file else []),
+                    asset_digest,
+                    fingerprint,
+                    force,
+                )
+                if reason is not None:
+                    if CFG_ARCHIVE_CHECKSUM_KEY in recorded and not force:
+                        invalidated += 1
+                        _LOGGER.info(
+                            f"'{genome}/{asset_name}:{tag_name}' archive invalidated: "
+                            f"{reason}"
                         )
-                        _copy_recipe(input_file, alias_target_dir, asset_name, tag_name)
-                        _copy_log(input_file, alias_target_dir, asset_name, tag_name)
-                    except OSError as e:
-                        _LOGGER.warning(e)
-                        continue
-                    else:
+                    tag_jobs.append(
+                        TagJob(
+                            genome=genome,
+                            asset_name=asset_name,
+                            tag_name=tag_name,
+                            file_name=file_name,
+                            input_file=input_file,
+                            target_dir=target_dir,
+                            alias_target_dir=alias_target_dir,
+                            target_file_core=target_file_core,
+                            target_file=target_file,
+                            zstd_target_file=zstd_target_file,
+                            index_file=index_file,
+                            manifest_file=manifest_file,
+                            genome_digest=genome_digest,
+                            genome_alias=genome_alias,
+                            parents=parents,
+                            children=children,
+                            seek_keys=seek_keys,
+                            asset_digest=asset_digest,
+                            fingerprint=fingerprint,
+                        )
+                    )
+                else:
+                    skipped += 1
+                    _LOGGER.debug(f"'{target_file}' is up to date. Skipping")
+                    tag_attrs = {}
+                    if not os.path.exists(manifest_file):
                         _LOGGER.info(
-                            f"Updating '{genome}/{asset_name}:{tag_name}' tag attributes"
+                            f"'{manifest_file}' missing; digesting the archives"
                         )
-                        tag_attrs = {
-                            CFG_ASSET_PATH_KEY: file_name,
-                            CFG_SEEK_KEYS_KEY: seek_keys,
-                            CFG_ARCHIVE_CHECKSUM_KEY: checksum(target_file),
-                            CFG_ARCHIVE_SIZE_KEY: size(target_file),
-                            CFG_ASSET_SIZE_KEY: size(input_file),
-                            CFG_ASSET_PARENTS_KEY: parents,
-                            CFG_ASSET_CHILDREN_KEY: children,
-                            CFG_ASSET_CHECKSUM_KEY: asset_digest,
-                        }
-                        # TODO: legacy checksum generation and tag dictionary
-                        #  update to be removed in the future
-                        legacy_digest = checksum(
-                            replace_str_in_obj(
-                                target_file,
-                                x=rgc.get_genome_alias_digest(
-                                    alias=genome, fallback=True
-                                ),
-                                y=rgc.get_genome_alias(digest=genome, fallback=True),
+                        outputs = {ARCHIVE_FORMAT_TGZ: target_file}
+                        if zstd_target_file:
+                            outputs[ARCHIVE_FORMAT_ZSTD] = zstd_target_file
+                        with report.run.stage(STAGE_CHECKSUM):
+                            manifest_stats = write_chunk_manifest(
+                                outputs, manifest_file
                             )
+                        report.run.add_bytes(
+                            STAGE_CHECKSUM,
+                            sum(s.archive_size for s in manifest_stats.values()),
                         )
-                        tag_attrs.update(
-                            {CFG_LEGACY_ARCHIVE_CHECKSUM_KEY: legacy_digest}
+                    if not os.path.exists(index_file):
+                        # the index needs an archive of independent blocks
+                        _LOGGER.warning(
+                            f"'{target_file}' has no member index, so its files "
+                            f"are not served one by one; archive "
+                            f"'{genome}/{asset_name}:{tag_name}' with --force to "
+                            f"rewrite and index it"
+                        )
+                    if CFG_ARCHIVE_CHECKSUM_KEY not in recorded:
+                        _LOGGER.debug("Calculating archive digest")
+                        with report.run.stage(STAGE_CHECKSUM):
+                            tag_attrs[CFG_ARCHIVE_CHECKSUM_KEY] = checksum(target_file)
+                        report.run.add_bytes(
+                            STAGE_CHECKSUM, os.path.getsize(target_file)
+                        )
+                    if CFG_SOURCE_FINGERPRINT_KEY not in recorded:
+                        # archived by a version that did not record fingerprints
+                        tag_attrs[CFG_SOURCE_FINGERPRINT_KEY] = fingerprint
+                    if tag_attrs:
+                        journal.record(
+                            "tag",
+                            genome=genome,
+                            asset=asset_name,
+                            tag=tag_name,
+                            attrs=tag_attrs,
                         )
-                        _LOGGER.debug(f"attr dict: {tag_attrs}")
-                        with write_lock(rgc_server) as r:
-                            for parent in parents:
-                                # here we update any pre-existing parents' children
-                                # attr with the newly added asset
-                                _LOGGER.debug(
-                                    f"Updating {parent} children list with "
-                                    f"{genome}/{asset_name}:{tag_name}"
-                                )
-                                rp = parse_registry_path(parent)
-                                parent_genome = rp["namespace"]
-                                parent_asset = rp["item"]
-                                parent_tag = rp["tag"]
-                                try:
-                                    r.seek(
-                                        parent_genome,
-                                        parent_asset,
-                                        parent_tag,
-                                        strict_exists=True,
-                                    )
-                                except RefgenconfError:
-                                    _LOGGER.warning(
-                                        f"'{genome}/{asset_name}:{tag_name}'s parent "
-                                        f"'{parent}' does not exist, skipping relationship updates"
-                                    )
-                                    continue
-                                r.update_relatives_assets(
-                                    parent_genome,
-                                    parent_asset,
-                                    parent_tag,
-                                    [f"{genome}/{asset_name}:{tag_name}"],
-                                    children=True,
-                                )
-                            r.update_tags(genome, asset_name, tag_name, tag_attrs)
-                            r.write()
-                else:
-                    exists_msg = f"'{target_file}' exists."
-                    try:
-                        rgc_server[CFG_GENOMES_KEY][genome][CFG_ASSETS_KEY][asset_name][
-                            CFG_ASSET_TAGS_KEY
-                        ][tag_name][CFG_ARCHIVE_CHECKSUM_KEY]
-                        _LOGGER.debug(exists_msg + " Skipping")
-                    except KeyError:
-                        _LOGGER.debug(exists_msg + " Calculating archive digest")
-                        tag_attrs = {CFG_ARCHIVE_CHECKSUM_KEY: checksum(target_file)}
-                        with write_lock(rgc_server) as r:
-                            r.update_tags(genome, asset_name, tag_name, tag_attrs)
-                            r.write()
 
         counter += 1
+    # the digests of up-to-date archives recorded without one are timed apart
+    report.run.add_seconds(
+        STAGE_SCAN,
+        time.perf_counter() - scan_start - report.run.seconds.get(STAGE_CHECKSUM, 0),
+    )
+    store = FileStore(os.path.join(rgc[CFG_ARCHIVE_KEY], FILE_STORE_DIR))
+    try:
+        built = _build_tags(
+            journal,
+            tag_jobs,
+            store,
+            report,
+            jobs,
+            disk_jobs,
+            compression_level,
+            compression_threads,
+        )
+    finally:
+        with report.run.stage(STAGE_CONFIG_WRITE):
+            journal.flush()
+        report.run.add_bytes(STAGE_CONFIG_WRITE, journal.bytes_written)
+    # replaced files leave their previous contents unused
+    with report.run.stage(STAGE_STORE_PRUNE):
+        store.prune()
+    _LOGGER.info(
+        f"Archive summary: {built} tags built ({invalidated} invalidated), "
+        f"{skipped} skipped as up to date, {len(tag_jobs) - built} failed"
+    )
+    report.summary.update(
+        built=built,
+        invalidated=invalidated,
+        skipped=skipped,
+        failed=len(tag_jobs) - built,
+    )
+    report.log_summary()
+    if report_path is not None:
+        report.write(report_path)
     _LOGGER.info(f"Builder finished; server config file saved: {rgc_server.file_path}")
 
 
-def _check_tgz(path: str, output: str) -> None:
-    """Check if file exists and tar it, using pigz if available.
+class TagJob(NamedTuple):
+    """Everything needed to build the archives of a single asset tag."""
+
+    genome: str
+    asset_name: str
+    tag_name: str
+    file_name: str
+    input_file: str
+    target_dir: str
+    alias_target_dir: str
+    target_file_core: str
+    target_file: str
+    zstd_target_file: str | None
+    index_file: str
+    manifest_file: str
+    genome_digest: str
+    genome_alias: str
+    parents: list[str]
+    children: list[str]
+    seek_keys: dict[str, str]
+    asset_digest: str | None
+    fingerprint: str | None
+
+
+def _build_tags(
+    journal: ConfigJournal,
+    tag_jobs: list[TagJob],
+    store: FileStore,
+    report: BuildReport,
+    jobs: int,
+    disk_jobs: int,
+    compression_level: int = ARCHIVE_COMPRESSION_LEVEL,
+    compression_threads: int = ARCHIVE_COMPRESSION_THREADS,
+) -> int:
+    """Build the tag archives, concurrently if requested, and record them.
+
+    Independent tags are built by a pool of worker threads, largest assets
+    first, so the longest builds do not end up running last. The disk-heavy
+    stages (copying, archiving, checksumming) of at most disk_jobs tags run at
+    the same time. The server config is updated from this thread only, as the
+    builds complete, and the stage timings of each tag are added to the report.
 
     Args:
-        path: Path to the file to be tarred.
-        output: Path to the result file.
+        journal: Server config journal to record the built tags in.
+        tag_jobs: Tags to build.
+        store: Store to place the unarchived asset files and sidecars with.
+        report: Build report to add the tag stage timings to.
+        jobs: Max number of tags built concurrently.
+        disk_jobs: Max number of concurrent disk-heavy stages.
+        compression_level: Archive gzip compression level.
+        compression_threads: Number of threads compressing each archive.
+
+    Returns:
+        Number of tags built successfully.
+    """
+    jobs = max(1, jobs)
+    built = 0
+    if jobs > 1:
+        tag_jobs = sorted(
+            tag_jobs,
+            key=lambda j: size(j.input_file, size_str=False) or 0,
+            reverse=True,
+        )
+        _LOGGER.info(f"Building {len(tag_jobs)} tags with {jobs} jobs")
+    disk_slots = BoundedSemaphore(max(1, min(jobs, disk_jobs)))
+    pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="archive")
+    try:
+        futures = {}
+        for job in tag_jobs:
+            timer = StageTimer()
+            future = pool.submit(
+                _build_tag,
+                job,
+                disk_slots,
+                store,
+                timer,
+                compression_level,
+                compression_threads,
+            )
+            futures[future] = (job, timer)
+        for future in as_completed(futures):
+            job, timer = futures[future]
+            registry_path = f"{job.genome}/{job.asset_name}:{job.tag_name}"
+            try:
+                tag_attrs = future.result()
+            except OSError as e:
+                _LOGGER.warning(e)
+                report.add_tag(registry_path, timer, built=False)
+                continue
+            with report.run.stage(STAGE_CONFIG_WRITE):
+                _update_server_tag(journal, job, tag_attrs)
+            report.add_tag(registry_path, timer, built=True)
+            built += 1
+    except BaseException:
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    else:
+        pool.shutdown(wait=True)
+    return built
+
+
+def _build_tag(
+    job: TagJob,
+    disk_slots: BoundedSemaphore,
+    store: FileStore,
+    timer: StageTimer,
+    compression_level: int = ARCHIVE_COMPRESSION_LEVEL,
+    compression_threads: int = ARCHIVE_COMPRESSION_THREADS,
+) -> dict:
+    """Build the archives and the sidecar files of a single tag.
+
+    Args:
+        job: Tag to build.
+        disk_slots: Semaphore limiting the concurrent disk-heavy stages.
+        store: Store to place the unarchived asset files and sidecars with.
+        timer: Timer to record the wall time and bytes of the stages with.
+        compression_level: Archive gzip compression level.
+        compression_threads: Number of threads compressing each archive.
+
+    Returns:
+        Tag attributes to record in the server config.
 
     Raises:
-        OSError: If the file/directory to be archived does not exist.
+        OSError: If the asset directory does not exist.
     """
-    pth, tag_name = os.path.split(path)
-    if os.path.exists(path):
-        # tar gzip the asset, exclude _refgenie_build dir, it may change digests
-        cmd = "tar --exclude '_refgenie_build' -C {p} "
-        cmd += (
-            "-cvf - {tn} | pigz > {o}"
-            if is_command_callable("pigz")
-            else "-cvzf {o} {tn}"
+    _LOGGER.info(f"Creating archive '{job.target_file}' from '{job.input_file}' asset")
+    with timer.disk_stage(STAGE_COPY, disk_slots):
+        _copy_asset_dir(store, job.input_file, job.target_file_core)
+    with timer.stage(STAGE_DIR_CONTENTS):
+        _get_asset_dir_contents(job.target_file_core, job.asset_name, job.tag_name)
+    with timer.disk_stage(STAGE_ARCHIVE, disk_slots):
+        outputs = {ARCHIVE_FORMAT_TGZ: job.target_file}
+        if job.zstd_target_file is not None:
+            outputs[ARCHIVE_FORMAT_ZSTD] = job.zstd_target_file
+        archive_stats = _check_tgz(
+            job.input_file,
+            outputs,
+            compression_level,
+            compression_threads,
+            index_output=job.index_file,
+            manifest_output=job.manifest_file,
+        )
+    tgz_stats = archive_stats[ARCHIVE_FORMAT_TGZ]
+    # the placed files are the archived ones
+    timer.add_bytes(STAGE_COPY, tgz_stats.asset_size)
+    timer.add_bytes(
+        STAGE_ARCHIVE,
+        tgz_stats.asset_size,
+        sum(s.archive_size for s in archive_stats.values()),
+    )
+    with timer.stage(STAGE_RECIPE_LOG_COPY):
+        timer.add_bytes(
+            STAGE_RECIPE_LOG_COPY, _copy_sidecars(store, job, job.target_dir)
+        )
+    # TODO: remove the legacy archive build in the future
+    with timer.disk_stage(STAGE_LEGACY_ARCHIVE, disk_slots):
+        legacy_stats = _check_tgz_legacy(
+            job.input_file,
+            job.target_file,
+            job.asset_name,
+            job.genome_digest,
+            job.genome_alias,
+            compression_level,
+            compression_threads,
+        )
+    timer.add_bytes(
+        STAGE_LEGACY_ARCHIVE,
+        sum(s.asset_size for s in legacy_stats.values()),
+        sum(s.archive_size for s in legacy_stats.values()),
+    )
+    with timer.stage(STAGE_RECIPE_LOG_COPY):
+        timer.add_bytes(
+            STAGE_RECIPE_LOG_COPY, _copy_sidecars(store, job, job.alias_target_dir)
         )
-        command = cmd.format(p=pth, o=output, tn=tag_name)
-        _LOGGER.info(f"command: {command}")
-        run(command, shell=True)
+    tag_attrs = {
+        CFG_ASSET_PATH_KEY: job.file_name,
+        CFG_SEEK_KEYS_KEY: job.seek_keys,
+        CFG_ARCHIVE_CHECKSUM_KEY: tgz_stats.digest,
+        CFG_ARCHIVE_SIZE_KEY: filesize_to_str(tgz_stats.archive_size),
+        CFG_ASSET_SIZE_KEY: filesize_to_str(tgz_stats.asset_size),
+        CFG_ASSET_PARENTS_KEY: job.parents,
+        CFG_ASSET_CHILDREN_KEY: job.children,
+        CFG_ASSET_CHECKSUM_KEY: job.asset_digest,
+        CFG_SOURCE_FINGERPRINT_KEY: job.fingerprint,
+    }
+    if ARCHIVE_FORMAT_ZSTD in archive_stats:
+        zstd_stats = archive_stats[ARCHIVE_FORMAT_ZSTD]
+        tag_attrs[CFG_ZSTD_ARCHIVE_CHECKSUM_KEY] = zstd_stats.digest
+        tag_attrs[CFG_ZSTD_ARCHIVE_SIZE_KEY] = filesize_to_str(zstd_stats.archive_size)
     else:
-        raise OSError(f"Entity '{path}' does not exist")
+        stale_zstd_file = job.target_file_core + ARCHIVE_SUFFIXES[ARCHIVE_FORMAT_ZSTD]
+        if os.path.exists(stale_zstd_file):
+            # built by an earlier run; it does not match the new archive
+            os.remove(stale_zstd_file)
+            tag_attrs[CFG_ZSTD_ARCHIVE_CHECKSUM_KEY] = None
+            tag_attrs[CFG_ZSTD_ARCHIVE_SIZE_KEY] = None
+    # TODO: legacy checksum generation and tag dictionary
+    #  update to be removed in the future
+    tag_attrs[CFG_LEGACY_ARCHIVE_CHECKSUM_KEY] = legacy_stats[job.genome_alias].digest
+    return tag_attrs
+
+
+def _update_server_tag(journal: ConfigJournal, job: TagJob, tag_attrs: dict) -> None:
+    """Record the attributes of a built tag in the server config.
+
+    Also adds the tag to the children lists of its pre-existing parents. Tags
+    may complete in any order, so the children already recorded for this tag
+    are kept.
+
+    Args:
+        journal: Server config journal.
+        job: The built tag.
+        tag_attrs: Tag attributes to record.
+    """
+    genome, asset_name, tag_name = job.genome, job.asset_name, job.tag_name
+    _LOGGER.info(f"Updating '{genome}/{asset_name}:{tag_name}' tag attributes")
+    # keep the children recorded by tags that completed before this one
+    recorded = _recorded_tag(journal.rgc_server, genome, asset_name, tag_name).get(
+        CFG_ASSET_CHILDREN_KEY, []
+    )
+    tag_attrs[CFG_ASSET_CHILDREN_KEY] = list(job.children) + [
+        c for c in recorded if c not in job.children
+    ]
+    _LOGGER.debug(f"attr dict: {tag_attrs}")
+    for parent in job.parents:
+        # here we update any pre-existing parents' children
+        # attr with the newly added asset
+        _LOGGER.debug(
+            f"Updating {parent} children list with {genome}/{asset_name}:{tag_name}"
+        )
+        journal.record(
+            "child", parent=parent, child=f"{genome}/{asset_name}:{tag_name}"
+        )
+    journal.record(
+        "tag", genome=genome, asset=asset_name, tag=tag_name, attrs=tag_attrs
+    )
+
+
+def _recorded_tag(
+    rgc_server: RefGenConf, genome: str, asset_name: str, tag_name: str
+) -> Mapping[str, Any]:
+    """Get the tag attributes recorded in the server config.
+
+    Args:
+        rgc_server: Server configuration object.
+        genome: Genome digest.
+        asset_name: Asset name.
+        tag_name: Tag name.
+
+    Returns:
+        The recorded tag attributes; empty if the tag has not been archived.
+    """
+    return (
+        rgc_server[CFG_GENOMES_KEY]
+        .get(genome, {})
+        .get(CFG_ASSETS_KEY, {})
+        .get(asset_name, {})
+        .get(CFG_ASSET_TAGS_KEY, {})
+        .get(tag_name, {})
+    )
+
+
+def _source_fingerprint(path: str) -> str | None:
+    """Fingerprint an asset directory by the names, sizes and modification times.
+
+    Only the file metadata is read, so this takes O(stat) time. Symbolic links
+    are followed, as the legacy archives contain the files they point to.
+
+    Args:
+        path: Path to the asset directory.
+
+    Returns:
+        Digest of the directory tree metadata; None if the directory does not
+        exist.
+    """
+    if not os.path.isdir(path):
+        return None
+    fingerprint = md5()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            file_path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                # dangling symbolic link
+                st = os.lstat(file_path)
+            rel_path = os.path.relpath(file_path, path)
+            fingerprint.update(
+                f"{rel_path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8")
+            )
+    return fingerprint.hexdigest()
+
+
+def _rebuild_reason(
+    recorded: Mapping[str, Any],
+    archives: list[str],
+    asset_digest: str | None,
+    fingerprint: str | None,
+    force: bool,
+) -> str | None:
+    """Determine whether a tag has to be (re)built.
+
+    Args:
+        recorded: Tag attributes recorded in the server config.
+        archives: Paths to the tag archives.
+        asset_digest: Current asset digest.
+        fingerprint: Current asset directory fingerprint.
+        force: Whether the build is forced.
+
+    Returns:
+        Reason to build the tag; None if its archives are up to date.
+    """
+    if force:
+        return "build forced"
+    if not all(os.path.exists(a) for a in archives):
+        if CFG_ARCHIVE_CHECKSUM_KEY not in recorded:
+            return "not archived yet"
+        return "archive missing"
+    recorded_digest = recorded.get(CFG_ASSET_CHECKSUM_KEY)
+    if recorded_digest is not None and recorded_digest != asset_digest:
+        return f"asset digest changed ({recorded_digest} -> {asset_digest})"
+    recorded_fingerprint = recorded.get(CFG_SOURCE_FINGERPRINT_KEY)
+    if recorded_fingerprint is not None and recorded_fingerprint != fingerprint:
+        return "asset files changed"
+    return None
+
+
+def _check_tgz(
+    path: str,
+    outputs: dict[str, str],
+    level: int = ARCHIVE_COMPRESSION_LEVEL,
+    threads: int = ARCHIVE_COMPRESSION_THREADS,
+    index_output: str | None = None,
+    manifest_output: str | None = None,
+) -> dict[str, ArchiveStats]:
+    """Check if the asset directory exists and archive it.
+
+    The archive digests and sizes and the asset directory size are determined
+    while the archives are written, in a single pass over the directory.
+
+    Args:
+        path: Path to the directory to be archived.
+        outputs: Paths to the result files, keyed by archive format.
+        level: Gzip compression level.
+        threads: Number of compression threads; 0 to use one per CPU.
+        index_output: Path to the index of the files in the gzip compressed
+            archive to write, if any; the archive is then written in
+            independently compressed blocks.
+        manifest_output: Path to the chunk manifest of the archives to write,
+            if any.
+
+    Returns:
+        The archive digests and sizes, and the asset directory size in bytes,
+        keyed by archive format.
+
+    Raises:
+        OSError: If the directory to be archived does not exist.
+    """
+    # exclude _refgenie_build dir, it may change digests
+    _LOGGER.info(f"Archiving '{path}' to '{', '.join(outputs.values())}'")
+    return write_archives(
+        path,
+        outputs,
+        exclude=(BUILD_STATS_DIR,),
+        level=level,
+        threads=threads,
+        index_output=index_output,
+        manifest_output=manifest_output,
+    )
 
 
 def _check_tgz_legacy(
-    path: str, output: str, asset_name: str, genome_name: str, alias: str | list[str]
-) -> None:
+    path: str,
+    output: str,
+    asset_name: str,
+    genome_name: str,
+    alias: str | list[str],
+    level: int = ARCHIVE_COMPRESSION_LEVEL,
+    threads: int = ARCHIVE_COMPRESSION_THREADS,
+) -> dict[str, ArchiveStats]:
     """Legacy version of _check_tgz, to be removed in the future.
 
-    Checks if file exists and tars it with alias-based naming. Uses pigz
-    if available.
+    Checks if the directory exists and archives it with alias-based naming.
+    The genome digest is replaced with the alias in the member names while
+    the archive is written, so the asset directory is not copied.
 
     Args:
-        path: Path to the file to be tarred.
+        path: Path to the directory to be archived.
         output: Path to the result file.
         asset_name: Name of the asset.
         genome_name: Genome digest name.
         alias: Genome alias or list of aliases.
+        level: Gzip compression level.
+        threads: Number of compression threads; 0 to use one per CPU.
+
+    Returns:
+        The written archive properties by alias.
 
     Raises:
-        OSError: If the file/directory to be archived does not exist.
+        OSError: If the directory to be archived does not exist.
     """
     # TODO: remove in the future
     if isinstance(alias, str):
         alias = [alias]
+    stats = {}
     for a in alias:
-        if os.path.exists(path):
-            aliased_output = replace_str_in_obj(output, x=genome_name, y=a)
-            cmd = "rsync -rvL --exclude '_refgenie_build' {p}/ {p}/{an}/; "
-            command = cmd.format(p=path, o=output, an=asset_name)
-            _LOGGER.debug("command: {}".format(command))
-            run(command, shell=True)
-            swap_names_in_tree(os.path.join(path, asset_name), a, genome_name)
-            # tar gzip the new dir
-            cmd = "cd {p}; " + (
-                "tar -cvf - {an} | pigz > {oa}; "
-                if is_command_callable("pigz")
-                else "tar -cvzf {oa} {an}; "
-            )
-            # remove the new dir
-            cmd += "rm -r {p}/{an}; "
-            command = cmd.format(p=path, oa=aliased_output, an=asset_name)
-            _LOGGER.debug(f"command: {command}")
-            run(command, shell=True)
-        else:
-            raise OSError(f"Entity '{path}' does not exist")
+        aliased_output = replace_str_in_obj(output, x=genome_name, y=a)
+        _LOGGER.info(f"Archiving '{path}' to '{aliased_output}'")
+        stats[a] = write_archive(
+            path,
+            aliased_output,
+            arcname=asset_name,
+            exclude=(BUILD_STATS_DIR,),
+            rename=partial(_swap_name, old=genome_name, new=a),
+            dereference=True,
+            level=level,
+            threads=threads,
+        )
+    return stats
+
+
+def _swap_name(name: str, old: str, new: str) -> str:
+    return name.replace(old, new)
+
+
+def _copy_sidecars(store: FileStore, job: TagJob, target_dir: str) -> int:
+    """Place the build recipe and log files of a tag.
+
+    Args:
+        store: Store to place the files with.
+        job: The tag.
+        target_dir: Path to the destination directory.
 
+    Returns:
+        Size of the placed files in bytes.
+    """
+    return _copy_recipe(
+        store, job.input_file, target_dir, job.asset_name, job.tag_name
+    ) + _copy_log(store, job.input_file, target_dir, job.asset_name, job.tag_name)
 
-def _copy_log(input_dir: str, target_dir: str, asset_name: str, tag_name: str) -> None:
-    """Copy the build log file.
+
+def _copy_log(
+    store: FileStore, input_dir: str, target_dir: str, asset_name: str, tag_name: str
+) -> int:
+    """Place the build log file.
 
     Args:
+        store: Store to place the file with.
         input_dir: Path to the source directory.
         target_dir: Path to the destination directory.
         asset_name: Asset name.
         tag_name: Tag name.
+
+    Returns:
+        Size of the placed file in bytes; 0 if there is no log.
     """
     log_path = f"{input_dir}/{BUILD_STATS_DIR}/{ORI_LOG_NAME}"
     if log_path and os.path.exists(log_path):
-        run(
-            "cp "
-            + log_path
-            + " "
-            + os.path.join(target_dir, TEMPLATE_LOG.format(asset_name, tag_name)),
-            shell=True,
+        store.place(
+            log_path,
+            os.path.join(target_dir, TEMPLATE_LOG.format(asset_name, tag_name)),
         )
         _LOGGER.debug(f"Log copied to: {target_dir}")
-    else:
-        _LOGGER.warning(f"Log not found: {log_path}")
+        return os.path.getsize(log_path)
+    _LOGGER.warning(f"Log not found: {log_path}")
+    return 0
 
 
-def _copy_asset_dir(input_dir: str, target_dir: str) -> None:
-    """Copy the asset directory via rsync.
+def _copy_asset_dir(store: FileStore, input_dir: str, target_dir: str) -> None:
+    """Place the asset directory files, except the build stats.
 
     Args:
+        store: Store to place the files with.
         input_dir: Path to the source directory.
         target_dir: Path to the destination directory.
     """
     if input_dir and os.path.exists(input_dir):
-        run(
-            f"rsync -rvL --exclude '_refgenie_build' {input_dir}/ {target_dir}/",
-            shell=True,
-        )
+        store.place_tree(input_dir, target_dir, exclude=(BUILD_STATS_DIR,))
         _LOGGER.info(f"Asset directory copied to: {target_dir}")
     else:
         _LOGGER.warning(f"Asset directory not found: {input_dir}")
@@ -456,25 +936,30 @@ def _get_asset_dir_contents(asset_dir: str, asset_name: str, tag_name: str) -> N
 
 
 def _copy_recipe(
-    input_dir: str, target_dir: str, asset_name: str, tag_name: str
-) -> None:
-    """Copy the build recipe file.
+    store: FileStore, input_dir: str, target_dir: str, asset_name: str, tag_name: str
+) -> int:
+    """Place the build recipe file.
 
     Args:
+        store: Store to place the file with.
         input_dir: Path to the source directory.
         target_dir: Path to the destination directory.
         asset_name: Asset name.
         tag_name: Tag name.
+
+    Returns:
+        Size of the placed file in bytes; 0 if there is no recipe.
     """
     recipe_path = (
         f"{input_dir}/{BUILD_STATS_DIR}/"
         f"{TEMPLATE_RECIPE_JSON.format(asset_name, tag_name)}"
     )
     if recipe_path and os.path.exists(recipe_path):
-        run("cp " + recipe_path + " " + target_dir, shell=True)
+        store.place(recipe_path, target_dir)
         _LOGGER.debug(f"Recipe copied to: {target_dir}")
-    else:
-        _LOGGER.warning(f"Recipe not found: {recipe_path}")
+        return os.path.getsize(recipe_path)
+    _LOGGER.warning(f"Recipe not found: {recipe_path}")
+    return 0
 
 
 def _remove_archive(
@@ -513,12 +998,21 @@ def _remove_archive(
                 f"{genome}/{asset}{':' + tag if tag else ''} not found and not removed"
             )
             continue
-        ret.append(
+        ret.extend(
+            os.path.join(
+                rgc[cfg_archive_folder_key],
+                genome,
+                f"{asset or '*'}__{tag or '*'}{suffix}",
+            )
+            for suffix in ARCHIVE_SUFFIXES.values()
+        )
+        ret.extend(
             os.path.join(
                 rgc[cfg_archive_folder_key],
                 genome,
-                f"{asset or '*'}__{tag or '*'}.tgz",
+                template.format(asset or "*", tag or "*"),
             )
+            for template in (TEMPLATE_ARCHIVE_INDEX, TEMPLATE_ARCHIVE_MANIFEST)
         )
         for p in ret:
             archives = glob(p)
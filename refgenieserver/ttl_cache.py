@@ -0,0 +1,146 @@
+"""Bounded TTL cache for asynchronously fetched remote data"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from .const import *
+
+_LOGGER = logging.getLogger(PKG_NAME)
+
+
+class TTLCache:
+    """LRU cache of asynchronously fetched values with a time to live.
+
+    Values older than the TTL are still served for the stale period while they
+    are refreshed in the background (stale-while-revalidate). Concurrent misses
+    of the same key are coalesced into a single fetch. Failed fetches are not
+    cached.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create an empty cache.
+
+        Args:
+            maxsize: Max number of cached values; least recently used are evicted.
+            ttl: Seconds a value is fresh for.
+            stale_ttl: Seconds a value is served for after it expired, while
+                being refreshed.
+            clock: Monotonic time source.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Cache counters and the current size."""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
+
+    def clear(self) -> None:
+        """Drop all the cached values; fetches in flight are not affected."""
+        self._entries.clear()
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Get a cached value, fetching it if missing or expired.
+
+        Args:
+            key: Hashable key identifying the value.
+            fetch: Coroutine function that fetches the value.
+
+        Returns:
+            The cached or the fetched value.
+
+        Raises:
+            Exception: Whatever the fetch raises, if there is no value to serve.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = self._clock() - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    self._start_fetch(key, fetch)
+                return value
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._start_fetch(key, fetch)
+        else:
+            self.coalesced += 1
+        # the fetch is not tied to the request that started it, so a client
+        # disconnect does not fail the other requests waiting for the value
+        return await asyncio.shield(task)
+
+    def _start_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        task = asyncio.ensure_future(self._fetch(key, fetch))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._fetch_done(key, t))
+        return task
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except Exception:
+            self.errors += 1
+            raise
+        self._store(key, value)
+        return value
+
+    def _fetch_done(self, key: Hashable, task: asyncio.Task) -> None:
+        del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.debug(f"Could not fetch the value for {key}: {task.exception()}")
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (value, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+# remote asset directory contents, keyed by (genome digest, asset, tag)
+dir_contents_cache = TTLCache(
+    maxsize=REMOTE_CACHE_SIZE, ttl=REMOTE_CACHE_TTL, stale_ttl=REMOTE_CACHE_STALE_TTL
+)
+# archive member indexes, keyed by (genome digest, asset, tag, archive digest)
+archive_index_cache = TTLCache(
+    maxsize=REMOTE_CACHE_SIZE, ttl=REMOTE_CACHE_TTL, stale_ttl=REMOTE_CACHE_STALE_TTL
+)
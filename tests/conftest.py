@@ -0,0 +1,91 @@
+"""Shared fixtures: a small genome folder archived into a served config"""
+
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from refgenconf import RefGenConf
+
+from refgenieserver.const import CFG_ARCHIVE_KEY
+
+DIGEST = "a" * 48
+ALIAS = "hgx"
+
+GENOME_CONFIG = """\
+config_version: 0.4
+genome_folder: {root}
+genome_archive_folder: {root}/archive
+genome_archive_config: {root}/archive/server.yaml
+genomes:
+  {digest}:
+    aliases: [{alias}]
+    genome_description: test genome
+    assets:
+      fasta:
+        asset_description: fasta asset
+        default_tag: default
+        tags:
+          default:
+            asset_path: fasta
+            asset_digest: fastadigest
+            seek_keys: {{fasta: {digest}.fa, fai: {digest}.fa.fai}}
+            asset_parents: []
+            asset_children: []
+"""
+
+
+def make_genome_folder(root) -> str:
+    """Create a genome folder with a single fasta asset; the genome config path."""
+    asset_dir = root / "data" / DIGEST / "fasta" / "default"
+    os.makedirs(asset_dir / "_refgenie_build")
+    os.makedirs(root / "archive")
+    (asset_dir / f"{DIGEST}.fa").write_text(">chr1\n" + "ACGT" * 1000 + "\n")
+    (asset_dir / f"{DIGEST}.fa.fai").write_text("chr1\t4000\t6\t4000\t4001\n")
+    (asset_dir / "_refgenie_build" / "build_recipe_fasta__default.json").write_text(
+        '{"recipe": "fasta"}'
+    )
+    (asset_dir / "_refgenie_build" / "refgenie_log.md").write_text("log\n")
+    cfg_path = root / "genome_config.yaml"
+    cfg_path.write_text(GENOME_CONFIG.format(root=root, digest=DIGEST, alias=ALIAS))
+    return str(cfg_path)
+
+
+def run_archive(cfg_path: str, **kwargs) -> str:
+    """Archive the genomes of a genome config; the server config path."""
+    from refgenieserver.server_builder import archive
+
+    rgc = RefGenConf.from_yaml_file(cfg_path)
+    archive(
+        rgc,
+        None,
+        force=kwargs.pop("force", False),
+        remove=False,
+        cfg_path=cfg_path,
+        genomes_desc=None,
+        **kwargs,
+    )
+    return os.path.join(rgc[CFG_ARCHIVE_KEY], "server.yaml")
+
+
+@pytest.fixture(scope="session")
+def server_config(tmp_path_factory) -> str:
+    """Archive a genome with a single fasta asset; the server config path."""
+    return run_archive(make_genome_folder(tmp_path_factory.mktemp("refgenie")))
+
+
+@pytest.fixture(scope="session")
+def client(server_config):
+    """Client of an app serving the archived genome with API v2 and v3."""
+    from refgenieserver.app_factory import create_app
+
+    app = create_app(
+        server_config,
+        archive_base_dir=os.path.dirname(server_config),
+        openapi_cache_dir=None,
+    )
+    # create_app serves API v3 only; the routers bind the app when imported
+    from refgenieserver.routers import version2
+
+    app.include_router(version2.router, prefix="/v2")
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,12 @@
+"""Apps built by create_app are wired like the ones the 'serve' command runs"""
+
+from refgenieserver.file_response import AssetFileResponse
+from refgenieserver.openapi import OpenAPISchemaCache
+
+
+def test_configured(client):
+    assert isinstance(client.app.openapi, OpenAPISchemaCache)
+    assert client.app.state.reloader is not None
+    assert AssetFileResponse.fadvise
+    assert client.get("/static/style.css").status_code == 200
+    assert "refgenieserver_catalog" in client.get("/metrics").text
@@ -0,0 +1,150 @@
+"""Single-pass archive writing with parallel gzip compression"""
+
+import gzip
+import hashlib
+import json
+import os
+import random
+import tarfile
+import zlib
+
+import pytest
+
+from refgenieserver import server_builder
+from refgenieserver.archive_writer import write_archives, write_chunk_manifest
+from refgenieserver.const import *
+
+from .conftest import make_genome_folder, run_archive
+
+FILES = {"a.txt": 300 * 1024, "sub/b.bin": 700 * 1024, "sub/c.txt": 0}
+
+
+@pytest.fixture
+def src_dir(tmp_path):
+    """Directory of files spanning several compression blocks."""
+    rng = random.Random(0)
+    src = tmp_path / "asset"
+    for name, size in FILES.items():
+        path = src / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # compressible, but not trivially
+        path.write_bytes(bytes(rng.choice(b"ACGT\n") for _ in range(size)))
+    (src / BUILD_STATS_DIR).mkdir()
+    (src / BUILD_STATS_DIR / "log.md").write_text("excluded")
+    return src
+
+
+def _write(src_dir, out_dir, threads, **kwargs):
+    out_dir.mkdir(exist_ok=True)
+    output = str(out_dir / "asset.tgz")
+    stats = write_archives(
+        str(src_dir), {ARCHIVE_FORMAT_TGZ: output}, threads=threads, **kwargs
+    )
+    return output, stats[ARCHIVE_FORMAT_TGZ]
+
+
+def test_archive_contents_and_digest(src_dir, tmp_path):
+    output, stats = _write(src_dir, tmp_path / "out", threads=4)
+    with open(output, "rb") as f:
+        data = f.read()
+    assert stats.digest == hashlib.md5(data).hexdigest()
+    assert stats.archive_size == len(data)
+    # a single member gzip stream, readable by the standard tools
+    gzip.decompress(data)
+    with tarfile.open(output, "r:gz") as tar:
+        names = {m.name for m in tar.getmembers() if m.isfile()}
+        assert names == {f"asset/{name}" for name in FILES}
+        for name in FILES:
+            member = tar.extractfile(f"asset/{name}").read()
+            assert member == (src_dir / name).read_bytes()
+
+
+@pytest.mark.parametrize("independent", [False, True])
+def test_output_independent_of_threads(src_dir, tmp_path, independent):
+    kwargs = {"index_output": None}
+    outputs = []
+    for threads in (1, 2, 8):
+        out_dir = tmp_path / f"out{threads}"
+        if independent:
+            kwargs["index_output"] = str(out_dir / "asset.tgz.index.json")
+        output, stats = _write(src_dir, out_dir, threads=threads, **kwargs)
+        with open(output, "rb") as f:
+            outputs.append((f.read(), stats.digest))
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def test_member_index(src_dir, tmp_path):
+    """Every member can be inflated from the block range of its index entry."""
+    out_dir = tmp_path / "out"
+    index_path = out_dir / "asset.tgz.index.json"
+    output, stats = _write(src_dir, out_dir, threads=4, index_output=str(index_path))
+    index = json.loads(index_path.read_text())
+    assert index["archive_digest"] == stats.digest
+    assert set(index["members"]) == set(FILES)
+    with open(output, "rb") as f:
+        data = f.read()
+    for name, (start, end, skip, size) in index["members"].items():
+        inflated = zlib.decompressobj(-zlib.MAX_WBITS).decompress(data[start:end])
+        assert inflated[skip : skip + size] == (src_dir / name).read_bytes()
+
+
+def test_manifest_of_written_archive(src_dir, tmp_path):
+    out_dir = tmp_path / "out"
+    manifest_path = out_dir / "manifest.json"
+    chunk_size = 64 * 1024
+    output, stats = _write(
+        src_dir,
+        out_dir,
+        threads=2,
+        manifest_output=str(manifest_path),
+        chunk_size=chunk_size,
+    )
+    manifest = json.loads(manifest_path.read_text())
+    with open(output, "rb") as f:
+        data = f.read()
+    chunks = [
+        hashlib.md5(data[i : i + chunk_size]).hexdigest()
+        for i in range(0, len(data), chunk_size)
+    ]
+    assert len(chunks) > 1
+    assert manifest["archives"][ARCHIVE_FORMAT_TGZ]["chunks"] == chunks
+    assert stats.chunk_digests == tuple(chunks)
+    # the manifest written for the archive later is the same
+    rewritten = out_dir / "rewritten.json"
+    write_chunk_manifest({ARCHIVE_FORMAT_TGZ: output}, str(rewritten), chunk_size)
+    assert json.loads(rewritten.read_text()) == manifest
+
+
+def test_partial_output_removed_on_error(src_dir, tmp_path):
+    out_dir = tmp_path / "out"
+
+    def rename(name):
+        if name.endswith("b.bin"):
+            raise RuntimeError("interrupted")
+        return name
+
+    with pytest.raises(RuntimeError):
+        _write(src_dir, out_dir, threads=4, rename=rename)
+    assert os.listdir(out_dir) == []
+
+
+@pytest.mark.parametrize(
+    "jobs, zstd, threads", [(1, False, 8), (2, False, 4), (2, True, 2), (16, True, 1)]
+)
+def test_cpus_shared_by_concurrent_compressors(
+    tmp_path, monkeypatch, jobs, zstd, threads
+):
+    """Compression threads per archive default to the CPUs / compressors."""
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    used = {}
+    for name in ("write_archive", "write_archives"):
+        writer = getattr(server_builder, name)
+
+        def recording_writer(*args, name=name, writer=writer, **kwargs):
+            used.setdefault(name, set()).add(kwargs["threads"])
+            return writer(*args, **kwargs)
+
+        monkeypatch.setattr(server_builder, name, recording_writer)
+    run_archive(make_genome_folder(tmp_path), jobs=jobs, zstd=zstd)
+    # the digest-named archives and the legacy alias-named archives
+    assert used == {"write_archive": {threads}, "write_archives": {threads}}
@@ -0,0 +1,45 @@
+"""Blocking file system calls don't serialize concurrent requests"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from refgenieserver import async_io
+
+from .conftest import DIGEST
+
+DELAY = 0.5
+URL = f"/v3/assets/archive/{DIGEST}/fasta?tag=default"
+
+
+@pytest.fixture
+def slow_disk(monkeypatch):
+    """Make every file stat take DELAY seconds, blocking the calling thread."""
+    stat_regular_file = async_io._stat_regular_file
+
+    def slow_stat(path):
+        time.sleep(DELAY)
+        return stat_regular_file(path)
+
+    monkeypatch.setattr(async_io, "_stat_regular_file", slow_stat)
+
+
+def _timed_get(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    return response.status_code, time.perf_counter() - start
+
+
+def test_concurrent_requests_not_serialized(client, slow_disk):
+    status, single = _timed_get(client, URL)
+    assert status == 200
+    assert single >= DELAY
+    # the test client runs the app in one event loop; requests from several
+    # threads are handled there concurrently, unless a handler blocks the loop
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: _timed_get(client, URL), range(2)))
+        total = time.perf_counter() - start
+    assert [status for status, _ in results] == [200, 200]
+    assert total < single + DELAY / 2
@@ -0,0 +1,84 @@
+"""Conditional requests for asset archives and cached responses"""
+
+from email.utils import formatdate
+
+import pytest
+
+from .conftest import DIGEST
+
+ARCHIVE = f"/v3/assets/archive/{DIGEST}/fasta?tag=default"
+ASSET_DIGEST = f"/v3/assets/asset_digest/{DIGEST}/fasta?tag=default"
+PAST = "Thu, 01 Jan 1970 00:00:00 GMT"
+FUTURE = formatdate(4102444800, usegmt=True)
+
+
+@pytest.fixture(scope="module")
+def archive(client):
+    response = client.get(ARCHIVE)
+    assert response.status_code == 200
+    return response
+
+
+def _status(client, path=ARCHIVE, **headers):
+    response = client.get(
+        path, headers={k.replace("_", "-"): v for k, v in headers.items()}
+    )
+    if response.status_code == 304:
+        assert response.content == b""
+    return response.status_code
+
+
+def test_strong_etag(client, archive):
+    assert _status(client, if_none_match=archive.headers["etag"]) == 304
+
+
+def test_weak_etag(client, archive):
+    assert _status(client, if_none_match=f"W/{archive.headers['etag']}") == 304
+
+
+def test_etag_in_list(client, archive):
+    etags = f'"other", {archive.headers["etag"]}'
+    assert _status(client, if_none_match=etags) == 304
+
+
+def test_any_etag(client):
+    assert _status(client, if_none_match="*") == 304
+
+
+def test_other_etag(client):
+    assert _status(client, if_none_match='"other", W/"another"') == 200
+
+
+def test_not_modified_headers(client, archive):
+    response = client.get(ARCHIVE, headers={"if-none-match": archive.headers["etag"]})
+    assert response.status_code == 304
+    for header in ("etag", "last-modified", "cache-control"):
+        assert response.headers[header] == archive.headers[header]
+
+
+@pytest.mark.parametrize(
+    "since, status",
+    [(FUTURE, 304), (PAST, 200), ("yesterday", 200), ("", 200)],
+)
+def test_if_modified_since(client, since, status):
+    assert _status(client, if_modified_since=since) == status
+
+
+def test_last_modified_exact(client, archive):
+    assert _status(client, if_modified_since=archive.headers["last-modified"]) == 304
+
+
+def test_if_none_match_precedence(client, archive):
+    etag = archive.headers["etag"]
+    assert _status(client, if_none_match='"other"', if_modified_since=FUTURE) == 200
+    assert _status(client, if_none_match=etag, if_modified_since=PAST) == 304
+
+
+def test_cached_response_variants(client):
+    identity = client.get(ASSET_DIGEST, headers={"accept-encoding": "identity"})
+    assert identity.status_code == 200
+    etag = identity.headers["etag"]
+    assert _status(client, ASSET_DIGEST, if_none_match=etag) == 304
+    assert _status(client, ASSET_DIGEST, if_none_match=f"W/{etag}") == 304
+    assert _status(client, ASSET_DIGEST, if_none_match="*") == 304
+    assert _status(client, ASSET_DIGEST, if_none_match='"other"') == 200
@@ -0,0 +1,75 @@
+"""Server config journal replayed after an interrupted archiver run"""
+
+import os
+
+import pytest
+from refgenconf import RefGenConf
+
+from refgenieserver.config_journal import ConfigJournal
+from refgenieserver.const import *
+
+from .conftest import DIGEST
+
+TAG_ATTRS = {CFG_ARCHIVE_CHECKSUM_KEY: "archivedigest", CFG_ARCHIVE_SIZE_KEY: "1 KB"}
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "server.yaml"
+    path.write_text(
+        f"config_version: 0.4\ngenome_folder: {tmp_path}\ngenome_servers: []\n"
+        "genomes: {}\n"
+    )
+    return str(path)
+
+
+def _record_updates(journal):
+    journal.record("genome", genome=DIGEST, attrs={CFG_GENOME_DESC_KEY: "test"})
+    journal.record(
+        "asset", genome=DIGEST, asset="fasta", attrs={CFG_ASSET_DESC_KEY: "fasta"}
+    )
+    journal.record("tag", genome=DIGEST, asset="fasta", tag="default", attrs=TAG_ATTRS)
+
+
+def _archived_tag(rgc):
+    genome = rgc[CFG_GENOMES_KEY][DIGEST]
+    assert genome[CFG_GENOME_DESC_KEY] == "test"
+    asset = genome[CFG_ASSETS_KEY]["fasta"]
+    assert asset[CFG_ASSET_DESC_KEY] == "fasta"
+    return dict(asset[CFG_ASSET_TAGS_KEY]["default"])
+
+
+def test_replay_after_crash(config_path):
+    journal = ConfigJournal(RefGenConf.from_yaml_file(config_path))
+    _record_updates(journal)
+    # the process dies before the updates are flushed to the config file
+    journal._file.close()
+    assert os.path.exists(journal.path)
+    rgc = RefGenConf.from_yaml_file(config_path)
+    assert DIGEST not in (rgc[CFG_GENOMES_KEY] or {})
+
+    assert ConfigJournal(rgc).replay() == 3
+    assert _archived_tag(rgc).items() >= TAG_ATTRS.items()
+    assert not os.path.exists(journal.path)
+    written = RefGenConf.from_yaml_file(config_path)
+    assert _archived_tag(written).items() >= TAG_ATTRS.items()
+
+
+def test_truncated_entry_ignored(config_path):
+    journal = ConfigJournal(RefGenConf.from_yaml_file(config_path))
+    _record_updates(journal)
+    # the process dies in the middle of writing an entry
+    journal._file.write('{"op": "tag", "genome"')
+    journal._file.close()
+    rgc = RefGenConf.from_yaml_file(config_path)
+    assert ConfigJournal(rgc).replay() == 3
+    assert _archived_tag(rgc).items() >= TAG_ATTRS.items()
+
+
+def test_flush_every(config_path):
+    journal = ConfigJournal(RefGenConf.from_yaml_file(config_path), flush_every=1)
+    _record_updates(journal)
+    assert not os.path.exists(journal.path)
+    written = RefGenConf.from_yaml_file(config_path)
+    assert _archived_tag(written).items() >= TAG_ATTRS.items()
+    assert ConfigJournal(written).replay() == 0
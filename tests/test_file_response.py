@@ -0,0 +1,169 @@
+"""Range requests for asset archives and the ASGI send extensions"""
+
+import asyncio
+
+import pytest
+
+from refgenieserver.file_response import (
+    PATHSEND_EXTENSION,
+    ZEROCOPY_EXTENSION,
+    AssetFileResponse,
+)
+
+from .conftest import DIGEST
+
+ARCHIVE = f"/v3/assets/archive/{DIGEST}/fasta?tag=default"
+
+
+@pytest.fixture(scope="module")
+def archive(client):
+    response = client.get(ARCHIVE)
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    return response
+
+
+def _get(client, **headers):
+    return client.get(
+        ARCHIVE, headers={k.replace("_", "-"): v for k, v in headers.items()}
+    )
+
+
+def _parse_multipart(response):
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.partition("boundary=")[2].encode()
+    body = response.content
+    assert body.endswith(b"--" + boundary + b"--\r\n")
+    parts = []
+    for part in body.split(b"--" + boundary)[1:-1]:
+        assert part.startswith(b"\r\n") and part.endswith(b"\r\n")
+        head, _, data = part[2:-2].partition(b"\r\n\r\n")
+        headers = dict(
+            line.decode().split(": ", 1) for line in head.split(b"\r\n") if line
+        )
+        parts.append((headers, data))
+    return parts
+
+
+def test_single_range(client, archive):
+    response = _get(client, range="bytes=10-19")
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(archive.content)}"
+    assert response.headers["content-length"] == "10"
+    assert response.content == archive.content[10:20]
+
+
+def test_multiple_ranges(client, archive):
+    size = len(archive.content)
+    response = _get(client, range="bytes=0-4, 20-29, -5")
+    assert response.status_code == 206
+    assert int(response.headers["content-length"]) == len(response.content)
+    parts = _parse_multipart(response)
+    assert [h["content-range"] for h, _ in parts] == [
+        f"bytes 0-4/{size}",
+        f"bytes 20-29/{size}",
+        f"bytes {size - 5}-{size - 1}/{size}",
+    ]
+    assert [h["content-type"] for h, _ in parts] == [
+        archive.headers["content-type"]
+    ] * 3
+    assert [data for _, data in parts] == [
+        archive.content[:5],
+        archive.content[20:30],
+        archive.content[-5:],
+    ]
+
+
+def test_overlapping_ranges_coalesced(client, archive):
+    response = _get(client, range="bytes=0-9, 5-14")
+    assert response.status_code == 206
+    assert response.content == archive.content[:15]
+
+
+def test_suffix_range(client, archive):
+    size = len(archive.content)
+    response = _get(client, range="bytes=-16")
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {size - 16}-{size - 1}/{size}"
+    assert response.content == archive.content[-16:]
+
+
+def test_open_ended_range(client, archive):
+    size = len(archive.content)
+    response = _get(client, range="bytes=32-")
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 32-{size - 1}/{size}"
+    assert response.content == archive.content[32:]
+
+
+def test_if_range_current_etag(client, archive):
+    response = _get(client, range="bytes=0-9", if_range=archive.headers["etag"])
+    assert response.status_code == 206
+    assert response.content == archive.content[:10]
+
+
+@pytest.mark.parametrize("if_range", ['"stale"', "stale", 'W/"stale"'])
+def test_if_range_stale_full_response(client, archive, if_range):
+    response = _get(client, range="bytes=0-9", if_range=if_range)
+    assert response.status_code == 200
+    assert response.content == archive.content
+
+
+def test_unsatisfiable_range(client, archive):
+    size = len(archive.content)
+    response = _get(client, range=f"bytes={size}-")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+
+def test_invalid_range_ignored(client, archive):
+    response = _get(client, range="bytes=9-0")
+    assert response.status_code == 200
+    assert response.content == archive.content
+
+
+def _send_file(path, extensions, headers=()):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+        "extensions": {ext: {} for ext in extensions},
+    }
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(AssetFileResponse(str(path))(scope, receive, send))
+    return messages
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 64)
+    return path
+
+
+def test_chunked_without_extensions(data_file):
+    messages = _send_file(data_file, [])
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    assert body == data_file.read_bytes()
+
+
+def test_zerocopy_extension(data_file):
+    messages = _send_file(data_file, [ZEROCOPY_EXTENSION], [("range", "bytes=100-")])
+    assert messages[0]["status"] == 206
+    zerocopy = [m for m in messages if m["type"] == ZEROCOPY_EXTENSION]
+    assert [(m["offset"], m["count"]) for m in zerocopy] == [(100, 16284)]
+    assert all(m["type"] != "http.response.body" or not m["body"] for m in messages)
+
+
+def test_pathsend_extension(data_file):
+    messages = _send_file(data_file, [PATHSEND_EXTENSION])
+    assert messages[1] == {"type": PATHSEND_EXTENSION, "path": str(data_file)}
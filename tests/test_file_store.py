@@ -0,0 +1,82 @@
+"""Tests for the content-addressed file store"""
+
+import errno
+import os
+
+import pytest
+
+from refgenieserver import file_store
+from refgenieserver.file_store import FileStore
+
+
+def _write(path, content: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def _stored(store: FileStore) -> list:
+    return [
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(store.path)
+        for name in names
+    ]
+
+
+@pytest.fixture
+def no_hardlinks(monkeypatch):
+    def link(src, dst, *args, **kwargs):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(file_store.os, "link", link)
+
+
+def test_identical_files_share_the_stored_content(tmp_path):
+    store = FileStore(str(tmp_path / "store"))
+    a = _write(tmp_path / "src" / "a.fai", b"chr1\t100\n")
+    b = _write(tmp_path / "src" / "b.fai", b"chr1\t100\n")
+    store.place(a, str(tmp_path / "a.fai"))
+    os.makedirs(tmp_path / "out")
+    store.place(b, str(tmp_path / "out"))
+    assert os.path.samefile(tmp_path / "a.fai", tmp_path / "out" / "b.fai")
+    assert (store.placed, store.deduplicated) == (2, 1)
+    [obj] = _stored(store)
+    assert os.stat(obj).st_nlink == 3
+    assert store.prune() == 0
+
+
+def test_place_is_skipped_if_already_placed(tmp_path):
+    store = FileStore(str(tmp_path / "store"))
+    src = _write(tmp_path / "src" / "a", b"data")
+    dst = str(tmp_path / "a")
+    store.place(src, dst)
+    store.place(src, dst)
+    assert store.placed == 1
+
+
+def test_prune_removes_contents_not_placed_anymore(tmp_path):
+    store = FileStore(str(tmp_path / "store"))
+    kept = _write(tmp_path / "src" / "kept", b"kept")
+    gone = _write(tmp_path / "src" / "gone", b"gone")
+    store.place(kept, str(tmp_path / "kept"))
+    store.place(gone, str(tmp_path / "gone"))
+    os.remove(tmp_path / "gone")
+    assert store.prune() == 1
+    [obj] = _stored(store)
+    assert os.path.samefile(obj, tmp_path / "kept")
+
+
+def test_unlinkable_files_are_copied_and_not_stored(tmp_path, no_hardlinks):
+    src_dir = tmp_path / "src"
+    _write(src_dir / "a.fa", b"ACGT" * 100)
+    _write(src_dir / "sub" / "a.fa", b"ACGT" * 100)
+    for _ in range(2):
+        # a second run must find nothing to prune, as there's nothing stored
+        store = FileStore(str(tmp_path / "store"))
+        assert store.place_tree(str(src_dir), str(tmp_path / "out")) == 2
+        assert _stored(store) == []
+        assert store.prune() == 0
+    for rel in ("a.fa", "sub/a.fa"):
+        with open(tmp_path / "out" / rel, "rb") as f:
+            assert f.read() == b"ACGT" * 100
@@ -0,0 +1,67 @@
+"""Metrics recorded by the middleware for the served requests"""
+
+import asyncio
+
+import pytest
+
+from refgenieserver.main import catalog as holder
+from refgenieserver.metrics import bytes_served
+from refgenieserver.reload import CatalogReloader
+
+from .conftest import ALIAS, DIGEST
+
+REMOTES = """remotes:
+  http:
+    prefix: http://remote.test
+"""
+
+
+@pytest.fixture
+def series():
+    """Label values of the bytes served series; none when the test starts."""
+    saved = dict(bytes_served.values)
+    bytes_served.values.clear()
+    yield lambda: set(bytes_served.values)
+    bytes_served.values.clear()
+    bytes_served.values.update(saved)
+
+
+@pytest.fixture
+def remote_catalog(client, server_config, tmp_path):
+    """Serve the genome from a remote data provider; the catalog is restored."""
+    cfg_path = tmp_path / "server.yaml"
+    with open(server_config) as f:
+        cfg_path.write_text(f.read() + REMOTES)
+    original = holder.current
+    reloader = CatalogReloader(holder, str(cfg_path), base_dir=str(tmp_path))
+    assert asyncio.run(reloader.reload()) is True
+    yield
+    holder.swap(original)
+
+
+def test_bytes_served_labeled_with_genome_digest(client):
+    before = bytes_served.values.get((DIGEST, "fasta"), 0)
+    for genome in (DIGEST, ALIAS):
+        response = client.get(f"/v2/asset/{genome}/fasta/archive")
+        assert response.status_code == 200
+    assert bytes_served.values[(DIGEST, "fasta")] == before + 2 * len(response.content)
+    assert (ALIAS, "fasta") not in bytes_served.values
+
+
+def test_redirects_not_counted(client, remote_catalog, series):
+    response = client.get(f"/v2/asset/{ALIAS}/fasta/archive", follow_redirects=False)
+    assert response.status_code == 307
+    assert series() == set()
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/v3/assets/archive/unknown/fasta",
+        f"/v3/assets/archive/{DIGEST}/unknown",
+        f"/v2/asset/{ALIAS}/unknown/splash",
+    ],
+)
+def test_unserved_assets_not_counted(client, series, path):
+    client.get(path)
+    assert series() == set()
@@ -0,0 +1,57 @@
+"""OpenAPI schemas cached on disk"""
+
+import os
+
+import pytest
+
+from refgenieserver import openapi
+from refgenieserver.main import catalog as holder
+from refgenieserver.openapi import OpenAPISchemaCache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(openapi, "OPENAPI_CACHE_SIZE", 3)
+    return tmp_path / "cache[1]"
+
+
+def _schemas(cache_dir) -> set:
+    return {p.name for p in cache_dir.iterdir()}
+
+
+def _write_old_schemas(cache_dir, count: int) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    for i in range(count):
+        path = cache_dir / f"openapi_old{i}.json"
+        path.write_text("{}")
+        os.utime(path, (1000 + i, 1000 + i))
+
+
+def test_least_recently_used_schemas_removed(client, cache_dir):
+    _write_old_schemas(cache_dir, 4)
+    (cache_dir / "other.json").write_text("{}")
+    OpenAPISchemaCache(client.app, holder, cache_dir=str(cache_dir))()
+    (stored,) = (
+        _schemas(cache_dir)
+        - {f"openapi_old{i}.json" for i in range(4)}
+        - {"other.json"}
+    )
+    assert _schemas(cache_dir) == {
+        stored,
+        "openapi_old2.json",
+        "openapi_old3.json",
+        "other.json",
+    }
+
+
+def test_loaded_schema_kept(client, cache_dir):
+    OpenAPISchemaCache(client.app, holder, cache_dir=str(cache_dir))()
+    (stored,) = _schemas(cache_dir)
+    os.utime(cache_dir / stored, (0, 0))
+    schema = OpenAPISchemaCache(client.app, holder, cache_dir=str(cache_dir))()
+    assert "paths" in schema
+    assert os.stat(cache_dir / stored).st_mtime > 0
+    # a schema of another catalog version pushes out the older ones only
+    _write_old_schemas(cache_dir, 3)
+    OpenAPISchemaCache(client.app, holder, cache_dir=str(cache_dir))._store("new", {})
+    assert _schemas(cache_dir) == {stored, "openapi_new.json", "openapi_old2.json"}
@@ -0,0 +1,40 @@
+"""The package exports are imported on first access only"""
+
+import subprocess
+import sys
+
+import pytest
+
+
+def _imports_after(code: str) -> set[str]:
+    """Run code in a fresh interpreter; the modules imported by then."""
+    output = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint(' '.join(sys.modules))"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return set(output.split())
+
+
+def test_unknown_attribute_imports_nothing():
+    modules = _imports_after(
+        "import refgenieserver\n"
+        "assert not hasattr(refgenieserver, 'no_such_name')\n"
+        "dir(refgenieserver)"
+    )
+    assert "fastapi" not in modules
+    assert "refgenieserver.helpers" not in modules
+
+
+def test_archiver_does_not_import_fastapi():
+    modules = _imports_after("from refgenieserver import archive, main")
+    assert "refgenieserver.server_builder" in modules
+    assert "fastapi" not in modules
+
+
+@pytest.mark.parametrize("name", ["archive", "ServingCatalog", "build_parser"])
+def test_exports(name):
+    import refgenieserver
+
+    assert getattr(refgenieserver, name).__name__ == name
@@ -0,0 +1,101 @@
+"""Pre-fork serving: every worker serves requests, SIGTERM stops them all"""
+
+import glob
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork") or not os.path.isdir("/proc"),
+    reason="requires fork and a /proc file system",
+)
+
+WORKERS = 2
+TIMEOUT = 30.0
+
+
+def _children(pid):
+    """Get the IDs of the child processes of a process."""
+    children = set()
+    for stat_path in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(stat_path) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name in parentheses may contain spaces
+        ppid = int(stat.rpartition(")")[2].split()[1])
+        if ppid == pid:
+            children.add(int(stat_path.split("/")[2]))
+    return children
+
+
+def _get(uds, path="/v3/genomes/list"):
+    # a new connection for every request, accepted by any running worker
+    with httpx.Client(transport=httpx.HTTPTransport(uds=uds), timeout=5) as c:
+        return c.get(f"http://localhost{path}")
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.1)
+    raise TimeoutError
+
+
+def _ready(uds):
+    try:
+        return _get(uds).status_code == 200
+    except httpx.TransportError:
+        return False
+
+
+@pytest.fixture
+def server(server_config, tmp_path):
+    uds = str(tmp_path / "server.sock")
+    cmd = [sys.executable, "-m", "refgenieserver", "serve", "-c", server_config]
+    cmd += ["--uds", uds, "--workers", str(WORKERS), "--openapi-cache", ""]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for(lambda: len(_children(proc.pid)) == WORKERS)
+        _wait_for(lambda: _ready(uds))
+        yield proc, uds, _children(proc.pid)
+    finally:
+        if proc.poll() is None:
+            for pid in _children(proc.pid):
+                os.kill(pid, signal.SIGKILL)
+            proc.kill()
+            proc.wait()
+
+
+def test_every_worker_serves(server):
+    proc, uds, workers = server
+    assert len(workers) == WORKERS
+    for pid in workers:
+        # with the other workers stopped, this one has to accept the connection
+        others = workers - {pid}
+        for other in others:
+            os.kill(other, signal.SIGSTOP)
+        try:
+            assert _get(uds).status_code == 200
+        finally:
+            for other in others:
+                os.kill(other, signal.SIGCONT)
+
+
+def test_sigterm_stops_all_workers(server):
+    proc, uds, workers = server
+    proc.send_signal(signal.SIGTERM)
+    assert proc.wait(TIMEOUT) == 0
+    for pid in workers:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+    assert not os.path.exists(uds)
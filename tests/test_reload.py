@@ -0,0 +1,113 @@
+"""Server config reload swapping a new serving catalog in"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from refgenieserver import async_io
+from refgenieserver.main import catalog as holder
+from refgenieserver.reload import CatalogReloader
+from refgenieserver.ttl_cache import dir_contents_cache
+
+from .conftest import DIGEST
+
+REMOTES = """remotes:
+  http:
+    prefix: http://remote.test
+  s3:
+    prefix: s3://bucket
+"""
+ARCHIVE = f"/v3/assets/archive/{DIGEST}/fasta?tag=default"
+FILE_PATH = f"/v3/assets/file_path/{DIGEST}/fasta/fasta"
+
+
+@pytest.fixture
+def config(client, server_config, tmp_path):
+    """Copy of the server config to change and reload; the catalog is restored."""
+    cfg_path = tmp_path / "server.yaml"
+    with open(server_config) as f:
+        cfg_path.write_text(f.read())
+    original = holder.current
+    yield cfg_path
+    holder.swap(original)
+
+
+@pytest.fixture
+def reloader(config, server_config):
+    return CatalogReloader(holder, str(config), base_dir=os.path.dirname(server_config))
+
+
+def _fill_dir_contents_cache():
+    async def fetch():
+        return ["a.fa"]
+
+    asyncio.run(dir_contents_cache.get(("remote", "fasta"), fetch))
+    assert len(dir_contents_cache) == 1
+
+
+def test_reload_changed_config(config, reloader):
+    version = holder.current.version
+    _fill_dir_contents_cache()
+    assert asyncio.run(reloader.reload()) is False
+    assert holder.current.version == version
+    assert len(dir_contents_cache) == 1
+    config.write_text(config.read_text() + REMOTES)
+    assert asyncio.run(reloader.reload()) is True
+    assert holder.current.version != version
+    assert len(dir_contents_cache) == 0
+    assert reloader.stats["reload_count"] == 1
+
+
+def test_reload_invalid_config_keeps_catalog(config, reloader):
+    version = holder.current.version
+    config.write_text("genomes: [")
+    assert asyncio.run(reloader.reload()) is False
+    assert holder.current.version == version
+    assert reloader.stats["last_error"]
+
+
+def _remote_class_enum(client):
+    operation = client.get("/openapi.json").json()["paths"][
+        "/v3/assets/file_path/{genome}/{asset}/{seek_key}"
+    ]["get"]
+    (param,) = (p for p in operation["parameters"] if p["name"] == "remoteClass")
+    return param["schema"]["enum"]
+
+
+def test_remote_classes_follow_catalog(client, config, reloader):
+    assert client.get(FILE_PATH).status_code == 200
+    assert client.get(f"{FILE_PATH}?remoteClass=s3").status_code == 422
+    assert _remote_class_enum(client) == ["http"]
+    config.write_text(config.read_text() + REMOTES)
+    asyncio.run(reloader.reload())
+    response = client.get(f"{FILE_PATH}?remoteClass=s3")
+    assert response.status_code == 200
+    assert response.text.startswith("s3://bucket/")
+    assert client.get(f"{FILE_PATH}?remoteClass=ftp").status_code == 422
+    assert _remote_class_enum(client) == ["http", "s3"]
+
+
+def test_in_flight_request_keeps_pinned_catalog(client, config, reloader, monkeypatch):
+    old_digest = holder.current.get_tag(DIGEST, "fasta", "default")["archive_digest"]
+    new_digest = "f" * 32
+    config.write_text(config.read_text().replace(old_digest, new_digest))
+    entered, released = threading.Event(), threading.Event()
+    stat_regular_file = async_io._stat_regular_file
+
+    def blocking_stat(path):
+        entered.set()
+        released.wait(10)
+        return stat_regular_file(path)
+
+    monkeypatch.setattr(async_io, "_stat_regular_file", blocking_stat)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        in_flight = pool.submit(client.get, ARCHIVE)
+        assert entered.wait(10)
+        assert asyncio.run(reloader.reload()) is True
+        released.set()
+        response = in_flight.result(10)
+    assert response.headers["etag"] == f'"{old_digest}"'
+    assert client.get(ARCHIVE).headers["etag"] == f'"{new_digest}"'
@@ -0,0 +1,49 @@
+"""Bounded response cache storing successfully rendered responses only"""
+
+import pytest
+
+from refgenieserver.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    response_cache,
+)
+
+from .conftest import DIGEST
+
+
+def _render(body):
+    return lambda: CachedResponse(body, media_type="text/plain")
+
+
+def test_least_recently_used_evicted():
+    cache = ResponseCache(maxsize=2)
+    cache.get("v1", "a", _render(b"a"))
+    cache.get("v1", "b", _render(b"b"))
+    cache.get("v1", "a", _render(b"a"))
+    cache.get("v1", "c", _render(b"c"))
+    assert len(cache) == 2
+    cache.get("v1", "a", _render(b"a"))
+    assert cache.stats["hits"] == 2
+    cache.get("v1", "b", _render(b"b"))
+    assert cache.stats["misses"] == 4
+
+
+def test_failed_render_not_cached():
+    cache = ResponseCache(maxsize=2)
+
+    def missing():
+        raise KeyError("missing")
+
+    with pytest.raises(KeyError):
+        cache.get("v1", "missing", missing)
+    assert len(cache) == 0
+
+
+def test_unknown_tags_not_cached(client):
+    assert response_cache.maxsize is not None
+    client.get(f"/v3/assets/asset_digest/{DIGEST}/fasta?tag=default")
+    size = len(response_cache)
+    for i in range(10):
+        path = f"/v3/assets/asset_digest/{DIGEST}/fasta?tag=nosuch{i}"
+        assert client.get(path).status_code == 404
+    assert len(response_cache) == size
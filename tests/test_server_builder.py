@@ -0,0 +1,94 @@
+"""Incremental archiver runs: up-to-date tags, invalidation and sidecars"""
+
+import json
+import logging
+import os
+
+import pytest
+from refgenconf import RefGenConf
+
+from refgenieserver.const import *
+
+from .conftest import DIGEST, make_genome_folder, run_archive
+
+
+class Archived:
+    """Genome folder archived once, to archive again after changes."""
+
+    def __init__(self, root) -> None:
+        self.root = root
+        self.cfg_path = make_genome_folder(root)
+        self.server_config = run_archive(self.cfg_path)
+        self.asset_dir = root / "data" / DIGEST / "fasta" / "default"
+        target_dir = root / "archive" / DIGEST
+        self.archive = target_dir / "fasta__default.tgz"
+        self.index = target_dir / TEMPLATE_ARCHIVE_INDEX.format("fasta", "default")
+        self.manifest = target_dir / TEMPLATE_ARCHIVE_MANIFEST.format(
+            "fasta", "default"
+        )
+
+    def run(self, **kwargs) -> dict:
+        """Archive again; the report summary."""
+        report_path = self.root / "report.json"
+        run_archive(self.cfg_path, report_path=str(report_path), **kwargs)
+        with open(report_path) as f:
+            return json.load(f)["summary"]
+
+    def archive_digest(self) -> str:
+        genomes = RefGenConf.from_yaml_file(self.server_config)[CFG_GENOMES_KEY]
+        tag = genomes[DIGEST][CFG_ASSETS_KEY]["fasta"][CFG_ASSET_TAGS_KEY]["default"]
+        return tag[CFG_ARCHIVE_CHECKSUM_KEY]
+
+
+@pytest.fixture
+def archived(tmp_path):
+    return Archived(tmp_path)
+
+
+def _built(summary):
+    return summary["built"], summary["invalidated"], summary["skipped"]
+
+
+def test_unchanged_tag_skipped(archived):
+    st = archived.archive.stat()
+    assert _built(archived.run()) == (0, 0, 1)
+    assert archived.archive.stat().st_mtime_ns == st.st_mtime_ns
+
+
+def test_changed_files_invalidate_archive(archived):
+    digest = archived.archive_digest()
+    with open(archived.asset_dir / f"{DIGEST}.fa", "a") as f:
+        f.write("ACGT\n")
+    assert _built(archived.run()) == (1, 1, 0)
+    assert archived.archive_digest() != digest
+    # the recorded fingerprint is updated, so the next run skips the tag
+    assert _built(archived.run()) == (0, 0, 1)
+
+
+def test_forced_build(archived):
+    assert _built(archived.run(force=True)) == (1, 0, 0)
+
+
+def test_missing_manifest_generated_from_archive(archived):
+    manifest = archived.manifest.read_text()
+    st = archived.archive.stat()
+    archived.manifest.unlink()
+    assert _built(archived.run()) == (0, 0, 1)
+    assert archived.archive.stat().st_mtime_ns == st.st_mtime_ns
+    assert json.loads(archived.manifest.read_text()) == json.loads(manifest)
+
+
+def test_missing_index_does_not_rebuild(archived, caplog):
+    st = archived.archive.stat()
+    archived.index.unlink()
+    with caplog.at_level(logging.WARNING, logger=PKG_NAME):
+        assert _built(archived.run()) == (0, 0, 1)
+    assert archived.archive.stat().st_mtime_ns == st.st_mtime_ns
+    assert "no member index" in caplog.text
+    assert not archived.index.exists()
+
+
+def test_missing_archive_rebuilt(archived):
+    os.remove(archived.archive)
+    assert _built(archived.run()) == (1, 1, 0)
+    assert archived.archive.exists() and archived.index.exists()
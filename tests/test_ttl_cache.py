@@ -0,0 +1,142 @@
+"""Remote asset directory contents cache against a local HTTP stand-in"""
+
+import asyncio
+
+import httpx
+import pytest
+from refgenconf import RefGenConf
+
+from refgenieserver import async_io, helpers
+from refgenieserver.catalog import ServingCatalog
+from refgenieserver.ttl_cache import TTLCache
+
+from .conftest import ALIAS, DIGEST
+
+TTL = 10.0
+STALE_TTL = 100.0
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Remote:
+    """Stand-in for the remote data provider serving the directory contents.
+
+    Requests wait until the remote is released, so the tests control when
+    the fetches complete.
+    """
+
+    def __init__(self) -> None:
+        self.requests: list[str] = []
+        self.contents = ["a.fa", "a.fa.fai"]
+        self.released = asyncio.Event()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(str(request.url))
+        await self.released.wait()
+        return httpx.Response(200, json=self.contents)
+
+
+@pytest.fixture
+def remote_catalog(server_config, tmp_path):
+    """Catalog of the archived genome with the data served by a remote."""
+    cfg_path = tmp_path / "server.yaml"
+    with open(server_config) as f:
+        cfg = f.read()
+    cfg_path.write_text(cfg + "remotes:\n  http:\n    prefix: http://remote.test\n")
+    return ServingCatalog(RefGenConf.from_yaml_file(str(cfg_path)))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    cache = TTLCache(maxsize=16, ttl=TTL, stale_ttl=STALE_TTL, clock=clock)
+    monkeypatch.setattr(helpers, "dir_contents_cache", cache)
+    return clock
+
+
+def _run(remote_catalog, remote, scenario):
+    """Run a scenario with the real HTTP client routed to the stand-in."""
+
+    async def _main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(remote.handle))
+        async_io._http_client = client
+        try:
+            return await scenario()
+        finally:
+            await async_io.close_http_client()
+
+    return asyncio.run(_main())
+
+
+def _get(catalog, genome=DIGEST):
+    return helpers.get_asset_dir_contents(
+        catalog=catalog, genome=genome, asset="fasta", tag="default"
+    )
+
+
+def test_concurrent_misses_coalesced(remote_catalog, clock):
+    remote = Remote()
+
+    async def scenario():
+        requests = [
+            asyncio.ensure_future(_get(remote_catalog, genome))
+            for genome in (DIGEST, ALIAS, DIGEST, ALIAS)
+        ]
+        await asyncio.sleep(0.01)
+        remote.released.set()
+        return await asyncio.gather(*requests)
+
+    results = _run(remote_catalog, remote, scenario)
+    assert results == [remote.contents] * 4
+    assert len(remote.requests) == 1
+    assert remote.requests[0].startswith("http://remote.test/")
+    assert remote.requests[0].endswith("fasta__default.json")
+    stats = helpers.dir_contents_cache.stats
+    assert (stats["misses"], stats["coalesced"], stats["size"]) == (1, 3, 1)
+
+
+def test_stale_served_while_refreshed(remote_catalog, clock):
+    remote = Remote()
+
+    async def scenario():
+        remote.released.set()
+        first = await _get(remote_catalog)
+        clock.now = TTL + 1
+        remote.released.clear()
+        remote.contents = ["b.fa"]
+        # the expired value is served right away; the refresh waits
+        stale = await asyncio.wait_for(_get(remote_catalog), timeout=1)
+        assert len(remote.requests) == 2
+        remote.released.set()
+        await asyncio.sleep(0.01)
+        return first, stale, await _get(remote_catalog)
+
+    first, stale, refreshed = _run(remote_catalog, remote, scenario)
+    assert first == stale == ["a.fa", "a.fa.fai"]
+    assert refreshed == ["b.fa"]
+    assert len(remote.requests) == 2
+    stats = helpers.dir_contents_cache.stats
+    assert (stats["misses"], stats["stale_hits"], stats["hits"]) == (1, 1, 1)
+
+
+def test_hit_and_miss_counters(remote_catalog, clock):
+    remote = Remote()
+
+    async def scenario():
+        remote.released.set()
+        for _ in range(3):
+            await _get(remote_catalog)
+        clock.now = TTL + STALE_TTL + 1
+        await _get(remote_catalog)
+
+    _run(remote_catalog, remote, scenario)
+    assert len(remote.requests) == 2
+    stats = helpers.dir_contents_cache.stats
+    assert (stats["misses"], stats["hits"], stats["stale_hits"]) == (2, 2, 0)
+    assert stats["errors"] == 0
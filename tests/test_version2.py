@@ -0,0 +1,40 @@
+"""API v2 routes addressed by genome digest and by genome alias"""
+
+import pytest
+
+from .conftest import ALIAS, DIGEST
+
+
+@pytest.mark.parametrize("genome", [DIGEST, ALIAS])
+@pytest.mark.parametrize("query", ["", "?tag=default"])
+def test_asset_splash_page(client, genome, query):
+    response = client.get(f"/v2/asset/{genome}/fasta/splash{query}")
+    assert response.status_code == 200
+    assert "fasta asset" in response.text
+
+
+def test_asset_splash_page_alias_and_digest_cached_once(client):
+    by_digest = client.get(f"/v2/asset/{DIGEST}/fasta/splash")
+    by_alias = client.get(f"/v2/asset/{ALIAS}/fasta/splash")
+    assert by_alias.headers["etag"] == by_digest.headers["etag"]
+
+
+@pytest.mark.parametrize("genome", [DIGEST, ALIAS])
+@pytest.mark.parametrize("query", ["", "?tag=default"])
+def test_download_asset(client, genome, query):
+    response = client.get(f"/v2/asset/{genome}/fasta/archive{query}")
+    assert response.status_code == 200
+    assert response.content[:2] == b"\x1f\x8b"
+
+
+@pytest.mark.parametrize("genome", ["nosuch", "b" * 48])
+@pytest.mark.parametrize(
+    "endpoint", ["splash", "default_tag", "archive", "default/asset_digest"]
+)
+def test_unknown_genome_not_found(client, genome, endpoint):
+    assert client.get(f"/v2/asset/{genome}/fasta/{endpoint}").status_code == 404
+
+
+@pytest.mark.parametrize("endpoint", ["splash", "default_tag"])
+def test_unknown_asset_not_found(client, endpoint):
+    assert client.get(f"/v2/asset/{ALIAS}/nosuch/{endpoint}").status_code == 404
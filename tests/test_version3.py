@@ -0,0 +1,84 @@
+"""API v3 routes: archive members, chunk manifests and unknown genomes/assets"""
+
+import hashlib
+import io
+import tarfile
+
+import pytest
+
+from .conftest import DIGEST
+
+UNKNOWN = "b" * 48
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        f"/v3/genomes/splash/{UNKNOWN}",
+        f"/v3/genomes/attrs/{UNKNOWN}",
+        f"/v3/genomes/aliases/{UNKNOWN}",
+        f"/v3/assets/splash/{UNKNOWN}/fasta",
+        f"/v3/assets/splash/{DIGEST}/nosuch",
+        f"/v3/assets/default_tag/{UNKNOWN}/fasta",
+        f"/v3/assets/default_tag/{DIGEST}/nosuch",
+        f"/v3/assets/archive/{UNKNOWN}/fasta",
+        f"/v3/assets/asset_digest/{DIGEST}/nosuch",
+        f"/v3/assets/attrs/{UNKNOWN}/fasta",
+    ],
+)
+def test_unknown_not_found(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_default_tag(client):
+    response = client.get(f"/v3/assets/default_tag/{DIGEST}/fasta")
+    assert response.status_code == 200
+    assert response.text == "default"
+
+
+@pytest.fixture(scope="module")
+def archive(client):
+    response = client.get(f"/v3/assets/archive/{DIGEST}/fasta?tag=default")
+    assert response.status_code == 200
+    return response.content
+
+
+def _tar_member(archive, path):
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+        (member,) = (m for m in tar.getmembers() if m.name.endswith(f"/{path}"))
+        return tar.extractfile(member).read()
+
+
+@pytest.mark.parametrize(
+    "query, path",
+    [
+        ("seekKey=fai", f"{DIGEST}.fa.fai"),
+        ("seekKey=fasta", f"{DIGEST}.fa"),
+        (f"path={DIGEST}.fa", f"{DIGEST}.fa"),
+    ],
+)
+def test_archive_member(client, archive, query, path):
+    response = client.get(f"/v3/assets/archive_member/{DIGEST}/fasta?{query}")
+    assert response.status_code == 200
+    assert response.content == _tar_member(archive, path)
+    assert response.headers["content-length"] == str(len(response.content))
+
+
+def test_archive_member_not_found(client):
+    path = f"/v3/assets/archive_member/{DIGEST}/fasta?path=nosuch.fa"
+    assert client.get(path).status_code == 404
+
+
+def test_archive_manifest(client, archive):
+    manifest = client.get(f"/v3/assets/archive_manifest/{DIGEST}/fasta").json()
+    assert manifest["algorithm"] == "md5"
+    size = manifest["chunk_size"]
+    tgz = manifest["archives"]["tgz"]
+    assert tgz["archive_digest"] == hashlib.md5(archive).hexdigest()
+    assert tgz["archive_size"] == len(archive)
+    chunks = [
+        hashlib.md5(archive[i : i + size]).hexdigest()
+        for i in range(0, len(archive), size)
+    ]
+    assert tgz["chunks"] == chunks
+    assert tgz["root_digest"] == hashlib.md5("".join(chunks).encode()).hexdigest()